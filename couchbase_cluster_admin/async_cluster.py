@@ -0,0 +1,186 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cluster import Cluster
+from .rebalance import DEFAULT_MAX_INTERVAL, RebalanceMonitor
+
+DEFAULT_MAX_WORKERS = 32
+
+# Cluster methods returning an iterator whose items are fetched lazily over
+# the network.
+ITERATOR_METHODS = frozenset({"watch_pool", "watch_bucket", "query_stream", "iter_backup_task_history"})
+
+_END = object()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool shared by all AsyncCluster instances of the
+    process, creating it on first use.
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="async-cluster")
+        return _executor
+
+
+class AsyncIterator:
+    """
+    Async iterator over the items of a Cluster method returning an iterator,
+    such as watch_pool() or query_stream(). The method is called, and every
+    item fetched, in the executor, so waiting for the next item does not
+    block the event loop:
+
+        async for row in c.query_stream({"statement": "SELECT 1"}):
+            ...
+
+    `source` is what the method returned, e.g. the QueryStream with its
+    `meta`, once iteration has started.
+    """
+
+    def __init__(self, run, func, *args, **kwargs):
+        self._run = run
+        self._call = functools.partial(func, *args, **kwargs)
+        self._iterator = None
+        self.source = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self.source = await self._run(self._call)
+            self._iterator = iter(self.source)
+
+        item = await self._run(next, self._iterator, _END)
+        if item is _END:
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self):
+        close = getattr(self.source, "close", None) or getattr(self._iterator, "close", None)
+        if close is not None:
+            await self._run(close)
+
+
+class AsyncCluster:
+    """
+    asyncio front-end for Cluster.
+
+    Every Cluster method is available as a coroutine function, and every
+    Cluster property as an awaitable attribute:
+
+        c = AsyncCluster("mycluster", services=["kv"], api_host="10.0.0.1")
+        info = await c.pool_info
+        await c.create_bucket({...})
+        await c.wait_for_rebalance()
+
+    Methods returning an iterator (see ITERATOR_METHODS) return an
+    AsyncIterator instead, to be used with `async for`.
+
+    The blocking HTTP calls run in a thread pool, sharing the pooled session
+    of the wrapped Cluster, so a single event loop can drive many nodes
+    concurrently. By default all instances share one pool (get_executor()),
+    whatever their number. Pass `executor`, or `max_workers` for a pool of
+    the instance's own, e.g. when many watches would otherwise occupy the
+    shared workers while waiting for events.
+    """
+
+    def __init__(self, *args, cluster=None, executor=None, max_workers=None, **kwargs):
+        if cluster is None:
+            cluster = Cluster(*args, **kwargs)
+        self.cluster = cluster
+
+        self._owns_executor = executor is None and max_workers is not None
+        if self._owns_executor:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = executor or get_executor()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable in the executor.
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on AsyncCluster itself.
+        cluster = self.__dict__.get("cluster")
+        if cluster is None:
+            raise AttributeError(name)
+
+        if isinstance(getattr(type(cluster), name, None), property):
+            return self.run(getattr, cluster, name)
+
+        attr = getattr(cluster, name)
+        if not callable(attr):
+            return attr
+
+        if name in ITERATOR_METHODS:
+
+            @functools.wraps(attr)
+            def iterator(*args, **kwargs):
+                return AsyncIterator(self.run, attr, *args, **kwargs)
+
+            return iterator
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return method
+
+    async def rebalance_is_done(self) -> bool:
+        progress = await self.rebalance_progress
+        return progress["status"] == "none"
+
+    async def wait_for_rebalance(
+        self,
+        max_wait=60,
+        interval=1,
+        timeout=None,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        on_progress=None,
+    ):
+        """
+        Waits for a rebalance operation to complete, without blocking the
+        event loop between polls. Same arguments as
+        Cluster.wait_for_rebalance().
+        """
+
+        if timeout is None:
+            timeout = max_wait * interval
+        deadline = time.monotonic() + timeout
+        monitor = RebalanceMonitor(min_interval=interval, max_interval=max_interval)
+
+        while True:
+            status = monitor.update(await self.rebalance_progress)
+            if on_progress is not None:
+                on_progress(status)
+            if not status.running:
+                return status
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Rebalance did not complete in time.")
+            await asyncio.sleep(min(monitor.next_interval(status), remaining))
+
+    def close(self):
+        self.cluster.close()
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, wait
+
+from .exceptions import BackupJobException, BackupJobRunnerClosedException
+
+DEFAULT_MAX_CONCURRENT_JOBS = 4
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_CLOSE_TIMEOUT = 60
+# Recent taskHistory entries fetched per repository and poll. Running jobs
+# are among the most recent tasks of their repository.
+DEFAULT_HISTORY_PAGE_SIZE = 20
+
+JOB_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+
+def task_counters(task: dict):
+    """
+    Returns the (bytes, items) received so far by a backup service task,
+    summed over its buckets. Items are mutations and deletions.
+    """
+
+    stats = task.get("stats") or {}
+    sources = list((stats.get("buckets") or {}).values()) or [stats]
+
+    received_bytes = sum(source.get("bytes_received", 0) for source in sources)
+    received_items = sum(
+        source.get("mutations_received", 0) + source.get("deletions_received", 0) for source in sources
+    )
+    return received_bytes, received_items
+
+
+class BackupJob:
+    """
+    One restore started by a BackupJobRunner.
+
+    `future` resolves to the final taskHistory entry of the task, or raises
+    BackupJobException if the task failed. `bytes_per_second` and
+    `items_per_second` are the throughput between the last two polls.
+    """
+
+    def __init__(self, repository_status: str, repository_name: str, specification: dict):
+        self.repository_status = repository_status
+        self.repository_name = repository_name
+        self.specification = specification
+        self.task_name = None
+        self.status = JOB_PENDING
+        self.task = None
+        self.bytes_received = 0
+        self.items_received = 0
+        self.bytes_per_second = 0.0
+        self.items_per_second = 0.0
+        self.future = Future()
+
+        self._sampled_at = None
+
+    def update(self, task: dict, now: float):
+        received_bytes, received_items = task_counters(task)
+
+        if self._sampled_at is not None and now > self._sampled_at:
+            elapsed = now - self._sampled_at
+            self.bytes_per_second = (received_bytes - self.bytes_received) / elapsed
+            self.items_per_second = (received_items - self.items_received) / elapsed
+
+        self._sampled_at = now
+        self.bytes_received = received_bytes
+        self.items_received = received_items
+        self.status = task.get("status", self.status)
+        self.task = task
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def __repr__(self):
+        return (
+            f"BackupJob({self.repository_name!r}, task={self.task_name!r}, status={self.status!r}, "
+            f"bytes_per_second={self.bytes_per_second:.0f}, items_per_second={self.items_per_second:.0f})"
+        )
+
+
+class BackupJobRunner:
+    """
+    Runs restores through the backup service, at most `max_concurrent` at a
+    time, and follows their tasks until they finish.
+
+    A single background thread starts queued jobs and polls the running
+    ones every `poll_interval` seconds. Each poll fetches the recent task
+    history once per repository, whatever the number of jobs restoring from
+    it; a job whose task is not among the recent tasks is looked up on its
+    own through the `taskName` filter. `on_progress` is called with the list
+    of running jobs after each poll.
+
+        with BackupJobRunner(cluster, max_concurrent=2) as runner:
+            jobs = [
+                runner.restore("repo", {"target": "127.0.0.1:8091", "include_data": bucket})
+                for bucket in ["a", "b", "c"]
+            ]
+        for job in jobs:
+            print(job.result()["status"])
+    """
+
+    def __init__(
+        self,
+        cluster,
+        max_concurrent=DEFAULT_MAX_CONCURRENT_JOBS,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        on_progress=None,
+    ):
+        self.cluster = cluster
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.on_progress = on_progress
+        self.jobs = []
+
+        self._pending = deque()
+        self._running = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def restore(self, repository_name: str, restore_specification: dict, repository_status="active") -> BackupJob:
+        """
+        Queues a restore and returns its BackupJob without waiting for it
+        to start.
+        """
+
+        job = BackupJob(repository_status, repository_name, restore_specification)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BackupJobRunner is closed")
+            self.jobs.append(job)
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="backup-job-runner", daemon=True)
+                self._thread.start()
+
+        self._wakeup.set()
+        return job
+
+    def wait(self, timeout=None) -> list:
+        """
+        Waits for all jobs queued so far to finish and returns them.
+        """
+
+        jobs = list(self.jobs)
+        wait([job.future for job in jobs], timeout=timeout)
+        return jobs
+
+    def close(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """
+        Cancels the jobs that have not started yet and stops polling, waiting
+        at most `timeout` seconds for an ongoing poll. Running jobs fail with
+        BackupJobRunnerClosedException; their tasks keep running on the
+        cluster.
+        """
+
+        with self._lock:
+            self._closed = True
+            while self._pending:
+                self._pending.popleft().future.cancel()
+            thread = self._thread
+
+        self._wakeup.set()
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                logging.warning("Backup job runner did not stop in time")
+        self._abandon_running()
+
+    def _abandon_running(self):
+        with self._lock:
+            running = list(self._running)
+        for job in running:
+            if job.done():
+                continue
+            error = BackupJobRunnerClosedException(
+                f"Backup job runner closed while task {job.task_name} was running", job.task
+            )
+            try:
+                job.future.set_exception(error)
+            except InvalidStateError:
+                # Finished by a last poll in the meantime.
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.wait()
+        self.close()
+
+    def _start(self, job: BackupJob):
+        try:
+            task = self.cluster.restore_backup(job.repository_status, job.repository_name, job.specification)
+        except Exception as e:
+            job.future.set_exception(e)
+            return
+
+        job.task_name = task["task_name"]
+        job.status = TASK_RUNNING
+        with self._lock:
+            self._running.append(job)
+        logging.info(f"Started restore {job.task_name} from {job.repository_name}")
+
+    def _update(self, job: BackupJob, task: dict, now: float):
+        job.update(task, now)
+        if job.status == TASK_DONE:
+            job.future.set_result(job.task)
+        elif job.status == TASK_FAILED:
+            job.future.set_exception(
+                BackupJobException(f"Backup task {job.task_name} failed: {job.task.get('error')}", job.task)
+            )
+
+    def _poll(self, repository_status: str, repository_name: str, jobs: list):
+        history = self.cluster.get_backup_task_history(
+            repository_status,
+            repository_name,
+            limit=DEFAULT_HISTORY_PAGE_SIZE + len(jobs),
+        )
+        now = time.monotonic()
+        tasks = {task.get("task_name"): task for task in history}
+
+        for job in jobs:
+            task = tasks.get(job.task_name)
+            if task is None:
+                found = self.cluster.get_backup_task_history(
+                    repository_status,
+                    repository_name,
+                    task_name=job.task_name,
+                )
+                if not found:
+                    # The task is not in the history yet.
+                    continue
+                task = found[0]
+            self._update(job, task, now)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if self._closed or not (self._pending or self._running):
+                    self._thread = None
+                    break
+                starting = []
+                while self._pending and len(self._running) + len(starting) < self.max_concurrent:
+                    starting.append(self._pending.popleft())
+
+            for job in starting:
+                self._start(job)
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if self._closed:
+                continue
+
+            with self._lock:
+                repositories = {}
+                for job in self._running:
+                    repositories.setdefault((job.repository_status, job.repository_name), []).append(job)
+
+            for (repository_status, repository_name), jobs in repositories.items():
+                try:
+                    self._poll(repository_status, repository_name, jobs)
+                except Exception as e:
+                    # Retried on the next poll.
+                    logging.warning(f"Failed to poll backup tasks of {repository_name}: {e}")
+
+            with self._lock:
+                self._running = [job for job in self._running if not job.done()]
+                running = list(self._running)
+
+            if self.on_progress is not None:
+                self.on_progress(running)
+
+        if self._closed:
+            self._abandon_running()
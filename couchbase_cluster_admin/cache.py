@@ -0,0 +1,148 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ResponseCache:
+    """
+    Thread-safe cache of parsed GET responses, keyed by endpoint path.
+
+    `ttl` is either a number of seconds applied to every endpoint, or a
+    dictionary of per-endpoint TTLs. Endpoints without a TTL (the default)
+    are not cached, except inside a snapshot() block, during which every
+    read is frozen: each endpoint is fetched at most once, until it is
+    invalidated.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._snapshot_depth = 0
+
+    def ttl_for(self, key) -> float:
+        if isinstance(self.ttl, dict):
+            return self.ttl.get(key, 0)
+        return self.ttl
+
+    @property
+    def frozen(self) -> bool:
+        return self._snapshot_depth > 0
+
+    def get(self, key):
+        """
+        Returns a (hit, value) tuple.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+
+            expires_at, value = entry
+            if self.frozen or time.monotonic() < expires_at:
+                return True, value
+
+            del self._entries[key]
+            return False, None
+
+    def put(self, key, value):
+        ttl = self.ttl_for(key)
+        if ttl <= 0 and not self.frozen:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, *keys):
+        """
+        Drop the given keys, or everything if no keys are given.
+        """
+
+        with self._lock:
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+
+    @contextmanager
+    def snapshot(self):
+        with self._lock:
+            self._snapshot_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._snapshot_depth -= 1
+                if not self._snapshot_depth:
+                    # Entries stored only because of the snapshot expire now.
+                    now = time.monotonic()
+                    self._entries = {
+                        key: entry for key, entry in self._entries.items() if entry[0] > now
+                    }
+
+
+class ResourceVersion:
+    __slots__ = ("etag", "digest", "revision", "value")
+
+    def __init__(self, etag, digest, revision, value):
+        self.etag = etag
+        self.digest = digest
+        self.revision = revision
+        self.value = value
+
+
+class ResourceVersions:
+    """
+    Remembers the last payload of polled endpoints, to detect unchanged
+    responses without parsing them again.
+
+    A response is unchanged if the server answers 304 Not Modified to the
+    ETag we sent back, or if its body has the same digest as last time.
+    The revision is the `version`, `etag` or `rev` field of the payload
+    (indexStatus has `version`), if any.
+    """
+
+    REVISION_FIELDS = ("version", "etag", "rev")
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key) -> ResourceVersion:
+        with self._lock:
+            return self._versions.get(key)
+
+    def update(self, key, etag, content: bytes, parse):
+        """
+        Returns a (value, changed) tuple, calling `parse` only if the content
+        differs from the previous one.
+        """
+
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        previous = self.get(key)
+        if previous is not None and previous.digest == digest:
+            previous.etag = etag
+            return previous.value, False
+
+        value = parse()
+        revision = None
+        if isinstance(value, dict):
+            revision = next((value[f] for f in self.REVISION_FIELDS if f in value), None)
+
+        with self._lock:
+            self._versions[key] = ResourceVersion(etag, digest, revision, value)
+
+        return value, True
+
+    def revision(self, key):
+        version = self.get(key)
+        return version.revision if version else None
+
+    def invalidate(self, *keys):
+        with self._lock:
+            if not keys:
+                self._versions.clear()
+            for key in keys:
+                self._versions.pop(key, None)
@@ -1,40 +1,337 @@
 import logging
+import threading
 import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .instrumentation import RequestEvent
+from .retry import DEFAULT_RETRY_POLICY, RetryBudget
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class ConnectionStats:
+    """
+    Thread-safe counters for connections checked out of the HTTP pools.
+
+    A connection is counted as new when it has no open socket at checkout
+    time, i.e. a TCP connect (and TLS handshake) is about to happen.
+    Otherwise a kept-alive connection is being reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    def record_checkout(self, new: bool):
+        with self._lock:
+            if new:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+            }
+
+
+# Connect and TLS handshake durations of the request being sent by the
+# current thread, set by the timed connection classes below.
+_connection_timings = threading.local()
+
+# Guards the lazy creation of client sessions.
+_session_lock = threading.Lock()
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        _connection_timings.connect = time.perf_counter() - started
+        return sock
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if isinstance(self, HTTPSConnection):
+            elapsed = time.perf_counter() - started
+            _connection_timings.tls = max(0.0, elapsed - (_connection_timings.connect or 0.0))
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CountingPoolMixin:
+    connection_stats = None
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        if self.connection_stats is not None:
+            self.connection_stats.record_checkout(getattr(conn, "sock", None) is None)
+        return conn
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that keeps per-host keep-alive pools, counts new versus
+    reused connections and times connection setup.
+    """
+
+    def __init__(self, connection_stats=None, **kwargs):
+        self.connection_stats = connection_stats or ConnectionStats()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        attrs = {"connection_stats": self.connection_stats}
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type(
+                "CountingHTTPConnectionPool",
+                (_CountingPoolMixin, HTTPConnectionPool),
+                dict(attrs, ConnectionCls=_TimedHTTPConnection),
+            ),
+            "https": type(
+                "CountingHTTPSConnectionPool",
+                (_CountingPoolMixin, HTTPSConnectionPool),
+                dict(attrs, ConnectionCls=_TimedHTTPSConnection),
+            ),
+        }
+
+
+def create_session(
+    pool_connections=DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    connection_stats=None,
+):
+    """
+    Create a requests session with keep-alive connection pooling.
+
+    `pool_connections` is the number of per-host pools to keep, and
+    `pool_maxsize` the number of connections kept alive in each of them.
+    A session can be shared between several clients by passing it as their
+    `session` argument.
+    """
+
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(
+        connection_stats=connection_stats,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
 
 
 class BaseClient:
-    def __init__(self, tls_verify=True):
+    def __init__(
+        self,
+        tls_verify=True,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        session=None,
+        retry_policy=None,
+        retry_budget=None,
+    ):
         self.tls_verify = tls_verify
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._session = session
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.retry_budget = retry_budget or RetryBudget()
+        self.observers = []
+
+    @property
+    def session(self):
+        """
+        The pooled requests session used for all requests of this client.
+
+        Created on first use, unless one was passed to the constructor.
+        """
+
+        session = getattr(self, "_session", None)
+        if session is None:
+            with _session_lock:
+                session = getattr(self, "_session", None)
+                if session is None:
+                    session = self._session = create_session(
+                        pool_connections=getattr(self, "pool_connections", DEFAULT_POOL_CONNECTIONS),
+                        pool_maxsize=getattr(self, "pool_maxsize", DEFAULT_POOL_MAXSIZE),
+                    )
+        return session
+
+    @property
+    def connection_stats(self):
+        """
+        Counters of new and reused connections, summed over all adapters
+        mounted on the session.
+        """
+
+        stats = {"new_connections": 0, "reused_connections": 0}
+        seen = set()
+        for adapter in self.session.adapters.values():
+            counters = getattr(adapter, "connection_stats", None)
+            if counters is None or id(counters) in seen:
+                continue
+            seen.add(id(counters))
+            for key, value in counters.as_dict().items():
+                stats[key] += value
+
+        return stats
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+
+        with _session_lock:
+            session, self._session = getattr(self, "_session", None), None
+        if session is not None:
+            session.close()
+
+    def add_observer(self, observer):
+        """
+        Registers a callable receiving a RequestEvent after each request,
+        e.g. an instrumentation.RequestMetrics.
+        """
+
+        if getattr(self, "observers", None) is None:
+            self.observers = []
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _notify(self, event: RequestEvent):
+        for observer in self.observers:
+            try:
+                observer(event)
+            except Exception as e:
+                logging.warning(f"Request observer {observer!r} failed: {e}")
+
+    def before_request(self, method: str, url: str):
+        """
+        Called before each request is sent. Does nothing by default.
+        """
+
+    def http_request(
+        self,
+        url,
+        method="GET",
+        data=None,
+        json=None,
+        headers={},
+        timeout=58.0,
+        stream=False,
+        idempotent=None,
+        retry_policy=None,
+    ):
+        """
+        Sends a request, retrying according to the retry policy of the
+        client, or `retry_policy` if given.
+
+        `idempotent` overrides whether the policy considers the request safe
+        to send again. Raises the last exception once retries run out; a
+        response with a retryable status is returned as is.
+        """
 
-    def http_request(self, url, method="GET", data=None, json=None, headers={}, timeout=58.0):
         auth = None
         if self.username is not None and self.password is not None:
             auth = (self.username, self.password)
 
-        # Retrying POST requests could lead to unexpected results,
-        # but we've seen the join cluster operation (a POST) fail most often.
-        max_retries = 3
+        self.before_request(method, url)
+
+        policy = retry_policy or getattr(self, "retry_policy", None) or DEFAULT_RETRY_POLICY
+        budget = getattr(self, "retry_budget", None)
+        if budget is not None:
+            budget.deposit()
 
-        while max_retries > 0:
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            error = response = None
+            _connection_timings.connect = _connection_timings.tls = None
             try:
-                max_retries = max_retries - 1
-                response = requests.request(
+                response = self.session.request(
                     method,
                     url,
                     data=data,
                     json=json,
                     headers=headers,
                     auth=auth,
-                    timeout=timeout,
+                    timeout=policy.attempt_timeout(timeout, time.monotonic() - started),
                     verify=self.tls_verify,
+                    stream=stream,
                 )
+            except requests.exceptions.RequestException as e:
+                error = e
 
-                return response
-            except requests.exceptions.ReadTimeout as e:
-                logging.warning(
-                    f"ReadTimeout exception for request {method} {url}. "
-                    + f"{max_retries} retries left: {e}"
-                )
-                time.sleep(1)
+            if not policy.should_retry(method, attempt, error=error, response=response, idempotent=idempotent):
+                break
+
+            delay = policy.delay(attempt, response)
+            if policy.deadline is not None and time.monotonic() - started + delay > policy.deadline:
+                logging.warning(f"Not retrying {method} {url}: deadline of {policy.deadline}s exceeded")
+                break
+            if budget is not None and not budget.withdraw():
+                logging.warning(f"Not retrying {method} {url}: retry budget exhausted")
+                break
+
+            reason = error if error is not None else f"HTTP {response.status_code}"
+            logging.warning(
+                f"Request {method} {url} failed (attempt {attempt} of {policy.max_attempts}), "
+                f"retrying in {delay:.2f}s: {reason}"
+            )
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        if getattr(self, "observers", None):
+            duration = time.monotonic() - started
+            self._notify(self._request_event(method, url, stream, response, error, duration, attempt - 1))
+
+        if error is not None:
+            raise error
+        return response
+
+    def _request_event(self, method, url, stream, response, error, duration, retries) -> RequestEvent:
+        event = RequestEvent(
+            method,
+            url,
+            error=error,
+            connect=getattr(_connection_timings, "connect", None),
+            tls=getattr(_connection_timings, "tls", None),
+            duration=duration,
+            retries=retries,
+        )
+        if response is None:
+            return event
+
+        event.status = response.status_code
+        body = response.request.body if response.request is not None else None
+        event.request_bytes = len(body) if body else 0
+        if response.headers.get("Content-Length", "").isdigit():
+            event.response_bytes = int(response.headers["Content-Length"])
+        elif not stream:
+            event.response_bytes = len(response.content)
+
+        # `elapsed` runs from sending the request to parsing the response
+        # headers, including connection setup.
+        event.ttfb = max(0.0, response.elapsed.total_seconds() - (event.connect or 0.0) - (event.tls or 0.0))
+        return event
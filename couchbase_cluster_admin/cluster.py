@@ -1,9 +1,39 @@
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 
-from .client import BaseClient
+import requests
+
+from .cache import ResourceVersions, ResponseCache
+from .client import DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, BaseClient
 from .exceptions import *
-from .ssh_tunnel import SshTunnel
+from .failover import NodeSelector, is_cluster_wide
+from .manifest import manifest_diff, merge_manifests
+from .query import (
+    DEFAULT_PREPARED_STATEMENT_CACHE_SIZE,
+    REPREPARE_ERROR_CODES,
+    PreparedStatementCache,
+    QueryStream,
+)
+from .rebalance import DEFAULT_MAX_INTERVAL, RebalanceMonitor
+from .retry import NO_RETRY_POLICY, is_connect_error
+from .ssh_tunnel import get_tunnel_manager
+from .stats import DEFAULT_BATCH_SIZE as DEFAULT_STATS_BATCH_SIZE
+from .stats import (
+    StatsResult,
+    batches,
+    decode_statistics,
+    xdcr_progress_from_statistics,
+    xdcr_statistics_specifications,
+)
+from .streaming import (
+    DEFAULT_STREAM_READ_TIMEOUT,
+    diff_bucket,
+    diff_pool,
+    iter_events,
+    iter_reconnecting_documents,
+)
 
 COUCHBASE_HOST = "127.0.0.1"
 COUCHBASE_PORT_REST = "8091"
@@ -34,6 +64,16 @@ class Cluster(BaseClient):
         password=None,
         connect_through_ssh=False,
         ssh_username=None,
+        ssh_host=None,
+        ssh_tunnel_manager=None,
+        http_pool_connections=DEFAULT_POOL_CONNECTIONS,
+        http_pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        http_session=None,
+        response_cache_ttl=None,
+        prepared_statement_cache_size=DEFAULT_PREPARED_STATEMENT_CACHE_SIZE,
+        retry_policy=None,
+        retry_budget=None,
+        seed_nodes=None,
     ):
         self.cluster_name = cluster_name
         self.services = services or ["kv"]
@@ -43,38 +83,251 @@ class Cluster(BaseClient):
         self.username = username
         self.password = password
 
-        # This property is used in BaseClient.
-        self.tls_verify = api_tls_verify
+        # Pass `http_session` to share one connection pool between several
+        # Cluster instances.
+        super().__init__(
+            tls_verify=api_tls_verify,
+            pool_connections=http_pool_connections,
+            pool_maxsize=http_pool_maxsize,
+            session=http_session,
+            retry_policy=retry_policy,
+            retry_budget=retry_budget,
+        )
 
-        if connect_through_ssh:
-            if not ssh_username:
-                raise ValueError("You need to specify a `ssh_username`")
+        # Opt-in cache for cluster state reads; see ResponseCache.
+        self.response_cache = ResponseCache(response_cache_ttl)
+        self.resource_versions = ResourceVersions()
+        self.prepared_statements = PreparedStatementCache(prepared_statement_cache_size)
 
-            self.ssh_tunnel = SshTunnel(
-                ssh_username=ssh_username,
-                remote_host=api_host,
-                remote_port=api_port,
-            )
-            self.ssh_tunnel.start()
+        # With seed nodes, cluster-wide requests go to the fastest healthy
+        # node; see http_request(). Node-local requests stay on `api_host`.
+        self.node_selector = None
+        if seed_nodes:
+            if connect_through_ssh:
+                raise ValueError("`seed_nodes` cannot be used with `connect_through_ssh`")
+            addresses = [self._node_address(api_host)] + [self._node_address(node) for node in seed_nodes]
+            self.node_selector = NodeSelector(addresses)
+
+        if connect_through_ssh:
+            # Tunnels are shared through the tunnel manager, one SSH connection
+            # per host and user. The SSH host may be an alias of ~/.ssh/config,
+            # which may also set the user. Without a bastion `ssh_host`,
+            # connect to the node itself and forward to its loopback REST
+            # port. The local port is reserved now; the SSH connection is only
+            # opened by the first request, see before_request().
+            manager = ssh_tunnel_manager or get_tunnel_manager()
+            if ssh_host:
+                self.ssh_tunnel = manager.lease(ssh_host, ssh_username, api_port, remote_host=api_host)
+            else:
+                self.ssh_tunnel = manager.lease(api_host, ssh_username, api_port)
             self.api_host = self.ssh_tunnel.local_host
             self.api_port = self.ssh_tunnel.local_port
-            logging.info(f"Started ssh tunnel to {api_host}:{api_port} on {self.api_host}:{self.api_port}")
+            logging.info(f"Forwarding {self.api_host}:{self.api_port} to {api_host}:{api_port} over ssh")
         else:
             self.ssh_tunnel = None
 
+    def before_request(self, method: str, url: str):
+        # Open the SSH tunnel, or reopen it if it died, so that connection
+        # problems surface as SSH errors rather than request errors.
+        if getattr(self, "ssh_tunnel", None) is not None:
+            self.ssh_tunnel.connect()
+
+    @property
+    def tunnel_setup_latency(self):
+        """
+        Seconds the last SSH tunnel setup took, or None.
+        """
+
+        return self.ssh_tunnel.setup_latency if getattr(self, "ssh_tunnel", None) is not None else None
+
+    def close(self):
+        """
+        Closes pooled connections and releases the SSH tunnel, if any.
+        """
+
+        super().close()
+        if getattr(self, "ssh_tunnel", None) is not None:
+            logging.info(f"Releasing ssh tunnel {self.api_host}:{self.api_port}")
+            self.ssh_tunnel.release()
+
     def __del__(self):
-        if self.ssh_tunnel is not None:
-            logging.info(f"Stopping ssh tunnel {self.api_host}:{self.api_port}")
-            self.ssh_tunnel.stop()
+        if getattr(self, "ssh_tunnel", None) is not None:
+            self.ssh_tunnel.release()
 
     @property
     def baseurl(self):
         return f"{self.api_protocol}://{self.api_host}:{self.api_port}"
 
-    def enable_services(self):
+    def _node_address(self, node: str) -> str:
+        # "host" or "host:port"; IPv6 addresses must be bracketed.
+        host, _, port = node.rpartition(":")
+        if host and port.isdigit() and not host.endswith(":"):
+            return node
+        return f"{node}:{self.api_port}"
+
+    def _learn_nodes(self, pool: dict):
+        if self.node_selector is None:
+            return
+
+        addresses = []
+        for node in pool.get("nodes", []):
+            host = node["hostname"].rpartition(":")[0]
+            if self.api_protocol == "https":
+                addresses.append(f"{host}:{node.get('ports', {}).get('httpsMgmt', COUCHBASE_SECURE_PORT_REST)}")
+            else:
+                addresses.append(node["hostname"])
+        self.node_selector.update(addresses)
+
+    def http_request(self, url, method="GET", idempotent=None, **kwargs):
+        """
+        Sends cluster-wide requests (see failover.CLUSTER_WIDE_PATHS) to the
+        fastest healthy node when `seed_nodes` were given. Other requests go
+        to `api_host`.
+
+        Each attempt goes to the next candidate node, without retrying on
+        the same node first; the retry policy only applies, with its
+        backoff, once every candidate failed. Idempotent requests (see
+        RetryPolicy) fail over on connection errors, timeouts and 5xx
+        responses; other requests only when the connection could not be
+        established, so that a mutation is never sent twice.
+        """
+
+        path = url[len(self.baseurl):]
+        if (
+            getattr(self, "node_selector", None) is None
+            or not url.startswith(self.baseurl)
+            or not is_cluster_wide(path)
+        ):
+            return super().http_request(url, method=method, idempotent=idempotent, **kwargs)
+
+        policy = self.retry_policy
+        idempotent = policy.is_idempotent(method, idempotent)
+        timeout = kwargs.pop("timeout", 58.0)
+        started = time.monotonic()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            resp = error = None
+            for node in self.node_selector.candidates():
+                node_started = time.monotonic()
+                if (resp is not None or error is not None) and (
+                    policy.deadline is not None and node_started - started >= policy.deadline
+                ):
+                    break
+                if resp is not None:
+                    resp.close()
+                resp = error = None
+                try:
+                    resp = super().http_request(
+                        f"{self.api_protocol}://{node.address}{path}",
+                        method=method,
+                        timeout=policy.attempt_timeout(timeout, node_started - started),
+                        idempotent=idempotent,
+                        retry_policy=NO_RETRY_POLICY,
+                        **kwargs,
+                    )
+                except requests.exceptions.RequestException as e:
+                    node.record_failure()
+                    if not idempotent and not is_connect_error(e):
+                        raise
+                    error = e
+                    logging.warning(f"Request to {node.address} failed, trying the next node: {e}")
+                    continue
+
+                if resp.status_code >= 500:
+                    node.record_failure()
+                    if not idempotent:
+                        return resp
+                    logging.warning(
+                        f"Request to {node.address} failed with HTTP {resp.status_code}, trying the next node"
+                    )
+                    continue
+
+                node.record_success(time.monotonic() - node_started)
+                return resp
+
+            # Every candidate failed.
+            if not policy.should_retry(method, attempt, error=error, response=resp, idempotent=idempotent):
+                break
+            delay = policy.delay(attempt, resp)
+            if policy.deadline is not None and time.monotonic() - started + delay > policy.deadline:
+                break
+            if not self.retry_budget.withdraw():
+                break
+            logging.warning(f"Request {method} {path} failed on all nodes, retrying in {delay:.2f}s")
+            if resp is not None:
+                resp.close()
+            time.sleep(delay)
+
+        if resp is None:
+            raise error
+        return resp
+
+    def snapshot(self):
+        """
+        Context manager freezing cached reads, so that a batch of property
+        reads costs one GET per endpoint:
+
+            with cluster.snapshot():
+                name, uuid, nodes = cluster.node_name, cluster.node_uuid, cluster.known_nodes
+        """
+
+        return self.response_cache.snapshot()
+
+    def _get_json(self, path: str, description: str, conditional=False):
+        """
+        GET through the response cache. The returned value is shared with
+        the cache and with other callers, so it is read-only: callers that
+        need to modify it must copy it first (copy.deepcopy()).
+        """
+
+        hit, value = self.response_cache.get(path)
+        if hit:
+            return value
+
+        if conditional:
+            value, _ = self._poll_json(path, description)
+            return value
+
+        resp = self.http_request(f"{self.baseurl}{path}")
+        if resp.status_code != 200:
+            raise Exception(f"Failed to get {description}: {resp.text}")
+
+        value = resp.json()
+        self.response_cache.put(path, value)
+        return value
+
+    def _poll_json(self, path: str, description: str):
+        """
+        Conditional GET returning a (value, changed) tuple. Unchanged payloads
+        are not parsed again, and the previously returned object is reused;
+        it is read-only, as for _get_json().
+        """
+
+        headers = {}
+        previous = self.resource_versions.get(path)
+        if previous is not None and previous.etag:
+            headers["If-None-Match"] = previous.etag
+
+        resp = self.http_request(f"{self.baseurl}{path}", headers=headers)
+        if resp.status_code == 304 and previous is not None:
+            return previous.value, False
+        if resp.status_code != 200:
+            raise Exception(f"Failed to get {description}: {resp.text}")
+
+        value, changed = self.resource_versions.update(
+            path, resp.headers.get("ETag"), resp.content, resp.json
+        )
+        self.response_cache.put(path, value)
+        return value, changed
+
+    def enable_services(self, services: list = None):
         """
         https://docs.couchbase.com/server/current/manage/manage-nodes/create-cluster.html#provision-a-node-with-the-rest-api
         https://docs.couchbase.com/server/current/rest-api/rest-node-services.html
+
+        Enables `services`, by default the services of the cluster object.
         """
 
         url = f"{self.baseurl}/node/controller/setupServices"
@@ -82,9 +335,10 @@ class Cluster(BaseClient):
             url,
             method="POST",
             data={
-                "services": ",".join(self.services),
+                "services": ",".join(services if services is not None else self.services),
             },
         )
+        self.response_cache.invalidate("/nodes/self", "/pools/default")
         if resp.status_code != 200:
             raise Exception(f"Failed to enable services: {resp.text}")
 
@@ -97,6 +351,7 @@ class Cluster(BaseClient):
         payload = {"clusterName": cluster_name}
 
         resp = self.http_request(url, method="POST", data=payload)
+        self.response_cache.invalidate("/pools/default")
         if resp.status_code != 200:
             raise SetClusterNameException(resp.text)
 
@@ -124,6 +379,7 @@ class Cluster(BaseClient):
             method="POST",
             data=quotas,
         )
+        self.response_cache.invalidate("/pools/default")
         if resp.status_code != 200:
             raise SetMemoryQuotaException(resp.text)
 
@@ -165,6 +421,7 @@ class Cluster(BaseClient):
                 "port": "SAME",
             },
         )
+        self.response_cache.invalidate()
         if resp.status_code != 200:
             raise SetAuthenticationException(resp.text)
 
@@ -199,6 +456,7 @@ class Cluster(BaseClient):
             method="POST",
             data=disk_paths,
         )
+        self.response_cache.invalidate("/nodes/self")
         if resp.status_code != 200:
             raise Exception(f"Failed to set disk paths: {resp.text}")
 
@@ -226,6 +484,7 @@ class Cluster(BaseClient):
         payload = {"hostname": new_hostname}
 
         resp = self.http_request(url, method="POST", data=payload)
+        self.response_cache.invalidate("/nodes/self", "/pools/default")
         if resp.status_code != 200:
             raise NodeRenameException(resp.text)
 
@@ -234,6 +493,7 @@ class Cluster(BaseClient):
         # node to an internal-only IP while accessing it from an external one)
         if update_self:
             self.api_host = new_hostname
+            self.response_cache.invalidate()
 
     def join_cluster(
         self,
@@ -256,9 +516,13 @@ class Cluster(BaseClient):
             target_ip = f"http://{target_ip}"
             logging.warning("Insecure join will be rejected by Couchbase >= 7.1")
 
+        # Joining is retried like an idempotent request: it is the operation
+        # seen to time out most often, and joining the same cluster twice is
+        # harmless.
         resp = self.http_request(
             url,
             method="POST",
+            idempotent=True,
             data={
                 "clusterMemberHostIp": target_ip,
                 "clusterMemberPort": target_port,
@@ -267,6 +531,7 @@ class Cluster(BaseClient):
                 "password": self.password if password is None else password,
             },
         )
+        self.response_cache.invalidate()
 
         if resp.status_code == 400:
             if "Adding nodes to not provisioned" in resp.text:
@@ -278,18 +543,114 @@ class Cluster(BaseClient):
         if resp.status_code != 200:
             raise ClusterJoinException(resp.text)
 
+    def add_node(
+        self,
+        hostname: str,
+        username=None,
+        password=None,
+        services: list = None,
+    ):
+        """
+        https://docs.couchbase.com/server/current/rest-api/rest-cluster-addnodes.html
+
+        Adds a node to the cluster we're connected to, as seen from the
+        orchestrating side, as opposed to join_cluster() which is run on the
+        joining node. Returns the otpNode name of the added node.
+        """
+
+        url = f"{self.baseurl}/controller/addNode"
+
+        resp = self.http_request(
+            url,
+            method="POST",
+            data={
+                "hostname": hostname,
+                "user": self.username if username is None else username,
+                "password": self.password if password is None else password,
+                "services": ",".join(services or self.services),
+            },
+        )
+        self.response_cache.invalidate()
+
+        if resp.status_code == 400:
+            if "Adding nodes to not provisioned" in resp.text:
+                raise AddToNotProvisionedNodeException(resp.text)
+
+            if "Failed to connect to" in resp.text:
+                raise ConnectToControllerOnJoinException(resp.text)
+
+        if resp.status_code != 200:
+            raise AddNodeException(resp.text)
+
+        return resp.json()["otpNode"]
+
+    def add_nodes(
+        self,
+        hostnames: list,
+        username=None,
+        password=None,
+        services: list = None,
+        max_workers=8,
+        retries=3,
+        retry_interval=1,
+        timeout=60,
+        rebalance=True,
+    ):
+        """
+        Adds many nodes concurrently, then starts a single rebalance.
+
+        Each node is retried up to `retries` times when the cluster fails to
+        connect to it. Once all nodes have been added, waits up to `timeout`
+        seconds for them to show up in `known_nodes` before rebalancing.
+        Returns the otpNode names of the added nodes.
+        """
+
+        def add(hostname):
+            for attempt in range(retries + 1):
+                try:
+                    return self.add_node(hostname, username, password, services)
+                except ConnectToControllerOnJoinException as e:
+                    if attempt == retries:
+                        raise
+                    logging.warning(f"Failed to add node {hostname}, retrying: {e}")
+                    time.sleep(retry_interval)
+
+        otp_nodes = {}
+        errors = {}
+        if hostnames:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(hostnames))) as executor:
+                futures = {executor.submit(add, hostname): hostname for hostname in hostnames}
+                for future, hostname in futures.items():
+                    try:
+                        otp_nodes[hostname] = future.result()
+                    except Exception as e:
+                        errors[hostname] = e
+
+        if errors:
+            failed = "; ".join(f"{hostname}: {e}" for hostname, e in errors.items())
+            raise AddNodeException(f"Failed to add nodes: {failed}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            missing = set(otp_nodes.values()) - set(self.known_nodes)
+            if not missing:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Added nodes not known to the cluster in time: {sorted(missing)}")
+            time.sleep(retry_interval)
+
+        if rebalance:
+            self.rebalance()
+
+        return [otp_nodes[hostname] for hostname in hostnames]
+
     @property
     def node_info(self):
         """
         https://docs.couchbase.com/server/current/rest-api/rest-getting-storage-information.html
         """
 
-        url = f"{self.baseurl}/nodes/self"
-        resp = self.http_request(url)
-        if resp.status_code != 200:
-            raise Exception(f"Failed to get node info: {resp.text}")
-
-        return resp.json()
+        return self._get_json("/nodes/self", "node info")
 
     @property
     def node_name(self):
@@ -303,19 +664,68 @@ class Cluster(BaseClient):
     def pool_info(self):
         """
         https://docs.couchbase.com/server/current/rest-api/rest-cluster-details.html
+
+        The result is cached and shared between callers; do not modify it.
         """
 
-        url = f"{self.baseurl}/pools/default"
-        resp = self.http_request(url)
-        if resp.status_code != 200:
-            raise Exception(f"Failed to get pool info: {resp.text}")
+        pool = self._get_json("/pools/default", "pool info", conditional=True)
+        self._learn_nodes(pool)
+        return pool
 
-        return resp.json()
+    def poll_pool_info(self):
+        """
+        Returns a (pool_info, changed) tuple, where `changed` is False if the
+        pool details are the same as on the previous poll.
+
+        An unchanged result is the object returned by the previous poll.
+        Like pool_info, buckets and get_index_status(), the result is shared
+        between callers and must not be modified; copy it first if needed.
+        """
+
+        pool, changed = self._poll_json("/pools/default", "pool info")
+        if changed:
+            self._learn_nodes(pool)
+        return pool, changed
 
     @property
     def known_nodes(self):
         return [node["otpNode"] for node in self.pool_info["nodes"]]
 
+    def _stream(self, path: str, description: str, read_timeout=DEFAULT_STREAM_READ_TIMEOUT):
+        def open_stream():
+            resp = self.http_request(f"{self.baseurl}{path}", timeout=(58.0, read_timeout), stream=True)
+            if resp.status_code != 200:
+                raise Exception(f"Failed to stream {description}: {resp.text}")
+            return resp
+
+        return iter_reconnecting_documents(open_stream)
+
+    def watch_pool(self, read_timeout=DEFAULT_STREAM_READ_TIMEOUT):
+        """
+        Yields ClusterEvents from the `/poolsStreaming/default` stream: a
+        SNAPSHOT with the initial pool details, then node added, removed and
+        changed events, and bucket created and deleted events.
+
+        A single connection is kept open for as long as the generator is
+        consumed; close the generator to close it. The connection is
+        reopened when nothing, not even a heartbeat, was read for
+        `read_timeout` seconds (None to wait forever).
+        """
+
+        return iter_events(self._stream("/poolsStreaming/default", "pool", read_timeout), diff_pool)
+
+    def watch_bucket(self, bucket_name: str, read_timeout=DEFAULT_STREAM_READ_TIMEOUT):
+        """
+        Yields ClusterEvents from the `/pools/default/bs/<bucket>` stream: a
+        SNAPSHOT with the initial bucket details, then node events and
+        BUCKET_CHANGED events with the new bucket details.
+        """
+
+        return iter_events(
+            self._stream(f"/pools/default/bs/{bucket_name}", "bucket", read_timeout),
+            diff_bucket,
+        )
+
     def rebalance(
         self,
         known_nodes=None,
@@ -343,6 +753,7 @@ class Cluster(BaseClient):
             method="POST",
             data=data,
         )
+        self.response_cache.invalidate("/pools/default")
         if resp.status_code != 200:
             raise RebalanceException(resp.text)
 
@@ -363,25 +774,52 @@ class Cluster(BaseClient):
     def rebalance_is_done(self) -> bool:
         return self.rebalance_progress["status"] == "none"
 
-    def wait_for_rebalance(self, max_wait=60, interval=1):
+    def wait_for_rebalance(
+        self,
+        max_wait=60,
+        interval=1,
+        timeout=None,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        on_progress=None,
+    ):
         """
         Waits for a rebalance operation to complete
+
+        Gives up after `timeout` seconds of wall-clock time, which defaults
+        to `max_wait` * `interval`. Polls every `interval` seconds at first,
+        backing off up to `max_interval` while the rebalance is far from
+        done; see RebalanceMonitor. `on_progress` is called with a
+        RebalanceStatus, holding per-node progress and an ETA, after every
+        poll. Returns the final RebalanceStatus.
         """
-        for _ in range(max_wait):
-            if self.rebalance_is_done():
-                break
-            time.sleep(interval)
-        else:
-            raise TimeoutError("Rebalance did not complete in time.")
+
+        if timeout is None:
+            timeout = max_wait * interval
+        deadline = time.monotonic() + timeout
+        monitor = RebalanceMonitor(min_interval=interval, max_interval=max_interval)
+
+        while True:
+            status = monitor.update(self.rebalance_progress)
+            if on_progress is not None:
+                on_progress(status)
+            if not status.running:
+                return status
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Rebalance did not complete in time.")
+            time.sleep(min(monitor.next_interval(status), remaining))
 
     @property
     def buckets(self):
-        url = f"{self.baseurl}/pools/default/buckets"
-        resp = self.http_request(url)
-        if resp.status_code != 200:
-            raise Exception(f"Failed to get buckets: {resp.text}")
+        return self._get_json("/pools/default/buckets", "buckets", conditional=True)
 
-        return resp.json()
+    def poll_buckets(self):
+        """
+        Returns a (buckets, changed) tuple; see poll_pool_info().
+        """
+
+        return self._poll_json("/pools/default/buckets", "buckets")
 
     def create_bucket(self, bucket_config: dict):
         url = f"{self.baseurl}/pools/default/buckets"
@@ -390,9 +828,34 @@ class Cluster(BaseClient):
             method="POST",
             data=bucket_config,
         )
+        self.response_cache.invalidate("/pools/default/buckets", "/pools/default")
         if resp.status_code not in (200, 202):
             raise BucketCreationException(resp.text)
 
+    def wait_for_bucket_ready(self, bucket_name: str, timeout=60, interval=1):
+        """
+        Waits until the bucket exists and is healthy on all of its nodes.
+        Bucket creation is asynchronous: the bucket is only usable, e.g. for
+        creating scopes and collections, once it has warmed up everywhere.
+        """
+
+        url = f"{self.baseurl}/pools/default/buckets/{bucket_name}"
+        deadline = time.monotonic() + timeout
+
+        while True:
+            resp = self.http_request(url)
+            if resp.status_code == 200:
+                nodes = resp.json().get("nodes", [])
+                if nodes and all(node.get("status") == "healthy" for node in nodes):
+                    return
+            elif resp.status_code != 404:
+                raise Exception(f"Failed to get bucket {bucket_name}: {resp.text}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Bucket {bucket_name} not ready in time.")
+            time.sleep(min(interval, remaining))
+
     def get_scopes(self, bucket_name: str):
         url = f"{self.baseurl}/pools/default/buckets/{bucket_name}/scopes"
         resp = self.http_request(url)
@@ -421,14 +884,87 @@ class Cluster(BaseClient):
         if resp.status_code not in (200, 202):
             raise CollectionCreationException(resp.text)
 
-    @property
-    def users(self):
-        url = f"{self.baseurl}/settings/rbac/users"
-        resp = self.http_request(url)
+    def apply_collections_manifest(
+        self,
+        bucket_name: str,
+        manifest: dict,
+        use_bulk_endpoint=True,
+        max_workers=8,
+        wait=True,
+        timeout=60,
+    ):
+        """
+        https://docs.couchbase.com/server/current/rest-api/creating-a-scope.html
+
+        Creates the scopes and collections of `manifest` (in the format
+        returned by get_scopes()) that are missing from the bucket. Nothing
+        is dropped or modified.
+
+        By default the missing items are added with a single bulk manifest
+        update (PUT .../scopes), which bumps the manifest uid once. The
+        update is only valid on the manifest it was computed from, so
+        concurrent changes make it fail rather than being overwritten.
+        Without `use_bulk_endpoint`, scopes and then collections are
+        created with up to `max_workers` concurrent requests.
+
+        With `wait`, waits once at the end until the new manifest is known
+        to all nodes. Returns the resulting manifest uid.
+        """
+
+        current = self.get_scopes(bucket_name)
+        missing_scopes, missing_collections = manifest_diff(current, manifest)
+        if not missing_scopes and not missing_collections:
+            return current["uid"]
+
+        if use_bulk_endpoint:
+            url = f"{self.baseurl}/pools/default/buckets/{bucket_name}/scopes?validOnUid={current['uid']}"
+            resp = self.http_request(
+                url,
+                method="PUT",
+                json=merge_manifests(current, manifest),
+            )
+            if resp.status_code not in (200, 202):
+                raise ManifestUpdateException(resp.text)
+
+            uid = resp.json()["uid"]
+        else:
+            collections = [
+                (scope_name, collection)
+                for scope_name, scope_collections in missing_collections.items()
+                for collection in scope_collections
+            ]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Scopes must exist before their collections are created.
+                # list() re-raises the first creation error, if any.
+                list(executor.map(lambda name: self.create_scope(bucket_name, {"name": name}), missing_scopes))
+                list(executor.map(lambda item: self.create_collection(bucket_name, *item), collections))
+
+            uid = self.get_scopes(bucket_name)["uid"]
+
+        if wait:
+            self.wait_for_manifest_uid(bucket_name, uid, timeout=timeout)
+
+        return uid
+
+    def wait_for_manifest_uid(self, bucket_name: str, uid: str, timeout=60):
+        """
+        Waits until all nodes have a collection manifest at least as recent
+        as `uid`.
+        """
+
+        url = f"{self.baseurl}/pools/default/buckets/{bucket_name}/scopes/@ensureManifest/{uid}"
+        resp = self.http_request(
+            url,
+            method="POST",
+            data={"timeout": int(timeout * 1000)},
+            timeout=timeout + 58.0,
+        )
         if resp.status_code != 200:
-            raise Exception(f"Failed to get users: {resp.text}")
+            raise ManifestUpdateException(f"Manifest {uid} not propagated in time: {resp.text}")
 
-        return resp.json()
+    @property
+    def users(self):
+        return self._get_json("/settings/rbac/users", "users")
 
     def create_user(self, username, user_config: dict):
         url = f"{self.baseurl}/settings/rbac/users/local/{username}"
@@ -444,6 +980,7 @@ class Cluster(BaseClient):
             method="PUT",
             data=data,
         )
+        self.response_cache.invalidate("/settings/rbac/users")
         if resp.status_code != 200:
             raise UserCreationException(resp.text)
 
@@ -474,9 +1011,17 @@ class Cluster(BaseClient):
             method="POST",
             data=settings,
         )
+        self.response_cache.invalidate("/settings/indexes")
         if resp.status_code != 200:
             raise Exception(f"Failed to update index settings: {resp.text}")
 
+    def get_autofailover_settings(self):
+        """
+        https://docs.couchbase.com/server/current/rest-api/rest-cluster-autofailover-settings.html
+        """
+
+        return self._get_json("/settings/autoFailover", "auto failover settings")
+
     def set_autofailover(self, settings: dict):
         url = f"{self.baseurl}/settings/autoFailover"
         resp = self.http_request(
@@ -484,6 +1029,7 @@ class Cluster(BaseClient):
             method="POST",
             data=settings,
         )
+        self.response_cache.invalidate("/settings/autoFailover")
         if resp.status_code != 200:
             raise Exception(f"Failed to set auto failover settings: {resp.text}")
 
@@ -496,6 +1042,13 @@ class Cluster(BaseClient):
         if resp.status_code != 200:
             raise DeleteAlternateAddressException(resp.text)
 
+    def get_audit_settings(self):
+        """
+        https://docs.couchbase.com/server/current/rest-api/rest-auditing.html
+        """
+
+        return self._get_json("/settings/audit", "audit settings")
+
     def set_audit_settings(self, audit_settings: dict):
         """
         https://docs.couchbase.com/server/current/rest-api/rest-auditing.html
@@ -506,6 +1059,7 @@ class Cluster(BaseClient):
             method="POST",
             data=audit_settings,
         )
+        self.response_cache.invalidate("/settings/audit")
         if resp.status_code != 200:
             raise SetAuditSettingsException(resp.text)
 
@@ -519,6 +1073,13 @@ class Cluster(BaseClient):
         if resp.status_code != 200:
             raise SetAlternateAddressException(resp.text)
 
+    def get_gsi_settings(self):
+        """
+        https://docs.couchbase.com/server/current/rest-api/get-settings-indexes.html
+        """
+
+        return self._get_json("/settings/indexes", "GSI settings")
+
     def set_gsi_settings(self, gsi_settings: dict):
         """
         https://docs.couchbase.com/server/current/rest-api/post-settings-indexes.html
@@ -529,6 +1090,7 @@ class Cluster(BaseClient):
             method="POST",
             data=gsi_settings,
         )
+        self.response_cache.invalidate("/settings/indexes")
         if resp.status_code != 200:
             raise SetGsiSettingsException(resp.text)
 
@@ -595,24 +1157,85 @@ class Cluster(BaseClient):
         self,
         repository_status: str,
         repository_name: str,
+        limit: int = None,
+        offset: int = None,
+        task_name: str = None,
     ):
         """
         https://docs.couchbase.com/server/current/rest-api/backup-get-task-info.html
 
-        TODO pagination: limit=N, offset=M
-        TODO filters: taskName=s
+        Tasks are returned most recent first. `limit` and `offset` page
+        through the history, and `task_name` filters on the task name.
         """
 
         # The `_p/backup` prefix causes the request to be routed to the backup
         # service nodes automatically, without using the backup service port.
         url = f"{self.baseurl}/_p/backup/api/v1/cluster/self/repository/{repository_status}/{repository_name}/taskHistory"
 
+        params = {"limit": limit, "offset": offset, "taskName": task_name}
+        params = {key: value for key, value in params.items() if value is not None}
+        if params:
+            url += f"?{urlencode(params)}"
+
         resp = self.http_request(url)
         if resp.status_code != 200:
             raise Exception(f"Failed to get backup task history: {resp.text}")
 
         return resp.json()
 
+    def iter_backup_task_history(
+        self,
+        repository_status: str,
+        repository_name: str,
+        page_size=100,
+        task_name: str = None,
+        since_task: dict = None,
+    ):
+        """
+        Yields backup tasks most recent first, fetching the history one page
+        of `page_size` tasks at a time, only as far as it is consumed.
+
+        With `since_task`, a task yielded earlier, stops before that task run
+        so that monitoring only fetches the tasks run since the last one it
+        saw. Runs are identified by task name and start time, since the
+        tasks of a backup plan reuse their name on every run:
+
+            tasks = list(cluster.iter_backup_task_history("active", "repo", since_task=last_seen))
+            if tasks:
+                last_seen = tasks[0]
+
+        Tasks started while paging shift the history, so that a page may
+        repeat tasks of the previous one; those are skipped.
+        """
+
+        def run_key(task):
+            return task.get("task_name"), task.get("start")
+
+        stop = run_key(since_task) if since_task is not None else None
+        seen = set()
+        offset = 0
+        while True:
+            page = self.get_backup_task_history(
+                repository_status,
+                repository_name,
+                limit=page_size,
+                offset=offset,
+                task_name=task_name,
+            )
+
+            for task in page:
+                key = run_key(task)
+                if key == stop:
+                    return
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield task
+
+            if len(page) < page_size:
+                return
+            offset += len(page)
+
     def create_backup_plan(self, plan_name: str, plan_settings: dict):
         """
         https://docs.couchbase.com/server/current/rest-api/backup-rest-api.html
@@ -698,6 +1321,9 @@ class Cluster(BaseClient):
     ):
         """
         https://docs.couchbase.com/server/current/rest-api/backup-restore-data.html
+
+        Returns the started task, e.g. `{"task_name": "..."}`, which can be
+        followed with get_backup_task_history() or a BackupJobRunner.
         """
 
         # The `_p/backup` prefix causes the request to be routed to the backup
@@ -712,6 +1338,8 @@ class Cluster(BaseClient):
         if resp.status_code != 200:
             raise RestoreBackupException(resp.text)
 
+        return resp.json()
+
     def start_logs_collection(self, collection_settings: dict):
         """
         https://docs.couchbase.com/server/7.2/rest-api/rest-manage-log-collection.html
@@ -744,13 +1372,7 @@ class Cluster(BaseClient):
         https://docs.couchbase.com/server/current/rest-api/rest-xdcr-get-ref.html
         """
 
-        url = f"{self.baseurl}/pools/default/remoteClusters"
-
-        resp = self.http_request(url)
-        if resp.status_code != 200:
-            raise Exception(f"Failed to get XDCR references: {resp.text}")
-
-        return resp.json()
+        return self._get_json("/pools/default/remoteClusters", "XDCR references")
 
     def create_xdcr_reference(self, xdcr_reference_settings: dict):
         """
@@ -764,6 +1386,7 @@ class Cluster(BaseClient):
             method="POST",
             data=xdcr_reference_settings,
         )
+        self.response_cache.invalidate("/pools/default/remoteClusters")
         if resp.status_code != 200:
             raise Exception(f"Failed to create XDCR reference: {resp.text}")
 
@@ -781,11 +1404,29 @@ class Cluster(BaseClient):
             method="POST",
             data=xdcr_replication_settings,
         )
+        self.response_cache.invalidate("/pools/default/tasks")
         if resp.status_code != 200:
             raise Exception(f"Failed to create XDCR replication: {resp.text}")
 
         return resp.json()
 
+    @property
+    def tasks(self):
+        """
+        https://docs.couchbase.com/server/current/rest-api/rest-get-cluster-tasks.html
+        """
+
+        return self._get_json("/pools/default/tasks", "tasks")
+
+    def get_xdcr_replications(self):
+        """
+        XDCR replications, as listed in the cluster tasks. The `source` of a
+        replication is the bucket name, and its `target` is of the form
+        `/remoteClusters/<uuid>/buckets/<bucket>`.
+        """
+
+        return [task for task in self.tasks if task.get("type") == "xdcr"]
+
     def get_multiple_statistics(self, statistics_specifications: list):
         """
         https://docs.couchbase.com/server/current/rest-api/rest-statistics-multiple.html
@@ -803,6 +1444,36 @@ class Cluster(BaseClient):
 
         return resp.json()
 
+    def get_statistics(self, statistics_specifications: list, batch_size=DEFAULT_STATS_BATCH_SIZE) -> StatsResult:
+        """
+        Like get_multiple_statistics(), but decodes the `[timestamp, "value"]`
+        pairs into array-backed StatSeries, keyed by metric name and labels.
+
+        Specifications are sent `batch_size` at a time; a batch rejected by
+        the server as too large is split in two and retried.
+        """
+
+        result = StatsResult()
+        pending = list(batches(statistics_specifications, batch_size))
+
+        while pending:
+            batch = pending.pop(0)
+            resp = self.http_request(
+                f"{self.baseurl}/pools/default/stats/range/",
+                method="POST",
+                json=batch,
+            )
+            if resp.status_code in (400, 413) and len(batch) > 1:
+                middle = len(batch) // 2
+                pending[:0] = [batch[:middle], batch[middle:]]
+                continue
+            if resp.status_code != 200:
+                raise Exception(f"Failed to get statistics: {resp.text}")
+
+            decode_statistics(batch, resp.json(), result)
+
+        return result
+
     def get_xdcr_changes_left_total_by_bucket(self, bucket_name: str):
         """
         Convenience function for checking XDCR progress for a bucket.
@@ -861,6 +1532,58 @@ class Cluster(BaseClient):
         # `data` array is empty.
         return int(resp[0]["data"][0]["values"][0][1])
 
+    def xdcr_progress(self, buckets: list = None, window=60, step=10) -> dict:
+        """
+        XDCR progress of all source buckets (or only `buckets`) in one
+        batched statistics request. Returns a dictionary of bucket names to
+        XdcrProgress, with changes left, throughput, drain rate and ETA
+        computed over the last `window` seconds.
+
+        Requested buckets whose metrics are not populated yet are included,
+        with `changes_left` set to None.
+        """
+
+        result = self.get_statistics(xdcr_statistics_specifications(buckets, window=window, step=step))
+        return xdcr_progress_from_statistics(result, buckets)
+
+    def wait_for_xdcr_drain(
+        self,
+        buckets: list,
+        timeout=600,
+        interval=1,
+        max_interval=DEFAULT_MAX_INTERVAL,
+        on_progress=None,
+    ):
+        """
+        Waits until XDCR has no changes left for any of `buckets`, for at
+        most `timeout` seconds of wall-clock time. Buckets without
+        replications count as drained.
+
+        Polls every `interval` seconds at first, backing off up to
+        `max_interval`, and polls faster as the slowest bucket's ETA gets
+        close; see RebalanceMonitor. `on_progress` is called with the
+        xdcr_progress() result after every poll. Returns the final result.
+        """
+
+        deadline = time.monotonic() + timeout
+        monitor = RebalanceMonitor(min_interval=interval, max_interval=max_interval)
+
+        while True:
+            progress = self.xdcr_progress(buckets)
+            if on_progress is not None:
+                on_progress(progress)
+            if all(progress[bucket].drained for bucket in buckets):
+                return progress
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                pending = [bucket for bucket in buckets if not progress[bucket].drained]
+                raise TimeoutError(f"XDCR did not drain in time for buckets: {pending}")
+
+            etas = [progress[bucket].eta for bucket in buckets if progress[bucket].eta is not None]
+            eta = max(etas) if etas else None
+            time.sleep(min(monitor.next_interval_for_eta(eta), remaining))
+
     def get_index_status(self):
         """
         Undocumented endpoint?
@@ -911,13 +1634,16 @@ class Cluster(BaseClient):
             - "Ready": Index has been built.
 
         """
-        url = f"{self.baseurl}/indexStatus"
+        return self._get_json("/indexStatus", "index status", conditional=True)
 
-        resp = self.http_request(url)
-        if resp.status_code != 200:
-            raise Exception(f"Failed to get index status: {resp.text}")
+    def poll_index_status(self):
+        """
+        Returns an (index_status, changed) tuple; see poll_pool_info(). The
+        payload `version` of the last poll is available as
+        `self.resource_versions.revision("/indexStatus")`.
+        """
 
-        return resp.json()
+        return self._poll_json("/indexStatus", "index status")
 
     def query_execute(self, query_parameters: dict):
         """
@@ -935,3 +1661,82 @@ class Cluster(BaseClient):
             raise Exception(f"Failed to execute query: {resp.text}")
 
         return resp.json()
+
+    def query_stream(self, query_parameters: dict, read_timeout=58.0) -> QueryStream:
+        """
+        Like query_execute(), but streams the response: iterate over the
+        returned QueryStream to get the result rows one at a time. `status`,
+        `metrics` and `errors` are available on it once all rows have been
+        consumed.
+        """
+
+        url = f"{self.baseurl}/_p/query/query/service"
+
+        resp = self.http_request(
+            url,
+            method="POST",
+            json=query_parameters,
+            timeout=(58.0, read_timeout),
+            stream=True,
+        )
+        if resp.status_code != 200:
+            raise Exception(f"Failed to execute query: {resp.text}")
+
+        return QueryStream(resp)
+
+    def query_prepare(self, statement: str) -> str:
+        """
+        https://docs.couchbase.com/server/current/n1ql/n1ql-language-reference/prepare.html
+
+        Prepares a statement and returns the name of the prepared statement.
+        """
+
+        result = self.query_execute({"statement": f"PREPARE {statement}"})
+        name = result["results"][0]["name"]
+        self.prepared_statements.put(statement, name)
+
+        return name
+
+    def query_prepared(
+        self,
+        statement: str,
+        args: list = None,
+        named_args: dict = None,
+        query_options: dict = None,
+    ):
+        """
+        Executes a statement through the prepared statement cache: the
+        statement is prepared on first use, and executed by name with
+        positional `args` or `named_args` (without the `$` prefix)
+        afterwards. If the query service no longer knows the prepared
+        statement, it is prepared again transparently.
+        """
+
+        payload = dict(query_options or {})
+        if args is not None:
+            payload["args"] = list(args)
+        for name, value in (named_args or {}).items():
+            payload[f"${name.lstrip('$')}"] = value
+
+        url = f"{self.baseurl}/_p/query/query/service"
+
+        for attempt in range(2):
+            payload["prepared"] = self.prepared_statements.get(statement) or self.query_prepare(statement)
+
+            resp = self.http_request(
+                url,
+                method="POST",
+                json=payload,
+            )
+            if resp.status_code == 200:
+                return resp.json()
+
+            try:
+                codes = {error.get("code") for error in resp.json().get("errors", [])}
+            except ValueError:
+                codes = set()
+            if attempt or not codes & REPREPARE_ERROR_CODES:
+                break
+            self.prepared_statements.invalidate(statement)
+
+        raise Exception(f"Failed to execute query: {resp.text}")
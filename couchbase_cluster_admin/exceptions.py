@@ -1,3 +1,7 @@
+class AddNodeException(Exception):
+    pass
+
+
 class AddToNotProvisionedNodeException(Exception):
     pass
 
@@ -84,3 +88,35 @@ class ImportBackupException(Exception):
 
 class RestoreBackupException(Exception):
     pass
+
+
+class FleetOperationException(Exception):
+    def __init__(self, message, errors=None, result=None):
+        super().__init__(message)
+        self.errors = errors or {}
+        # The FleetResult gathered so far, including successful nodes.
+        self.result = result
+
+
+class ReconcileException(Exception):
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+class ManifestUpdateException(Exception):
+    pass
+
+
+class IndexBuildException(Exception):
+    pass
+
+
+class BackupJobException(Exception):
+    def __init__(self, message, task=None):
+        super().__init__(message)
+        self.task = task
+
+
+class BackupJobRunnerClosedException(BackupJobException):
+    pass
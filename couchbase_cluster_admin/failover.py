@@ -0,0 +1,151 @@
+import threading
+import time
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_EWMA_ALPHA = 0.3
+
+# Requests that any node of the cluster can serve. Everything else, e.g.
+# /nodes/self or /node/controller/..., concerns the node it is sent to.
+CLUSTER_WIDE_PATHS = (
+    "/pools/default/buckets",
+    "/pools/default/stats/range",
+    "/indexStatus",
+    "/_p/query/",
+    "/_p/backup/",
+)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half-open"
+
+
+def is_cluster_wide(path: str) -> bool:
+    return path.startswith(CLUSTER_WIDE_PATHS)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a node after `failure_threshold` consecutive
+    failures. After `reset_timeout` seconds requests are let through again
+    on trial (half-open): a success closes the breaker, a failure opens it
+    again.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+
+        self._state = BREAKER_CLOSED
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == BREAKER_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = BREAKER_HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        return self.state != BREAKER_OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = BREAKER_CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == BREAKER_HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = BREAKER_OPEN
+                self._opened_at = time.monotonic()
+
+
+class NodeHealth:
+    """
+    Latency and error rate of one node, as exponentially weighted moving
+    averages, and its circuit breaker. `latency` is None until the first
+    successful request.
+    """
+
+    def __init__(self, address: str, alpha=DEFAULT_EWMA_ALPHA, **breaker_kwargs):
+        self.address = address
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.breaker = CircuitBreaker(**breaker_kwargs)
+
+    def record_success(self, latency: float):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+        self.error_rate -= self.alpha * self.error_rate
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self.error_rate += self.alpha * (1.0 - self.error_rate)
+        self.breaker.record_failure()
+
+    def __repr__(self):
+        return (
+            f"NodeHealth({self.address!r}, latency={self.latency}, error_rate={self.error_rate:.2f}, "
+            f"breaker={self.breaker.state})"
+        )
+
+
+class NodeSelector:
+    """
+    The nodes a cluster-wide request can be sent to, ordered by health.
+
+    Starts from the `seed_nodes` addresses ("host:port"), and follows the
+    cluster membership through update(). Seed nodes are always kept.
+    """
+
+    def __init__(self, seed_nodes: list, alpha=DEFAULT_EWMA_ALPHA, **breaker_kwargs):
+        self.alpha = alpha
+        self.breaker_kwargs = breaker_kwargs
+        self.seed_nodes = list(dict.fromkeys(seed_nodes))
+        self.nodes = {address: self._node(address) for address in self.seed_nodes}
+        self._lock = threading.Lock()
+
+    def _node(self, address):
+        return NodeHealth(address, alpha=self.alpha, **self.breaker_kwargs)
+
+    def update(self, addresses: list):
+        """
+        Sets the learned cluster nodes, keeping the health of known ones.
+        """
+
+        with self._lock:
+            nodes = {address: self.nodes.get(address) or self._node(address) for address in self.seed_nodes}
+            for address in addresses:
+                nodes[address] = self.nodes.get(address) or self._node(address)
+            self.nodes = nodes
+
+    def candidates(self) -> list:
+        """
+        Nodes to try, in order: nodes whose breaker allows a request, by
+        latency weighted by error rate, then those never measured, by error
+        rate, so that a node that has not answered yet is only tried when
+        the known-healthy ones fail. If every breaker is open, all nodes are
+        returned as a last resort.
+        """
+
+        nodes = list(self.nodes.values())
+        healthy = [node for node in nodes if node.breaker.allow()] or nodes
+
+        return sorted(
+            healthy,
+            key=lambda node: (
+                node.latency is None,
+                (node.latency or 0.0) * (1.0 + node.error_rate),
+                node.error_rate,
+            ),
+        )
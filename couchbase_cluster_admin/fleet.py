@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cluster import Cluster
+from .exceptions import FleetOperationException
+
+DEFAULT_MAX_WORKERS = 16
+
+
+class FleetResult:
+    """
+    Per-node outcome of a ClusterFleet operation.
+
+    `results` maps node names to return values, `errors` maps node names to
+    the exception raised on that node. Nodes that were never started
+    (fail-fast mode) appear in neither.
+    """
+
+    def __init__(self, results=None, errors=None):
+        self.results = results or {}
+        self.errors = errors or {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_for_errors(self):
+        if self.errors:
+            failed = ", ".join(sorted(self.errors))
+            raise FleetOperationException(f"Operation failed on nodes: {failed}", self.errors, result=self)
+
+    def __repr__(self):
+        return f"FleetResult(results={self.results!r}, errors={self.errors!r})"
+
+
+class ClusterFleet:
+    """
+    Runs the same Cluster operation on many nodes concurrently.
+
+    Typical node provisioning:
+
+        fleet = ClusterFleet.from_hosts(
+            ["10.0.0.1", "10.0.0.2", "10.0.0.3"],
+            cluster_name="mycluster",
+            services=["kv", "index"],
+            username="Administrator",
+            password="password",
+        )
+        fleet.run("enable_services").raise_for_errors()
+        fleet.run("set_disk_paths", {"path": "/data"}).raise_for_errors()
+        fleet.run(
+            "rename_node",
+            per_node_kwargs={host: {"new_hostname": host} for host in fleet.nodes},
+        )
+
+    Wall time is bounded by the slowest node rather than the sum of all of
+    them, as long as `max_workers` is at least the number of nodes.
+    """
+
+    def __init__(self, nodes, max_workers=DEFAULT_MAX_WORKERS):
+        # Accept a name -> Cluster mapping, or a list of Cluster instances
+        # which are then named by their base URL.
+        if isinstance(nodes, dict):
+            self.nodes = dict(nodes)
+        else:
+            self.nodes = {node.baseurl: node for node in nodes}
+
+        self.max_workers = max_workers
+
+    @classmethod
+    def from_hosts(cls, hosts, max_workers=DEFAULT_MAX_WORKERS, **cluster_kwargs):
+        """
+        Create a fleet with one Cluster instance per host, all constructed
+        with the same keyword arguments. Nodes are named by host.
+        """
+
+        return cls(
+            {host: Cluster(api_host=host, **cluster_kwargs) for host in hosts},
+            max_workers=max_workers,
+        )
+
+    def run(self, method, *args, fail_fast=False, per_node_kwargs=None, **kwargs) -> FleetResult:
+        """
+        Call `method` on every node and return a FleetResult.
+
+        `method` is the name of a Cluster method, or a callable taking the
+        Cluster instance as its first argument. `per_node_kwargs` maps node
+        names to extra keyword arguments for that node only.
+
+        With `fail_fast`, nodes not yet started are cancelled as soon as a
+        node fails, and the first failure is raised as
+        FleetOperationException once the nodes already running are done;
+        its `result` holds the FleetResult of the nodes that did run.
+        Otherwise all nodes are run and their errors collected.
+        """
+
+        per_node_kwargs = per_node_kwargs or {}
+
+        def call(name, node):
+            node_kwargs = dict(kwargs, **per_node_kwargs.get(name, {}))
+            if callable(method):
+                return method(node, *args, **node_kwargs)
+            return getattr(node, method)(*args, **node_kwargs)
+
+        result = FleetResult()
+        if not self.nodes:
+            return result
+
+        first_failed = None
+        workers = min(self.max_workers, len(self.nodes))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(call, name, node): name for name, node in self.nodes.items()}
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                name = futures[future]
+                error = future.exception()
+                if error is None:
+                    result.results[name] = future.result()
+                    continue
+
+                result.errors[name] = error
+                if fail_fast and first_failed is None:
+                    first_failed = name
+                    for other in futures:
+                        other.cancel()
+
+        if first_failed is not None:
+            error = result.errors[first_failed]
+            raise FleetOperationException(
+                f"Operation failed on node {first_failed}: {error}", result.errors, result=result
+            ) from error
+
+        return result
+
+    def close(self):
+        for node in self.nodes.values():
+            node.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,234 @@
+import logging
+import time
+from collections import namedtuple
+
+from .exceptions import IndexBuildException
+
+DEFAULT_MAX_BUILDS_PER_NODE = 2
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_TIMEOUT = 3600
+
+STATUS_CREATED = "Created"
+STATUS_BUILDING = "Building"
+STATUS_READY = "Ready"
+STATUS_ERROR = "Error"
+
+
+IndexRecord = namedtuple(
+    "IndexRecord",
+    ["bucket", "scope", "collection", "name", "status", "progress", "hosts", "replica_id", "definition"],
+)
+
+
+def index_key(index: dict) -> tuple:
+    return (index["bucket"], index.get("scope", "_default"), index.get("collection", "_default"), index["indexName"])
+
+
+def index_record(index: dict) -> IndexRecord:
+    bucket, scope, collection, name = index_key(index)
+    return IndexRecord(
+        bucket,
+        scope,
+        collection,
+        name,
+        index["status"],
+        index.get("progress", 0),
+        tuple(index.get("hosts", ())),
+        index.get("replicaId", 0),
+        index.get("definition"),
+    )
+
+
+class IndexCatalog:
+    """
+    Indexed view of one indexStatus response.
+
+    Records are looked up by (bucket, scope, collection, index name), by
+    indexer host or by status in constant time. A key maps to one record
+    per replica. refresh() only rebuilds the catalog when the indexStatus
+    payload changed since the last refresh.
+
+        catalog = IndexCatalog()
+        catalog.refresh(cluster)
+        replicas = catalog.get("bucket", "scope", "collection", "index")
+        building = catalog.by_status("Building")
+    """
+
+    def __init__(self, index_status: dict = None):
+        self.version = None
+        self.digest = None
+        self.by_key = {}
+        self._by_host = {}
+        self._by_status = {}
+
+        if index_status is not None:
+            self.load(index_status)
+
+    def load(self, index_status: dict):
+        by_key = {}
+        by_host = {}
+        by_status = {}
+        for index in index_status.get("indexes", []):
+            record = index_record(index)
+            by_key.setdefault(index_key(index), []).append(record)
+            by_status.setdefault(record.status, []).append(record)
+            for host in record.hosts:
+                by_host.setdefault(host, []).append(record)
+
+        self.by_key = {key: tuple(records) for key, records in by_key.items()}
+        self._by_host = {host: tuple(records) for host, records in by_host.items()}
+        self._by_status = {status: tuple(records) for status, records in by_status.items()}
+        self.version = index_status.get("version")
+        self.digest = None
+
+    def refresh(self, cluster) -> bool:
+        """
+        Fetches indexStatus and reloads the catalog if it changed since the
+        catalog was last loaded. Returns whether it changed.
+        """
+
+        # The changed flag of poll_index_status() is relative to the previous
+        # poll by anyone, and the version does not change with the build
+        # progress, so compare the digest of the payload, computed once per
+        # response by the cluster, with the one this catalog has loaded.
+        index_status, _ = cluster.poll_index_status()
+        digest = cluster.resource_versions.get("/indexStatus").digest
+        if digest == self.digest:
+            return False
+
+        self.load(index_status)
+        self.digest = digest
+        return True
+
+    def get(self, bucket: str, scope: str, collection: str, name: str) -> tuple:
+        return self.by_key.get((bucket, scope, collection, name), ())
+
+    def by_host(self, host: str) -> tuple:
+        return self._by_host.get(host, ())
+
+    def by_status(self, status: str) -> tuple:
+        return self._by_status.get(status, ())
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def __iter__(self):
+        return iter(self.by_key)
+
+    def __contains__(self, key):
+        return key in self.by_key
+
+
+def build_index_statement(keyspace: tuple, index_names: list) -> str:
+    bucket, scope, collection = keyspace
+    names = ", ".join(f"`{name}`" for name in sorted(index_names))
+    return f"BUILD INDEX ON `{bucket}`.`{scope}`.`{collection}`({names})"
+
+
+class IndexBuilder:
+    """
+    Builds deferred indexes in batches.
+
+    Indexes with status "Created" are grouped by keyspace, and each group is
+    built with a single `BUILD INDEX` statement. At most
+    `max_builds_per_node` indexes are built at the same time on any indexer
+    node, based on the `hosts` of each index (all replicas and partitions
+    of an index are built together). Progress is tracked through
+    indexStatus until every index is "Ready".
+
+        IndexBuilder(cluster, max_builds_per_node=4).build()
+    """
+
+    def __init__(
+        self,
+        cluster,
+        max_builds_per_node=DEFAULT_MAX_BUILDS_PER_NODE,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        timeout=DEFAULT_TIMEOUT,
+        on_progress=None,
+    ):
+        self.cluster = cluster
+        self.max_builds_per_node = max_builds_per_node
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.catalog = IndexCatalog()
+
+    def _indexes(self) -> dict:
+        # Index key -> IndexRecords for all its replicas.
+        self.catalog.refresh(self.cluster)
+        return self.catalog.by_key
+
+    def _schedule(self, indexes: dict, targets: set, issued: set) -> dict:
+        builds_per_host = {}
+        building = list(self.catalog.by_status(STATUS_BUILDING))
+        # Issued builds stay "Created" until the indexer picks them up.
+        building.extend(entry for key in issued for entry in indexes.get(key, ()) if entry.status == STATUS_CREATED)
+        for record in building:
+            for host in record.hosts:
+                builds_per_host[host] = builds_per_host.get(host, 0) + 1
+
+        batches = {}
+        for key in sorted(targets - issued):
+            entries = indexes.get(key, ())
+            if not entries or any(entry.status != STATUS_CREATED for entry in entries):
+                continue
+
+            hosts = {host for entry in entries for host in entry.hosts}
+            if any(builds_per_host.get(host, 0) >= self.max_builds_per_node for host in hosts):
+                continue
+
+            for host in hosts:
+                builds_per_host[host] = builds_per_host.get(host, 0) + 1
+            batches.setdefault(key[:3], []).append(key[3])
+
+        return batches
+
+    def build(self, keyspaces: list = None) -> dict:
+        """
+        Builds all deferred indexes, or only those in the given
+        (bucket, scope, collection) keyspaces, and waits until they are
+        ready. Returns the progress of each index, keyed by
+        (bucket, scope, collection, index name).
+        """
+
+        deadline = time.monotonic() + self.timeout
+        indexes = self._indexes()
+        targets = {
+            key
+            for key, entries in indexes.items()
+            if all(entry.status == STATUS_CREATED for entry in entries)
+            and (keyspaces is None or key[:3] in keyspaces)
+        }
+        issued = set()
+
+        while True:
+            progress = {}
+            ready = True
+            for key in targets:
+                entries = indexes.get(key)
+                if not entries:
+                    raise IndexBuildException(f"Index {key} was dropped while building")
+                if any(entry.status == STATUS_ERROR for entry in entries):
+                    raise IndexBuildException(f"Failed to build index {key}: {entries}")
+                progress[key] = sum(entry.progress for entry in entries) / len(entries)
+                ready = ready and all(entry.status == STATUS_READY for entry in entries)
+
+            if self.on_progress is not None:
+                self.on_progress(progress)
+
+            if ready:
+                return progress
+
+            for keyspace, index_names in self._schedule(indexes, targets, issued).items():
+                statement = build_index_statement(keyspace, index_names)
+                logging.info(f"Building indexes: {statement}")
+                self.cluster.query_execute({"statement": statement})
+                issued.update(keyspace + (name,) for name in index_names)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Indexes were not built in time.")
+            time.sleep(min(self.poll_interval, remaining))
+
+            indexes = self._indexes()
@@ -0,0 +1,282 @@
+import math
+import re
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_MIN_LATENCY = 0.0001
+DEFAULT_MAX_LATENCY = 600.0
+DEFAULT_BUCKETS_PER_DOUBLING = 2
+
+# Paths with variable segments, most specific first. Other paths are their
+# own template.
+ENDPOINT_TEMPLATES = [
+    (re.compile(pattern + "$"), template)
+    for pattern, template in [
+        (
+            r"/pools/default/buckets/[^/]+/scopes/@ensureManifest/[^/]+",
+            "/pools/default/buckets/{bucket}/scopes/@ensureManifest/{uid}",
+        ),
+        (
+            r"/pools/default/buckets/[^/]+/scopes/[^/]+/collections",
+            "/pools/default/buckets/{bucket}/scopes/{scope}/collections",
+        ),
+        (r"/pools/default/buckets/[^/]+/scopes", "/pools/default/buckets/{bucket}/scopes"),
+        (r"/pools/default/buckets/[^/]+", "/pools/default/buckets/{bucket}"),
+        (r"/pools/default/bs/[^/]+", "/pools/default/bs/{bucket}"),
+        (r"/settings/rbac/users/local/[^/]+", "/settings/rbac/users/local/{username}"),
+        (r"/_p/backup/api/v1/plan/[^/]+", "/_p/backup/api/v1/plan/{plan}"),
+        (r"/_p/backup/api/v1/cluster/self/repository/import", "/_p/backup/api/v1/cluster/self/repository/import"),
+        (
+            r"/_p/backup/api/v1/cluster/self/repository/[^/]+/[^/]+/(info|taskHistory|restore)",
+            r"/_p/backup/api/v1/cluster/self/repository/{status}/{repository}/\1",
+        ),
+        (
+            r"/_p/backup/api/v1/cluster/self/repository/[^/]+/[^/]+",
+            "/_p/backup/api/v1/cluster/self/repository/{status}/{repository}",
+        ),
+        (r"/_p/backup/api/v1/cluster/self/repository/[^/]+", "/_p/backup/api/v1/cluster/self/repository/{status}"),
+    ]
+]
+
+
+def endpoint_template(url: str) -> str:
+    """
+    Returns the path of `url` with variable segments (bucket, scope, user,
+    repository names...) replaced by placeholders, e.g.
+    `/pools/default/buckets/{bucket}/scopes`.
+    """
+
+    path = urlsplit(url).path.rstrip("/") or "/"
+    for pattern, template in ENDPOINT_TEMPLATES:
+        match = pattern.match(path)
+        if match:
+            return match.expand(template)
+    return path
+
+
+class RequestEvent:
+    """
+    One request sent by BaseClient.http_request(), passed to observers.
+
+    `status` is None when the request failed with `error`. Timings are in
+    seconds: `connect` and `tls` are None when a kept-alive connection was
+    reused, `ttfb` is the time from sending the request to receiving the
+    response headers, and `duration` covers all attempts. `retries` counts
+    the attempts after the first. `response_bytes` is None for streamed
+    responses without a Content-Length.
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "endpoint",
+        "status",
+        "error",
+        "request_bytes",
+        "response_bytes",
+        "connect",
+        "tls",
+        "ttfb",
+        "duration",
+        "retries",
+    )
+
+    def __init__(
+        self,
+        method,
+        url,
+        status=None,
+        error=None,
+        request_bytes=0,
+        response_bytes=None,
+        connect=None,
+        tls=None,
+        ttfb=None,
+        duration=0.0,
+        retries=0,
+    ):
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.status = status
+        self.error = error
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.connect = connect
+        self.tls = tls
+        self.ttfb = ttfb
+        self.duration = duration
+        self.retries = retries
+
+    def __repr__(self):
+        return (
+            f"RequestEvent({self.method} {self.endpoint}, status={self.status}, "
+            f"duration={self.duration:.4f}, retries={self.retries})"
+        )
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed histogram of latencies in seconds, in the style of
+    HdrHistogram: bucket bounds grow by a constant factor, with
+    `buckets_per_doubling` buckets for each power of two between
+    `min_value` and `max_value`, so the relative error is the same at any
+    scale. Values below the range land in the first bucket, and values
+    above it in an extra overflow bucket without an upper bound.
+    """
+
+    def __init__(
+        self,
+        min_value=DEFAULT_MIN_LATENCY,
+        max_value=DEFAULT_MAX_LATENCY,
+        buckets_per_doubling=DEFAULT_BUCKETS_PER_DOUBLING,
+    ):
+        self.min_value = min_value
+        self.buckets_per_doubling = buckets_per_doubling
+        size = math.ceil(math.log2(max_value / min_value) * buckets_per_doubling) + 1
+        self.bounds = [min_value * 2 ** (index / buckets_per_doubling) for index in range(size)]
+        # The last count is the overflow bucket.
+        self.counts = [0] * (size + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = math.ceil(math.log2(value / self.min_value) * self.buckets_per_doubling)
+        return min(index, len(self.bounds))
+
+    def record(self, value: float):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Upper bound of the bucket holding the given percentile (0 - 100).
+        """
+
+        if not self.count:
+            return 0.0
+
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+
+def _sample(name: str, labels: dict, value) -> str:
+    def escape(text):
+        return str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    if not labels:
+        return f"{name} {value}"
+    pairs = ",".join(f'{label}="{escape(text)}"' for label, text in labels.items())
+    return f"{name}{{{pairs}}} {value}"
+
+
+def _prometheus_histogram(name: str, labels: dict, histogram: LatencyHistogram) -> list:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(_sample(f"{name}_bucket", dict(labels, le=repr(bound)), cumulative))
+    lines.append(_sample(f"{name}_bucket", dict(labels, le="+Inf"), histogram.count))
+    lines.append(_sample(f"{name}_sum", labels, repr(histogram.sum)))
+    lines.append(_sample(f"{name}_count", labels, histogram.count))
+    return lines
+
+
+class RequestMetrics:
+    """
+    Observer aggregating RequestEvents into per-endpoint counters and
+    latency histograms, exportable in the Prometheus text format:
+
+        metrics = RequestMetrics()
+        cluster.add_observer(metrics)
+        ...
+        print(metrics.to_prometheus())
+
+    Request durations are kept per (method, endpoint); connect, TLS and
+    time-to-first-byte timings in one histogram each.
+    """
+
+    def __init__(self, prefix="couchbase_admin", **histogram_kwargs):
+        self.prefix = prefix
+        self.histogram_kwargs = histogram_kwargs
+        self.durations = {}
+        self.requests = {}
+        self.retries = {}
+        self.request_bytes = {}
+        self.response_bytes = {}
+        self.connect = LatencyHistogram(**histogram_kwargs)
+        self.tls = LatencyHistogram(**histogram_kwargs)
+        self.ttfb = LatencyHistogram(**histogram_kwargs)
+        self._lock = threading.Lock()
+
+    def __call__(self, event: RequestEvent):
+        key = (event.method, event.endpoint)
+        status = str(event.status) if event.status is not None else "error"
+
+        with self._lock:
+            histogram = self.durations.get(key)
+            if histogram is None:
+                histogram = self.durations[key] = LatencyHistogram(**self.histogram_kwargs)
+            histogram.record(event.duration)
+
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            self.retries[key] = self.retries.get(key, 0) + event.retries
+            self.request_bytes[key] = self.request_bytes.get(key, 0) + event.request_bytes
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + (event.response_bytes or 0)
+
+            for histogram, value in ((self.connect, event.connect), (self.tls, event.tls), (self.ttfb, event.ttfb)):
+                if value is not None:
+                    histogram.record(value)
+
+    def to_prometheus(self) -> str:
+        prefix = self.prefix
+        lines = []
+
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_http_requests_total counter")
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                labels = {"method": method, "endpoint": endpoint, "status": status}
+                lines.append(_sample(f"{prefix}_http_requests_total", labels, count))
+
+            for name, counters in (
+                ("http_request_retries_total", self.retries),
+                ("http_request_bytes_total", self.request_bytes),
+                ("http_response_bytes_total", self.response_bytes),
+            ):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for (method, endpoint), value in sorted(counters.items()):
+                    labels = {"method": method, "endpoint": endpoint}
+                    lines.append(_sample(f"{prefix}_{name}", labels, value))
+
+            lines.append(f"# TYPE {prefix}_http_request_duration_seconds histogram")
+            for (method, endpoint), histogram in sorted(self.durations.items()):
+                labels = {"method": method, "endpoint": endpoint}
+                lines.extend(_prometheus_histogram(f"{prefix}_http_request_duration_seconds", labels, histogram))
+
+            for name, histogram in (
+                ("http_connect_duration_seconds", self.connect),
+                ("http_tls_duration_seconds", self.tls),
+                ("http_time_to_first_byte_seconds", self.ttfb),
+            ):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                lines.extend(_prometheus_histogram(f"{prefix}_{name}", {}, histogram))
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+import copy
+
+
+def manifest_from_scopes(scopes: dict) -> dict:
+    """
+    Builds a manifest from a dictionary of scope names to lists of collection
+    names or collection settings dictionaries with a `name`.
+    """
+
+    return {
+        "scopes": [
+            {
+                "name": scope_name,
+                "collections": [
+                    {"name": collection} if isinstance(collection, str) else dict(collection)
+                    for collection in collections or []
+                ],
+            }
+            for scope_name, collections in scopes.items()
+        ]
+    }
+
+
+def manifest_diff(current: dict, desired: dict):
+    """
+    Returns the scopes and collections of `desired` missing from `current`,
+    as a (scope names, {scope name: [collection settings]}) tuple.
+
+    Both are manifests in the format returned by Cluster.get_scopes():
+
+        {"uid": "1a", "scopes": [{"name": "s", "collections": [{"name": "c", "maxTTL": 60}]}]}
+    """
+
+    existing = {
+        scope["name"]: {collection["name"] for collection in scope.get("collections", [])}
+        for scope in current.get("scopes", [])
+    }
+
+    missing_scopes = []
+    missing_collections = {}
+    for scope in desired.get("scopes", []):
+        if scope["name"] not in existing:
+            missing_scopes.append(scope["name"])
+        collections = [
+            collection
+            for collection in scope.get("collections", [])
+            if collection["name"] not in existing.get(scope["name"], ())
+        ]
+        if collections:
+            missing_collections[scope["name"]] = collections
+
+    return missing_scopes, missing_collections
+
+
+def merge_manifests(current: dict, desired: dict) -> dict:
+    """
+    Adds the missing scopes and collections of `desired` to `current`,
+    returning a manifest suitable for the bulk update endpoint. Nothing is
+    removed, and uids are stripped as they are assigned by the server.
+    """
+
+    def strip_uid(item):
+        return {key: value for key, value in item.items() if key != "uid"}
+
+    scopes = {}
+    for scope in current.get("scopes", []):
+        scopes[scope["name"]] = dict(
+            strip_uid(scope),
+            collections=[strip_uid(collection) for collection in scope.get("collections", [])],
+        )
+
+    missing_scopes, missing_collections = manifest_diff(current, desired)
+    for scope_name in missing_scopes:
+        scopes[scope_name] = {"name": scope_name, "collections": []}
+    for scope_name, collections in missing_collections.items():
+        scopes[scope_name]["collections"].extend(copy.deepcopy(collections))
+
+    return {"scopes": list(scopes.values())}
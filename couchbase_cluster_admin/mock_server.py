@@ -0,0 +1,514 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_REBALANCE_DURATION = 2.0
+DEFAULT_BACKUP_TASK_DURATION = 2.0
+DEFAULT_INDEXES_PER_BUCKET = 4
+DEFAULT_MAX_STATS_SAMPLES = 1000
+
+BACKUP_PREFIX = "/_p/backup/api/v1"
+
+
+class MockClusterState:
+    """
+    The state of a simulated cluster: nodes, buckets with their collection
+    manifests, indexes, rebalance and backup tasks.
+
+    Rebalances and backup tasks progress with wall-clock time, finishing
+    after `rebalance_duration` and `backup_task_duration` seconds.
+    """
+
+    def __init__(
+        self,
+        nodes=1,
+        buckets=(),
+        cluster_name="mock",
+        indexes_per_bucket=DEFAULT_INDEXES_PER_BUCKET,
+        rebalance_duration=DEFAULT_REBALANCE_DURATION,
+        backup_task_duration=DEFAULT_BACKUP_TASK_DURATION,
+        max_stats_samples=DEFAULT_MAX_STATS_SAMPLES,
+    ):
+        self.lock = threading.Lock()
+        self.cluster_name = cluster_name
+        self.memory_quotas = {"memoryQuota": 1024}
+        self.indexes_per_bucket = indexes_per_bucket
+        self.rebalance_duration = rebalance_duration
+        self.backup_task_duration = backup_task_duration
+        self.max_stats_samples = max_stats_samples
+
+        self.nodes = []
+        for _ in range(nodes):
+            self.add_node(["kv", "index", "n1ql", "backup"])
+
+        self.buckets = {}
+        self.index_version = 0
+        for bucket_name in buckets:
+            self.add_bucket({"name": bucket_name})
+
+        self.rebalance_started_at = None
+        self.backup_repositories = {}
+        self.backup_plans = {}
+        self.backup_tasks = {}
+
+    def add_node(self, services: list, hostname: str = None) -> dict:
+        number = len(self.nodes) + 1
+        hostname = hostname or f"node{number}.mock"
+        node = {
+            "hostname": f"{hostname}:8091",
+            "otpNode": f"ns_1@{hostname}",
+            "nodeUUID": hashlib.md5(hostname.encode()).hexdigest(),
+            "clusterMembership": "active",
+            "status": "healthy",
+            "services": list(services),
+            "version": "7.2.0-0000-enterprise",
+            "os": "x86_64-pc-linux-gnu",
+            "memoryTotal": 16 * 1024 ** 3,
+            "memoryFree": 8 * 1024 ** 3,
+            "uptime": "3600",
+            "ports": {"direct": 11210, "httpsMgmt": 18091},
+            "systemStats": {"cpu_utilization_rate": 5.0, "swap_total": 0, "swap_used": 0},
+            "interestingStats": {"curr_items": 0, "mem_used": 0, "ops": 0},
+        }
+        self.nodes.append(node)
+        return node
+
+    def add_bucket(self, config: dict):
+        name = config["name"]
+        self.buckets[name] = {
+            "name": name,
+            "bucketType": config.get("bucketType", "membase"),
+            "uuid": hashlib.md5(name.encode()).hexdigest(),
+            "quota": {"ram": int(config.get("ramQuota", 100)) * 1024 ** 2},
+            "nodes": [{"hostname": node["hostname"], "status": "healthy"} for node in self.nodes],
+            "manifest": {
+                "uid": "0",
+                "scopes": [{"name": "_default", "uid": "0", "collections": [{"name": "_default", "uid": "0"}]}],
+            },
+        }
+        self.index_version += 1
+
+    def bump_manifest(self, bucket: dict) -> str:
+        bucket["manifest"]["uid"] = format(int(bucket["manifest"]["uid"], 16) + 1, "x")
+        return bucket["manifest"]["uid"]
+
+    def rebalance_progress(self) -> float:
+        if self.rebalance_started_at is None:
+            return 1.0
+        elapsed = time.monotonic() - self.rebalance_started_at
+        if self.rebalance_duration <= 0 or elapsed >= self.rebalance_duration:
+            self.rebalance_started_at = None
+            return 1.0
+        return elapsed / self.rebalance_duration
+
+    def indexes(self) -> list:
+        indexes = []
+        hosts = [node["hostname"] for node in self.nodes if "index" in node["services"]] or ["node1.mock:8091"]
+        for bucket_name in self.buckets:
+            for number in range(self.indexes_per_bucket):
+                indexes.append(
+                    {
+                        "bucket": bucket_name,
+                        "scope": "_default",
+                        "collection": "_default",
+                        "indexName": f"idx_{number}",
+                        "index": f"idx_{number}",
+                        "definition": f"CREATE INDEX `idx_{number}` ON `{bucket_name}`(`field{number}`)",
+                        "status": "Ready",
+                        "progress": 100,
+                        "hosts": [hosts[len(indexes) % len(hosts)]],
+                        "replicaId": 0,
+                    }
+                )
+        return indexes
+
+    def backup_task(self, task: dict) -> dict:
+        elapsed = time.monotonic() - task["started_at"]
+        fraction = 1.0 if self.backup_task_duration <= 0 else min(1.0, elapsed / self.backup_task_duration)
+        items = int(task["total_items"] * fraction)
+        return {
+            "task_name": task["task_name"],
+            "status": "done" if fraction >= 1.0 else "running",
+            "start": task["start"],
+            "type": task["type"],
+            "stats": {
+                "buckets": {
+                    bucket_name: {
+                        "bytes_received": items * 1024,
+                        "mutations_received": items,
+                        "deletions_received": 0,
+                    }
+                    for bucket_name in task["buckets"]
+                }
+            },
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # (method, path pattern, handler method name)
+    routes = [
+        ("GET", r"/pools/default", "get_pool"),
+        ("POST", r"/pools/default", "set_pool"),
+        ("GET", r"/nodes/self", "get_node"),
+        ("POST", r"/node/controller/setupServices", "ok"),
+        ("POST", r"/node/controller/rename", "ok"),
+        ("POST", r"/nodes/self/controller/settings", "ok"),
+        ("POST", r"/settings/web", "ok"),
+        ("POST", r"/controller/addNode", "add_node"),
+        ("POST", r"/controller/rebalance", "start_rebalance"),
+        ("GET", r"/pools/default/rebalanceProgress", "get_rebalance_progress"),
+        ("GET", r"/pools/default/tasks", "get_tasks"),
+        ("GET", r"/pools/default/buckets", "get_buckets"),
+        ("POST", r"/pools/default/buckets", "create_bucket"),
+        ("GET", r"/pools/default/buckets/(?P<bucket>[^/]+)", "get_bucket"),
+        ("GET", r"/pools/default/buckets/(?P<bucket>[^/]+)/scopes", "get_scopes"),
+        ("POST", r"/pools/default/buckets/(?P<bucket>[^/]+)/scopes", "create_scope"),
+        ("PUT", r"/pools/default/buckets/(?P<bucket>[^/]+)/scopes", "set_manifest"),
+        ("POST", r"/pools/default/buckets/(?P<bucket>[^/]+)/scopes/@ensureManifest/(?P<uid>[^/]+)", "ok"),
+        (
+            "POST",
+            r"/pools/default/buckets/(?P<bucket>[^/]+)/scopes/(?P<scope>[^/]+)/collections",
+            "create_collection",
+        ),
+        ("GET", r"/indexStatus", "get_index_status"),
+        ("POST", r"/pools/default/stats/range/?", "get_statistics"),
+        ("GET", BACKUP_PREFIX + r"/cluster/self", "get_backup_info"),
+        ("POST", BACKUP_PREFIX + r"/plan/(?P<plan>[^/]+)", "create_backup_plan"),
+        ("GET", BACKUP_PREFIX + r"/cluster/self/repository/(?P<status>[^/]+)", "get_backup_repositories"),
+        (
+            "POST",
+            BACKUP_PREFIX + r"/cluster/self/repository/active/(?P<repository>[^/]+)",
+            "create_backup_repository",
+        ),
+        (
+            "GET",
+            BACKUP_PREFIX + r"/cluster/self/repository/(?P<status>[^/]+)/(?P<repository>[^/]+)(?:/info)?",
+            "get_backup_repository",
+        ),
+        (
+            "GET",
+            BACKUP_PREFIX + r"/cluster/self/repository/(?P<status>[^/]+)/(?P<repository>[^/]+)/taskHistory",
+            "get_backup_task_history",
+        ),
+        (
+            "POST",
+            BACKUP_PREFIX + r"/cluster/self/repository/(?P<status>[^/]+)/(?P<repository>[^/]+)/restore",
+            "restore_backup",
+        ),
+    ]
+    compiled_routes = [(method, re.compile(pattern + "$"), name) for method, pattern, name in routes]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def dispatch(self, method: str):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        server = self.server.mock
+        server.count_request()
+        latency = server.latency(method, url.path) if callable(server.latency) else server.latency
+        if latency:
+            time.sleep(latency)
+
+        for route_method, pattern, name in self.compiled_routes:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                try:
+                    with server.state.lock:
+                        status, payload = getattr(self, name)(server.state, **match.groupdict())
+                except (KeyError, ValueError) as e:
+                    status, payload = 400, {"errors": {"_": f"Invalid request: {e}"}}
+                return self.reply(status, payload, method == "GET")
+
+        self.reply(404, {"error": f"Not found: {method} {url.path}"})
+
+    def reply(self, status: int, payload, conditional=False):
+        body = json.dumps(payload).encode() if not isinstance(payload, bytes) else payload
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if conditional and status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if conditional:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def form(self) -> dict:
+        return {key: values[-1] for key, values in parse_qs(self.body.decode()).items()}
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+    def ok(self, state, **kwargs):
+        return 200, {}
+
+    def get_pool(self, state):
+        rebalancing = state.rebalance_progress() < 1.0
+        return 200, dict(
+            state.memory_quotas,
+            name="default",
+            clusterName=state.cluster_name,
+            nodes=state.nodes,
+            rebalanceStatus="running" if rebalancing else "none",
+            balanced=not rebalancing,
+            buckets={"uri": "/pools/default/buckets"},
+        )
+
+    def set_pool(self, state):
+        form = self.form()
+        if "clusterName" in form:
+            state.cluster_name = form.pop("clusterName")
+        state.memory_quotas.update((key, int(value)) for key, value in form.items())
+        return 200, {}
+
+    def get_node(self, state):
+        return 200, dict(state.nodes[0], thisNode=True)
+
+    def add_node(self, state):
+        form = self.form()
+        hostname = form["hostname"].split("://")[-1].split(":")[0]
+        services = form.get("services", "kv").split(",")
+        return 200, {"otpNode": state.add_node(services, hostname)["otpNode"]}
+
+    def start_rebalance(self, state):
+        ejected = set(filter(None, self.form().get("ejectedNodes", "").split(",")))
+        state.nodes = [node for node in state.nodes if node["otpNode"] not in ejected]
+        state.rebalance_started_at = time.monotonic()
+        return 200, {}
+
+    def get_rebalance_progress(self, state):
+        progress = state.rebalance_progress()
+        if progress >= 1.0:
+            return 200, {"status": "none"}
+        return 200, dict(
+            {node["otpNode"]: {"progress": progress} for node in state.nodes},
+            status="running",
+        )
+
+    def get_tasks(self, state):
+        progress = state.rebalance_progress()
+        task = {"type": "rebalance", "status": "notRunning"}
+        if progress < 1.0:
+            task = {"type": "rebalance", "status": "running", "progress": progress * 100}
+        return 200, [task]
+
+    def get_buckets(self, state):
+        return 200, [
+            {key: value for key, value in bucket.items() if key != "manifest"} for bucket in state.buckets.values()
+        ]
+
+    def get_bucket(self, state, bucket):
+        if bucket not in state.buckets:
+            return 404, {"error": "Requested resource not found."}
+        return 200, {key: value for key, value in state.buckets[bucket].items() if key != "manifest"}
+
+    def create_bucket(self, state):
+        form = self.form()
+        if form.get("name") in state.buckets:
+            return 400, {"errors": {"name": "Bucket with given name already exists"}}
+        state.add_bucket(form)
+        return 202, {}
+
+    def get_scopes(self, state, bucket):
+        if bucket not in state.buckets:
+            return 404, {"error": "Requested resource not found."}
+        return 200, state.buckets[bucket]["manifest"]
+
+    def create_scope(self, state, bucket):
+        manifest = state.buckets[bucket]["manifest"]
+        manifest["scopes"].append({"name": self.form()["name"], "uid": "0", "collections": []})
+        return 200, {"uid": state.bump_manifest(state.buckets[bucket])}
+
+    def create_collection(self, state, bucket, scope):
+        manifest = state.buckets[bucket]["manifest"]
+        for item in manifest["scopes"]:
+            if item["name"] == scope:
+                item["collections"].append(dict(self.form(), uid="0"))
+                return 200, {"uid": state.bump_manifest(state.buckets[bucket])}
+        return 404, {"errors": {"scope": "Scope with this name is not found"}}
+
+    def set_manifest(self, state, bucket):
+        manifest = state.buckets[bucket]["manifest"]
+        if self.query.get("validOnUid", manifest["uid"]) != manifest["uid"]:
+            return 400, {"errors": {"_": "Got unexpected manifest uid"}}
+        manifest["scopes"] = self.json()["scopes"]
+        return 200, {"uid": state.bump_manifest(state.buckets[bucket])}
+
+    def get_index_status(self, state):
+        return 200, {"indexes": state.indexes(), "version": state.index_version, "warnings": []}
+
+    def get_statistics(self, state):
+        now = int(time.time())
+        response = []
+        for specification in self.json():
+            step = int(specification.get("step", 10))
+            start = int(specification.get("start", -60))
+            start = now + start if start < 0 else start
+            timestamps = range(start - start % step, now + 1, step)
+            timestamps = list(timestamps)[-state.max_stats_samples:]
+
+            name = next(
+                (item["value"] for item in specification.get("metric", []) if item["label"] == "name"),
+                None,
+            )
+            nodes = [node["hostname"] for node in state.nodes]
+            if specification.get("nodesAggregation"):
+                groups = [{"nodes": nodes}]
+            else:
+                groups = [{"nodes": [hostname], "instance": hostname} for hostname in nodes]
+
+            response.append(
+                {
+                    "data": [
+                        {
+                            "metric": dict(group, name=name),
+                            "values": [[timestamp, str(timestamp % 100)] for timestamp in timestamps],
+                        }
+                        for group in groups
+                    ],
+                    "errors": [],
+                    "startTimestamp": timestamps[0] if timestamps else start,
+                    "endTimestamp": timestamps[-1] if timestamps else now,
+                }
+            )
+        return 200, response
+
+    def get_backup_info(self, state):
+        return 200, {"active": list(state.backup_repositories.values()), "archived": [], "imported": []}
+
+    def create_backup_plan(self, state, plan):
+        state.backup_plans[plan] = self.json()
+        return 200, {}
+
+    def get_backup_repositories(self, state, status):
+        return 200, [repository for repository in state.backup_repositories.values() if status == "active"]
+
+    def create_backup_repository(self, state, repository):
+        state.backup_repositories[repository] = dict(self.json(), id=repository, state="active")
+        return 200, {}
+
+    def get_backup_repository(self, state, status, repository):
+        if repository not in state.backup_repositories:
+            return 404, {"msg": "repository not found"}
+        return 200, state.backup_repositories[repository]
+
+    def get_backup_task_history(self, state, status, repository):
+        tasks = [state.backup_task(task) for task in reversed(state.backup_tasks.get(repository, []))]
+        if "taskName" in self.query:
+            tasks = [task for task in tasks if task["task_name"] == self.query["taskName"]]
+        offset = int(self.query.get("offset", 0))
+        limit = int(self.query.get("limit", len(tasks)))
+        return 200, tasks[offset:offset + limit]
+
+    def restore_backup(self, state, status, repository):
+        specification = self.json() or {}
+        tasks = state.backup_tasks.setdefault(repository, [])
+        task_name = f"RESTORE-{repository}-{len(tasks) + 1}"
+        buckets = [specification["include_data"]] if specification.get("include_data") else list(state.buckets)
+        tasks.append(
+            {
+                "task_name": task_name,
+                "type": "RESTORE",
+                "start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "started_at": time.monotonic(),
+                "buckets": buckets,
+                "total_items": 1000,
+            }
+        )
+        return 200, {"task_name": task_name}
+
+
+class MockNsServer:
+    """
+    In-process fake of the ns_server REST API, for offline tests and
+    benchmarks of the client.
+
+    Serves the endpoints used by Cluster for pools, nodes, rebalance,
+    buckets, scopes and collections, indexStatus, range statistics and the
+    backup service `_p` routes, from a MockClusterState. Responses to GETs
+    carry an ETag and honour If-None-Match.
+
+    `latency` is the delay added to every request in seconds, or a
+    callable taking (method, path) and returning it. Payload sizes follow
+    the number of `nodes`, buckets and `indexes_per_bucket`, and the
+    requested statistics windows.
+
+        with MockNsServer(nodes=100, buckets=["app"], latency=0.005) as server:
+            cluster = Cluster("mock", services=["kv"], **server.cluster_kwargs())
+            cluster.rebalance()
+            cluster.wait_for_rebalance()
+
+    Each server listens on its own port, so many of them can run side by
+    side to simulate a fleet of nodes.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, state: MockClusterState = None, **state_kwargs):
+        self.latency = latency
+        self.state = state or MockClusterState(**state_kwargs)
+        self.requests_served = 0
+
+        self._counter_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        return self._httpd.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def cluster_kwargs(self) -> dict:
+        return {"api_host": self.host, "api_port": self.port}
+
+    def count_request(self):
+        with self._counter_lock:
+            self.requests_served += 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-ns-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,205 @@
+import codecs
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_PREPARED_STATEMENT_CACHE_SIZE = 100
+
+# Query service errors meaning that a prepared statement must be prepared
+# again, e.g. after a query node restart.
+REPREPARE_ERROR_CODES = {4040, 4050, 4070}
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class _NeedMoreData(Exception):
+    pass
+
+
+class QueryStream:
+    """
+    Iterates over the rows of a streamed N1QL query response, parsing the
+    `results` array one row at a time so that memory use does not depend on
+    the size of the result.
+
+    The other top-level fields of the response (`requestID`, `signature`,
+    `status`, `metrics`, `errors`, ...) are collected in `meta` as they are
+    parsed. Those following `results`, such as `status` and `metrics`, are
+    only available once all rows have been consumed.
+
+        stream = cluster.query_stream({"statement": "SELECT * FROM system:indexes"})
+        for row in stream:
+            ...
+        print(stream.status, stream.metrics)
+    """
+
+    def __init__(self, response, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.response = response
+        self.meta = {}
+
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._rows = None
+
+    @property
+    def status(self):
+        return self.meta.get("status")
+
+    @property
+    def metrics(self):
+        return self.meta.get("metrics")
+
+    @property
+    def errors(self):
+        return self.meta.get("errors", [])
+
+    @property
+    def warnings(self):
+        return self.meta.get("warnings", [])
+
+    @property
+    def request_id(self):
+        return self.meta.get("requestID")
+
+    def __iter__(self):
+        if self._rows is None:
+            self._rows = self._parse()
+        return self._rows
+
+    def close(self):
+        self.response.close()
+
+    def _read(self):
+        # Drop consumed data to keep the buffer small.
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._buffer += self._text_decoder.decode(b"", final=True)
+            self._eof = True
+            return
+        self._buffer += self._text_decoder.decode(chunk)
+
+    def _retry(self, parse):
+        # Calls parse() until enough data has been read for it to succeed.
+        while True:
+            start = self._pos
+            try:
+                return parse()
+            except _NeedMoreData:
+                self._pos = start
+                if self._eof:
+                    raise ValueError("Truncated query response")
+                self._read()
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return
+            if self._eof:
+                raise ValueError("Truncated query response")
+            self._read()
+
+    def _peek(self):
+        self._skip_whitespace()
+        return self._buffer[self._pos]
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Unexpected character in query response: {self._buffer[self._pos]!r}")
+        self._pos += 1
+
+    def _decode_value(self):
+        if self._pos >= len(self._buffer):
+            raise _NeedMoreData
+        try:
+            value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            raise _NeedMoreData
+        # A value is only complete once a delimiter follows: a number at the
+        # end of the buffer, e.g. "1." or "1e", may continue in the next chunk.
+        if not self._eof and (end >= len(self._buffer) or self._buffer[end] not in _DELIMITERS):
+            raise _NeedMoreData
+        self._pos = end
+        return value
+
+    def _value(self):
+        self._skip_whitespace()
+        return self._retry(self._decode_value)
+
+    def _parse(self):
+        try:
+            self._expect("{")
+            while True:
+                char = self._peek()
+                if char == "}":
+                    return
+                if char == ",":
+                    self._pos += 1
+                    continue
+
+                key = self._value()
+                self._expect(":")
+
+                if key == "results" and self._peek() == "[":
+                    self._pos += 1
+                    yield from self._parse_rows()
+                else:
+                    self.meta[key] = self._value()
+        finally:
+            self.close()
+
+    def _parse_rows(self):
+        while True:
+            char = self._peek()
+            if char == "]":
+                self._pos += 1
+                return
+            if char == ",":
+                self._pos += 1
+                continue
+            yield self._value()
+
+
+class PreparedStatementCache:
+    """
+    Thread-safe LRU mapping of N1QL statements to prepared statement names.
+    """
+
+    def __init__(self, size=DEFAULT_PREPARED_STATEMENT_CACHE_SIZE):
+        self.size = size
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, statement: str):
+        with self._lock:
+            name = self._names.get(statement)
+            if name is not None:
+                self._names.move_to_end(statement)
+            return name
+
+    def put(self, statement: str, name: str):
+        with self._lock:
+            self._names[statement] = name
+            self._names.move_to_end(statement)
+            while len(self._names) > self.size:
+                self._names.popitem(last=False)
+
+    def invalidate(self, statement: str):
+        with self._lock:
+            self._names.pop(statement, None)
+
+    def __len__(self):
+        return len(self._names)
@@ -0,0 +1,99 @@
+import time
+
+DEFAULT_MAX_INTERVAL = 30
+DEFAULT_BACKOFF = 1.5
+
+
+class RebalanceStatus:
+    """
+    One observation of rebalance progress.
+
+    `node_progress` maps otpNode names to progress fractions (0.0 - 1.0),
+    `progress` is their average, and `eta` the estimated number of seconds
+    left, or None while there is not enough history to tell.
+    """
+
+    def __init__(self, running: bool, node_progress: dict, progress: float, eta, elapsed: float):
+        self.running = running
+        self.node_progress = node_progress
+        self.progress = progress
+        self.eta = eta
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return (
+            f"RebalanceStatus(running={self.running}, progress={self.progress:.3f}, "
+            f"eta={self.eta}, elapsed={self.elapsed:.1f})"
+        )
+
+
+class RebalanceMonitor:
+    """
+    Tracks rebalance progress over time to estimate the remaining time and
+    choose the next poll interval.
+
+    The interval grows by `backoff` after each poll, up to `max_interval`,
+    while the rebalance is far from done, and shrinks to a quarter of the
+    ETA (but at least `min_interval`) as it nears completion.
+    """
+
+    def __init__(self, min_interval=1, max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+
+        self._started_at = None
+        self._first = None
+
+    def update(self, rebalance_progress: dict, now=None) -> RebalanceStatus:
+        """
+        Record a `/pools/default/rebalanceProgress` response.
+        """
+
+        now = time.monotonic() if now is None else now
+        if self._started_at is None:
+            self._started_at = now
+
+        running = rebalance_progress.get("status") != "none"
+        node_progress = {
+            name: float(value["progress"])
+            for name, value in rebalance_progress.items()
+            if isinstance(value, dict) and "progress" in value
+        }
+
+        if not running:
+            progress = 1.0
+        elif node_progress:
+            progress = sum(node_progress.values()) / len(node_progress)
+        else:
+            progress = 0.0
+
+        eta = None
+        if not running:
+            eta = 0.0
+        elif self._first is None:
+            self._first = (now, progress)
+        else:
+            first_time, first_progress = self._first
+            if now > first_time and progress > first_progress:
+                rate = (progress - first_progress) / (now - first_time)
+                eta = (1.0 - progress) / rate
+
+        return RebalanceStatus(running, node_progress, progress, eta, now - self._started_at)
+
+    def next_interval(self, status: RebalanceStatus) -> float:
+        return self.next_interval_for_eta(status.eta)
+
+    def next_interval_for_eta(self, eta) -> float:
+        """
+        Next poll interval of any operation with the given ETA in seconds
+        (or None), e.g. an XDCR drain.
+        """
+
+        interval = min(self.interval * self.backoff, self.max_interval)
+        if eta is not None:
+            interval = min(interval, eta / 4)
+        self.interval = max(self.min_interval, interval)
+
+        return self.interval
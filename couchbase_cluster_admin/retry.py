@@ -0,0 +1,162 @@
+import random
+import threading
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 10.0
+DEFAULT_MULTIPLIER = 2.0
+
+# Methods safe to send more than once. Other methods are only retried when
+# the request cannot have reached the server, or when the caller marks the
+# request as idempotent.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Bad gateway, service unavailable (ns_server is busy, e.g. during a
+# rebalance) and gateway timeout, typically from `_p` proxied services.
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+
+def is_connect_error(error) -> bool:
+    """
+    Whether `error` happened while establishing the connection, so that the
+    request cannot have reached the server.
+    """
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # Refused connections and failed name resolution.
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+
+class RetryBudget:
+    """
+    Limits the share of requests of a client that are retries, so that
+    retries do not pile up on a struggling cluster.
+
+    Every request deposits `ratio` tokens, up to `max_tokens`, and every
+    retry withdraws one. Retries are refused while the budget is empty.
+    """
+
+    def __init__(self, max_tokens=10, ratio=0.1):
+        self.max_tokens = max_tokens
+        self.ratio = ratio
+        self.tokens = float(max_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried.
+
+    Retries happen on connection errors, timeouts and `retry_status_codes`
+    responses, up to `max_attempts` attempts in total, and only while the
+    next attempt would start within `deadline` seconds of the first one;
+    the timeout of each attempt is capped at the time left until then.
+    Delays grow exponentially from `backoff` up to `max_backoff` with full
+    jitter, so that clients do not retry in lockstep; a Retry-After header
+    takes precedence.
+
+    Requests with methods outside `idempotent_methods` are only retried
+    when they failed to connect, unless the caller passes `idempotent=True`
+    to http_request().
+    """
+
+    def __init__(
+        self,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        multiplier=DEFAULT_MULTIPLIER,
+        jitter=True,
+        deadline=None,
+        idempotent_methods=IDEMPOTENT_METHODS,
+        retry_status_codes=RETRY_STATUS_CODES,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.idempotent_methods = idempotent_methods
+        self.retry_status_codes = retry_status_codes
+
+    def should_retry(self, method: str, attempt: int, error=None, response=None, idempotent=None) -> bool:
+        """
+        Whether to retry after attempt number `attempt` (starting at 1)
+        failed with `error` or returned `response`.
+        """
+
+        if attempt >= self.max_attempts:
+            return False
+
+        idempotent = self.is_idempotent(method, idempotent)
+
+        if error is not None:
+            if is_connect_error(error):
+                # The request was never sent.
+                return True
+            if isinstance(error, requests.exceptions.SSLError):
+                return False
+            return idempotent and isinstance(
+                error,
+                (requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+            )
+
+        return idempotent and response is not None and response.status_code in self.retry_status_codes
+
+    def is_idempotent(self, method: str, idempotent=None) -> bool:
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in self.idempotent_methods
+
+    def attempt_timeout(self, timeout, elapsed: float):
+        """
+        `timeout` of an attempt starting `elapsed` seconds after the first
+        one, capped at the time left until the deadline. `timeout` may be a
+        number, a (connect, read) tuple or None, as for requests.
+        """
+
+        if self.deadline is None:
+            return timeout
+        remaining = max(self.deadline - elapsed, 0.001)
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+    def delay(self, attempt: int, response=None) -> float:
+        """
+        Seconds to wait before the attempt following attempt `attempt`.
+        """
+
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return float(response.headers["Retry-After"])
+
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+# Single attempt, for callers that handle retries themselves.
+NO_RETRY_POLICY = RetryPolicy(max_attempts=1)
@@ -0,0 +1,288 @@
+import copy
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .cluster import service_name_memory_quota_table
+from .exceptions import ReconcileException
+from .manifest import manifest_diff, manifest_from_scopes
+
+DEFAULT_MAX_WORKERS = 4
+
+# Actions run stage by stage; actions within a stage are independent of each
+# other and may run in parallel.
+STAGE_NODE = 0
+STAGE_SETTINGS = 1
+STAGE_BUCKETS = 2
+STAGE_BUCKETS_READY = 3
+STAGE_BUCKET_CONTENTS = 4
+STAGE_REPLICATIONS = 5
+
+
+class ClusterSpec:
+    """
+    Declarative description of the desired state of a cluster.
+
+    Only what is specified is reconciled; anything else on the cluster is
+    left alone. Settings dictionaries are compared key by key, and buckets,
+    scopes, collections, users, XDCR references and replications are
+    created when missing (existing ones are not modified).
+
+        spec = ClusterSpec(
+            services=["kv", "index", "n1ql"],
+            memory_quotas={"kv": 2048, "index": 512},
+            buckets={"app": {"ramQuota": 1024, "bucketType": "couchbase"}},
+            scopes={"app": {"tenant1": ["users", "orders"]}},
+            users={"app": {"password": "secret", "roles": ["bucket_full_access[app]"]}},
+            gsi_settings={"storageMode": "plasma"},
+            autofailover={"enabled": "true", "timeout": 120},
+            xdcr_references={"dr": {"hostname": "dr.example.com", "username": "u", "password": "p"}},
+            xdcr_replications=[
+                {"fromBucket": "app", "toCluster": "dr", "toBucket": "app", "replicationType": "continuous"},
+            ],
+        )
+        actions = reconcile(cluster, spec)
+
+    `scopes` maps bucket names to scopes, and scopes to lists of
+    collection names or collection settings dictionaries with a `name`.
+    """
+
+    def __init__(
+        self,
+        services: list = None,
+        memory_quotas: dict = None,
+        buckets: dict = None,
+        scopes: dict = None,
+        users: dict = None,
+        gsi_settings: dict = None,
+        autofailover: dict = None,
+        audit: dict = None,
+        xdcr_references: dict = None,
+        xdcr_replications: list = None,
+    ):
+        self.services = services
+        self.memory_quotas = memory_quotas or {}
+        self.buckets = buckets or {}
+        self.scopes = scopes or {}
+        self.users = users or {}
+        self.gsi_settings = gsi_settings or {}
+        self.autofailover = autofailover or {}
+        self.audit = audit or {}
+        self.xdcr_references = xdcr_references or {}
+        self.xdcr_replications = xdcr_replications or []
+
+
+class Action:
+    """
+    A single mutation needed to converge the cluster on the spec.
+    """
+
+    def __init__(self, stage: int, description: str, func, *args):
+        self.stage = stage
+        self.description = description
+        self.func = func
+        self.args = args
+
+    def __call__(self):
+        return self.func(*self.args)
+
+    def __repr__(self):
+        return f"Action({self.description!r})"
+
+
+def _normalize(value):
+    # ns_server returns typed JSON, while settings are posted as form data.
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(v) for v in value)
+    return str(value)
+
+
+def _settings_diff(current: dict, desired: dict) -> dict:
+    return {
+        key: value
+        for key, value in desired.items()
+        if key not in current or _normalize(current[key]) != _normalize(value)
+    }
+
+
+def _memory_quota_settings(memory_quotas: dict) -> dict:
+    """
+    Maps quotas by service name to pools/default form keys. Services
+    without a quota of their own are skipped; two services sharing a
+    quota key are rejected, as one would silently overwrite the other.
+    """
+
+    settings = {}
+    services_by_key = {}
+    for service, quota in memory_quotas.items():
+        if service not in service_name_memory_quota_table:
+            raise ValueError(f"Unknown service name: {service}")
+        key = service_name_memory_quota_table[service]
+        if key is None:
+            logging.warning(f"Ignoring memory quota of {service}: the service has no quota setting")
+            continue
+        if key in services_by_key:
+            raise ValueError(f"Memory quotas of {services_by_key[key]} and {service} both set {key}")
+        services_by_key[key] = service
+        settings[key] = quota
+    return settings
+
+
+def plan(cluster, spec: ClusterSpec) -> list:
+    """
+    Reads the current state of the cluster and returns the Actions needed
+    to converge it on the spec. All reads happen in one snapshot, so each
+    endpoint is fetched at most once.
+    """
+
+    actions = []
+
+    with cluster.snapshot():
+        if spec.services is not None:
+            current_services = set(cluster.node_info.get("services", []))
+            if current_services != set(spec.services):
+                actions.append(
+                    Action(STAGE_NODE, f"enable services {spec.services}", cluster.enable_services, spec.services)
+                )
+
+        if spec.memory_quotas:
+            quotas = _settings_diff(cluster.pool_info, _memory_quota_settings(spec.memory_quotas))
+            if quotas:
+                actions.append(
+                    Action(STAGE_SETTINGS, f"set memory quotas {quotas}", cluster.set_memory_quotas, quotas)
+                )
+
+        for name, desired, getter, setter in (
+            ("GSI settings", spec.gsi_settings, cluster.get_gsi_settings, cluster.set_gsi_settings),
+            ("auto failover", spec.autofailover, cluster.get_autofailover_settings, cluster.set_autofailover),
+            ("audit settings", spec.audit, cluster.get_audit_settings, cluster.set_audit_settings),
+        ):
+            if desired:
+                settings = _settings_diff(getter(), desired)
+                if settings:
+                    actions.append(Action(STAGE_SETTINGS, f"set {name} {settings}", setter, settings))
+
+        existing_buckets = set()
+        if spec.buckets or spec.scopes:
+            existing_buckets = {bucket["name"] for bucket in cluster.buckets}
+
+        for bucket_name, bucket_config in spec.buckets.items():
+            if bucket_name not in existing_buckets:
+                config = dict(bucket_config, name=bucket_name)
+                actions.append(
+                    Action(STAGE_BUCKETS, f"create bucket {bucket_name}", cluster.create_bucket, config)
+                )
+                # Buckets are created asynchronously.
+                actions.append(
+                    Action(
+                        STAGE_BUCKETS_READY,
+                        f"wait for bucket {bucket_name}",
+                        cluster.wait_for_bucket_ready,
+                        bucket_name,
+                    )
+                )
+
+        for bucket_name, scopes in spec.scopes.items():
+            manifest = manifest_from_scopes(scopes)
+            current = {}
+            if bucket_name in existing_buckets:
+                current = cluster.get_scopes(bucket_name)
+
+            if any(manifest_diff(current, manifest)):
+                actions.append(
+                    Action(
+                        STAGE_BUCKET_CONTENTS,
+                        f"create scopes and collections in {bucket_name}",
+                        cluster.apply_collections_manifest,
+                        bucket_name,
+                        manifest,
+                    )
+                )
+
+        if spec.users:
+            existing_users = {user["id"] for user in cluster.users}
+            for username, user_config in spec.users.items():
+                if username not in existing_users:
+                    actions.append(
+                        Action(
+                            STAGE_BUCKET_CONTENTS,
+                            f"create user {username}",
+                            cluster.create_user,
+                            username,
+                            copy.deepcopy(user_config),
+                        )
+                    )
+
+        references = {}
+        if spec.xdcr_references or spec.xdcr_replications:
+            references = {
+                reference["name"]: reference
+                for reference in cluster.get_xdcr_references()
+                if not reference.get("deleted")
+            }
+
+        for name, settings in spec.xdcr_references.items():
+            if name not in references:
+                actions.append(
+                    Action(
+                        STAGE_BUCKETS,
+                        f"create XDCR reference {name}",
+                        cluster.create_xdcr_reference,
+                        dict(settings, name=name),
+                    )
+                )
+
+        if spec.xdcr_replications:
+            existing_replications = {
+                (task.get("source"), task.get("target")) for task in cluster.get_xdcr_replications()
+            }
+            for settings in spec.xdcr_replications:
+                reference = references.get(settings["toCluster"])
+                target = reference and f"/remoteClusters/{reference['uuid']}/buckets/{settings['toBucket']}"
+                if (settings["fromBucket"], target) not in existing_replications:
+                    actions.append(
+                        Action(
+                            STAGE_REPLICATIONS,
+                            f"create XDCR replication {settings['fromBucket']} -> "
+                            f"{settings['toCluster']}/{settings['toBucket']}",
+                            cluster.create_xdcr_replication,
+                            dict(settings),
+                        )
+                    )
+
+    return actions
+
+
+def reconcile(cluster, spec: ClusterSpec, dry_run=False, max_workers=DEFAULT_MAX_WORKERS) -> list:
+    """
+    Converges the cluster on the spec, and returns the Actions taken (or
+    that would be taken, with `dry_run`).
+
+    Actions run in dependency order, one stage at a time, with the actions
+    of a stage running in parallel. On failure, the remaining stages are
+    skipped and ReconcileException is raised.
+    """
+
+    actions = plan(cluster, spec)
+    if dry_run:
+        return actions
+
+    for stage in sorted({action.stage for action in actions}):
+        stage_actions = [action for action in actions if action.stage == stage]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(stage_actions))) as executor:
+            futures = {executor.submit(action): action for action in stage_actions}
+
+        errors = {}
+        for future, action in futures.items():
+            error = future.exception()
+            if error is not None:
+                errors[action.description] = error
+            else:
+                logging.info(f"Reconciled: {action.description}")
+
+        if errors:
+            failed = "; ".join(f"{description}: {error}" for description, error in errors.items())
+            raise ReconcileException(f"Failed to reconcile cluster: {failed}", errors)
+
+    return actions
@@ -1,53 +1,433 @@
-from sshtunnel import SSHTunnelForwarder
-import paramiko
+import getpass
+import logging
+import os
+import select
+import socketserver
+import threading
+import time
+from collections import deque
 
+import paramiko
 
+DEFAULT_SSH_CONFIG_PATH = "~/.ssh/config"
 DEFAULT_LOCAL_BIND_HOST = "127.0.0.1"
 DEFAULT_REMOTE_BIND_HOST = "127.0.0.1"
+DEFAULT_SSH_PORT = 22
+DEFAULT_IDLE_TIMEOUT = 60.0
+DEFAULT_KEEPALIVE_INTERVAL = 30
+DEFAULT_SETUP_LATENCY_HISTORY = 100
 
 
-class SshTunnel:
+def load_ssh_config(path=DEFAULT_SSH_CONFIG_PATH) -> paramiko.SSHConfig:
+    """
+    Parses an OpenSSH client configuration file, by default ~/.ssh/config.
+    A missing file yields an empty configuration.
     """
-    Lightweight wrapper around SSHTunnelForwarder
 
-    Allows couchbase-cluster-admin to connect to hosts that don't directly expose
-    their Couchbase REST API, but can be reached via ssh.
+    config = paramiko.SSHConfig()
+    path = os.path.expanduser(path)
+    if os.path.exists(path):
+        with open(path) as f:
+            config.parse(f)
+    return config
+
+
+def _parse_jump_host(spec: str) -> tuple:
+    # "[user@]host[:port]" -> (user, host, port)
+    user, _, host = spec.strip().rpartition("@")
+    port = None
+    if host.count(":") == 1:
+        host, port = host.split(":")
+    return user or None, host, port
+
+
+class SshConnection:
+    """
+    One authenticated SSH transport, over which any number of forwarded
+    connections are opened as direct-tcpip channels.
+
+    Like ssh(1), `ssh_host` is looked up in the OpenSSH client
+    configuration (~/.ssh/config unless `ssh_config` is given), which can
+    set its HostName, Port, User, IdentityFile, ProxyCommand and ProxyJump;
+    `ssh_username` and `ssh_port` take precedence when given. Authenticates
+    with the keys of the SSH agent, the configured identity files and the
+    default keys.
     """
 
-    def __init__(self, ssh_username, remote_host, remote_port, local_host=None, local_port=None):
-        self.ssh_username = ssh_username
+    def __init__(self, ssh_host, ssh_username=None, ssh_port=None, ssh_config=None, proxy_jump=None):
+        self.ssh_config = ssh_config if ssh_config is not None else load_ssh_config()
+        options = self.ssh_config.lookup(ssh_host)
 
-        self.remote_bind_address = (DEFAULT_REMOTE_BIND_HOST, remote_port)
+        self.ssh_host = ssh_host
+        self.hostname = options.get("hostname", ssh_host)
+        self.ssh_port = int(ssh_port or options.get("port", DEFAULT_SSH_PORT))
+        self.ssh_username = ssh_username or options.get("user") or getpass.getuser()
+        self.identity_files = [os.path.expanduser(path) for path in options.get("identityfile", [])]
+        self.proxy_command = options.get("proxycommand")
+        self.proxy_jump = proxy_jump or options.get("proxyjump")
+        self.transport = None
 
-        if not local_host and not local_port:
-            # A random port on localhost will be assigned
-            self.local_bind_address = (DEFAULT_LOCAL_BIND_HOST,)
-        else:
-            self.local_bind_address = (local_host, local_port)
+        self._client = None
+        self._jump = None
 
-        self.server = SSHTunnelForwarder(
-            remote_host,
-            ssh_username=self.ssh_username,
-            # https://stackoverflow.com/questions/54213831/paramiko-or-sshtunnel-and-ssh-agent-without-entering-passphrase
-            ssh_pkey=paramiko.agent.Agent().get_keys(),
-            remote_bind_address=self.remote_bind_address,
-            local_bind_address=self.local_bind_address,
-        )
+    def _proxy(self):
+        if self.proxy_jump and self.proxy_jump.lower() != "none":
+            # With several hops, the last one is reached through the others.
+            *hops, last = self.proxy_jump.split(",")
+            user, host, port = _parse_jump_host(last)
+            self._jump = SshConnection(host, user, port, ssh_config=self.ssh_config, proxy_jump=",".join(hops))
+            self._jump.connect()
+            return self._jump.open_channel((self.hostname, self.ssh_port), (DEFAULT_LOCAL_BIND_HOST, 0))
+        if self.proxy_command and self.proxy_command.lower() != "none":
+            return paramiko.ProxyCommand(self.proxy_command)
+        return None
 
-    def start(self):
-        self.server.start()
+    def connect(self):
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()
+        client.set_missing_host_key_policy(paramiko.WarningPolicy())
+        try:
+            client.connect(
+                self.hostname,
+                port=self.ssh_port,
+                username=self.ssh_username,
+                key_filename=self.identity_files or None,
+                sock=self._proxy(),
+                allow_agent=True,
+                look_for_keys=True,
+            )
+        except Exception:
+            client.close()
+            if self._jump is not None:
+                self._jump.close()
+            raise
+
+        self._client = client
+        self.transport = client.get_transport()
+        self.transport.set_keepalive(DEFAULT_KEEPALIVE_INTERVAL)
+
+    @property
+    def active(self) -> bool:
+        return self.transport is not None and self.transport.is_active()
+
+    def open_channel(self, remote_address: tuple, origin_address: tuple):
+        return self.transport.open_channel("direct-tcpip", remote_address, origin_address)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        self.transport = None
+        if self._jump is not None:
+            self._jump.close()
+            self._jump = None
+
+
+def _pump(sock, channel):
+    # Copies data both ways until either side closes.
+    while True:
+        readable, _, _ = select.select([sock, channel], [], [])
+        for source, target in ((sock, channel), (channel, sock)):
+            if source in readable:
+                data = source.recv(65536)
+                if not data:
+                    return
+                target.sendall(data)
+
+
+class _ManagedConnection:
+    # An SshConnection of an SshTunnelManager with its forwards. Connects
+    # on first use and reconnects when the transport has died.
+
+    def __init__(self, manager, connection):
+        self.manager = manager
+        self.connection = connection
+        self.forwards = {}
+        self.setup_latency = None
+        self.reconnects = 0
+        self._lock = threading.Lock()
+
+    def ensure_connected(self):
+        with self._lock:
+            if self.connection.active:
+                return
+
+            connection = self.connection
+            if self.setup_latency is not None:
+                self.reconnects += 1
+                logging.warning(f"SSH connection to {connection.ssh_host} is down, reconnecting")
+                connection.close()
+
+            started = time.monotonic()
+            connection.connect()
+            self.setup_latency = time.monotonic() - started
+            self.manager.record_setup(self.setup_latency)
+            logging.info(
+                f"Opened SSH connection to {connection.ssh_username}@{connection.ssh_host}:{connection.ssh_port} "
+                f"in {self.setup_latency:.3f}s"
+            )
+
+    def open_channel(self, remote_address: tuple, origin_address: tuple):
+        self.ensure_connected()
+        try:
+            return self.connection.open_channel(remote_address, origin_address)
+        except (paramiko.SSHException, EOFError, OSError):
+            if self.connection.active:
+                raise
+            # The transport died since the check above.
+            self.ensure_connected()
+            return self.connection.open_channel(remote_address, origin_address)
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class _ForwardHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        forward = self.server.forward
+        try:
+            channel = forward.connection.open_channel(forward.remote_address, self.request.getpeername())
+        except Exception as e:
+            logging.warning(f"Failed to open SSH channel to {forward.remote_address}: {e}")
+            return
+
+        try:
+            _pump(self.request, channel)
+        except OSError:
+            pass
+        finally:
+            channel.close()
+
+
+class _Forward:
+    # A local listening port forwarded to `remote_address` through
+    # `connection`, shared by all leases of that address. The port is bound
+    # right away, so that it is known before connecting.
+
+    def __init__(self, connection: _ManagedConnection, remote_address: tuple):
+        self.connection = connection
+        self.remote_address = remote_address
+        self.refs = 0
+        self.idle_since = None
+
+        self.server = socketserver.ThreadingTCPServer((DEFAULT_LOCAL_BIND_HOST, 0), _ForwardHandler)
+        self.server.daemon_threads = True
+        self.server.forward = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ssh-forward", daemon=True)
+        self.thread.start()
+
+    @property
+    def local_address(self) -> tuple:
+        return self.server.server_address
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class SshTunnelLease:
+    """
+    A reference to a forwarded port of an SshTunnelManager, listening on
+    `local_host`:`local_port`. Release it when done, or use it as a
+    context manager.
+
+    The SSH connection is opened by connect(), or by the first connection
+    to the local port. `setup_latency` is the time the last SSH connection
+    setup took, None before it happened.
+    """
+
+    def __init__(self, manager, key: tuple, forward: _Forward):
+        self.manager = manager
+        self.key = key
+        self.forward = forward
+        self.released = False
 
     @property
     def local_host(self):
-        return self.server.local_bind_host if self.server else None
+        return self.forward.local_address[0]
 
     @property
     def local_port(self):
-        return self.server.local_bind_port if self.server else None
+        return self.forward.local_address[1]
 
-    def stop(self):
-        if self.server:
-            self.server.stop()
+    @property
+    def setup_latency(self):
+        return self.forward.connection.setup_latency
+
+    @property
+    def connected(self) -> bool:
+        return self.forward.connection.connection.active
+
+    def connect(self):
+        """
+        Opens the SSH connection, or opens it again if it died. Does
+        nothing when it is up.
+        """
+
+        self.forward.connection.ensure_connected()
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.manager.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class SshTunnelManager:
+    """
+    Shares SSH connections between tunnels.
+
+    One SSH transport is opened per (SSH host, port, user), and every
+    remote address forwarded through it gets one local port, whatever the
+    number of leases on it. Many nodes behind a bastion thus cost a single
+    SSH handshake:
+
+        with SshTunnelManager() as manager:
+            leases = [manager.lease("bastion", "admin", 8091, remote_host=host) for host in hosts]
+
+    Leasing does not touch the network: the SSH connection is opened on
+    first use, and opened again if it dies. `connections_opened` counts
+    the SSH handshakes done and `setup_latencies` holds the duration of the
+    most recent ones.
+
+    Forwards no longer leased are closed after `idle_timeout` seconds, and
+    SSH connections along with their last forward.
+
+    get_tunnel_manager() returns the manager shared by the process.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, connection_class=SshConnection):
+        self.idle_timeout = idle_timeout
+        self.connection_class = connection_class
+        self.connections_opened = 0
+        self.setup_latencies = deque(maxlen=DEFAULT_SETUP_LATENCY_HISTORY)
+
+        # (ssh_host, ssh_port, ssh_username) -> _ManagedConnection
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reaper = None
+
+    def lease(
+        self,
+        ssh_host: str,
+        ssh_username: str,
+        remote_port,
+        remote_host=DEFAULT_REMOTE_BIND_HOST,
+        ssh_port=None,
+    ) -> SshTunnelLease:
+        """
+        Returns a lease on a local port forwarded to `remote_host`:`remote_port`
+        as seen from `ssh_host`. The SSH user and port default to those of
+        ~/.ssh/config for `ssh_host`, see SshConnection.
+        """
+
+        key = (ssh_host, ssh_port, ssh_username)
+        remote_address = (remote_host, int(remote_port))
+
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("SshTunnelManager is closed")
+
+            managed = self._connections.get(key)
+            if managed is None:
+                connection = self.connection_class(ssh_host, ssh_username, ssh_port=ssh_port)
+                managed = self._connections[key] = _ManagedConnection(self, connection)
+
+            forward = managed.forwards.get(remote_address)
+            if forward is None:
+                forward = managed.forwards[remote_address] = _Forward(managed, remote_address)
+            forward.refs += 1
+            forward.idle_since = None
+
+            if self._reaper is None and self.idle_timeout:
+                self._reaper = threading.Thread(target=self._reap, name="ssh-tunnel-reaper", daemon=True)
+                self._reaper.start()
+
+        return SshTunnelLease(self, key, forward)
+
+    def record_setup(self, latency: float):
+        with self._lock:
+            self.connections_opened += 1
+            self.setup_latencies.append(latency)
+
+    def release(self, lease: SshTunnelLease):
+        with self._lock:
+            lease.forward.refs -= 1
+            if lease.forward.refs == 0:
+                lease.forward.idle_since = time.monotonic()
+
+        if not self.idle_timeout:
+            self.evict_idle()
+
+    def evict_idle(self):
+        """
+        Closes the forwards idle for `idle_timeout` seconds, and the SSH
+        connections left without forwards.
+        """
+
+        now = time.monotonic()
+        idle_forwards = []
+        idle_connections = []
+        with self._lock:
+            for key, managed in list(self._connections.items()):
+                for remote_address, forward in list(managed.forwards.items()):
+                    if forward.refs == 0 and now - forward.idle_since >= self.idle_timeout:
+                        idle_forwards.append(managed.forwards.pop(remote_address))
+                if not managed.forwards:
+                    del self._connections[key]
+                    idle_connections.append(managed)
+
+        for forward in idle_forwards:
+            forward.stop()
+        for managed in idle_connections:
+            managed.close()
+
+    def _reap(self):
+        while not self._closed.wait(self.idle_timeout / 2):
+            self.evict_idle()
+
+    def close(self):
+        """
+        Closes all forwards and SSH connections, leased or not.
+        """
+
+        self._closed.set()
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections = {}
+
+        for managed in connections:
+            for forward in managed.forwards.values():
+                forward.stop()
+            managed.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_tunnel_manager = None
+_tunnel_manager_lock = threading.Lock()
+
+
+def get_tunnel_manager() -> SshTunnelManager:
+    """
+    Returns the SshTunnelManager shared by all Cluster instances of the
+    process, creating it on first use.
+    """
 
-    def __del__(self):
-        self.stop()
+    global _tunnel_manager
+    with _tunnel_manager_lock:
+        if _tunnel_manager is None:
+            _tunnel_manager = SshTunnelManager()
+        return _tunnel_manager
@@ -0,0 +1,355 @@
+import math
+import re
+from array import array
+from collections import namedtuple
+
+DEFAULT_BATCH_SIZE = 50
+
+# `labels` is a sorted tuple of (label, value) pairs, including the labels
+# of the request specification and those returned by the server; `functions`
+# the tuple of applied functions, if any.
+SeriesKey = namedtuple("SeriesKey", ["name", "labels", "functions"])
+
+
+class StatSeries:
+    """
+    One statistics time series, stored as two parallel arrays of doubles.
+
+    Values which are not numbers (e.g. "NaN") are stored as NaN.
+    """
+
+    __slots__ = ("key", "timestamps", "values")
+
+    def __init__(self, key: SeriesKey):
+        self.key = key
+        self.timestamps = array("d")
+        self.values = array("d")
+
+    def append(self, timestamp, value):
+        self.timestamps.append(float(timestamp))
+        self.values.append(_to_float(value))
+
+    @property
+    def last(self):
+        return self.values[-1] if self.values else None
+
+    def as_numpy(self):
+        """
+        Returns (timestamps, values) NumPy arrays sharing memory with the
+        series. Requires NumPy, which is an optional dependency.
+        """
+
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("NumPy is required for StatSeries.as_numpy()")
+
+        return (
+            numpy.frombuffer(self.timestamps, dtype=numpy.float64),
+            numpy.frombuffer(self.values, dtype=numpy.float64),
+        )
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return f"StatSeries({self.key!r}, {len(self)} samples)"
+
+
+class StatsResult(dict):
+    """
+    Maps SeriesKeys to StatSeries. `errors` collects the errors reported
+    by the server for individual specifications.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.errors = []
+
+    def by_name(self, name: str):
+        return [series for key, series in self.items() if key.name == name]
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def series_key(specification: dict, metric: dict) -> SeriesKey:
+    labels = {item["label"]: item["value"] for item in specification.get("metric", [])}
+    labels.update((label, value) for label, value in metric.items() if label != "nodes")
+    name = labels.pop("name", None)
+
+    return SeriesKey(
+        name,
+        tuple(sorted((label, str(value)) for label, value in labels.items())),
+        tuple(specification.get("applyFunctions", ())),
+    )
+
+
+def decode_statistics(specifications: list, response: list, result: StatsResult = None) -> StatsResult:
+    """
+    Decodes a `/pools/default/stats/range/` response, whose items
+    correspond to the request specifications, into columns.
+    """
+
+    result = StatsResult() if result is None else result
+
+    for specification, item in zip(specifications, response):
+        result.errors.extend(item.get("errors") or [])
+        for data in item.get("data", []):
+            key = series_key(specification, data.get("metric", {}))
+            series = result.get(key)
+            if series is None:
+                series = result[key] = StatSeries(key)
+            for timestamp, value in data.get("values", []):
+                series.append(timestamp, value)
+
+    return result
+
+
+def batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of (timestamp, value) samples, overwriting the
+    oldest sample when full.
+    """
+
+    __slots__ = ("capacity", "_timestamps", "_values", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+
+    def append(self, timestamp, value):
+        end = (self._start + self._size) % self.capacity
+        self._timestamps[end] = timestamp
+        self._values[end] = value
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def _ordered(self, data):
+        end = self._start + self._size
+        if end <= self.capacity:
+            return data[self._start:end]
+        return data[self._start:] + data[:end - self.capacity]
+
+    @property
+    def timestamps(self) -> array:
+        return self._ordered(self._timestamps)
+
+    @property
+    def values(self) -> array:
+        return self._ordered(self._values)
+
+    @property
+    def last_timestamp(self):
+        if not self._size:
+            return None
+        return self._timestamps[(self._start + self._size - 1) % self.capacity]
+
+    @property
+    def last(self):
+        if not self._size:
+            return None
+        return self._values[(self._start + self._size - 1) % self.capacity]
+
+    def __len__(self):
+        return self._size
+
+
+class StatsPoller:
+    """
+    Polls the range statistics endpoint incrementally.
+
+    The first poll fetches the window of each specification as given (e.g.
+    `"start": -300`). Later polls only ask for samples after the last
+    `endTimestamp` the server returned for that specification. Samples are
+    kept in a RingBuffer of `capacity` samples per series, available as
+    `poller.series[key]`.
+
+        poller = StatsPoller(cluster, [{"metric": [...], "step": 10, "start": -300}])
+        while True:
+            poller.poll()
+            ops = poller.series[key].values
+            time.sleep(10)
+    """
+
+    def __init__(self, cluster, specifications: list, capacity=360):
+        self.cluster = cluster
+        self.specifications = [dict(specification) for specification in specifications]
+        self.capacity = capacity
+        self.series = {}
+        self.errors = []
+
+        self._end_timestamps = [None] * len(self.specifications)
+
+    def _request_specifications(self):
+        request = []
+        for specification, end_timestamp in zip(self.specifications, self._end_timestamps):
+            if end_timestamp is not None:
+                specification = dict(specification, start=end_timestamp + 1)
+                specification.pop("end", None)
+            request.append(specification)
+
+        return request
+
+    def poll(self) -> int:
+        """
+        Fetches new samples and returns how many were added.
+        """
+
+        request = self._request_specifications()
+        response = self.cluster.get_multiple_statistics(request)
+
+        added = 0
+        self.errors = []
+        for index, (specification, item) in enumerate(zip(request, response)):
+            self.errors.extend(item.get("errors") or [])
+            if item.get("endTimestamp") is not None:
+                self._end_timestamps[index] = item["endTimestamp"]
+
+            for data in item.get("data", []):
+                key = series_key(specification, data.get("metric", {}))
+                buffer = self.series.get(key)
+                if buffer is None:
+                    buffer = self.series[key] = RingBuffer(self.capacity)
+
+                for timestamp, value in data.get("values", []):
+                    last_timestamp = buffer.last_timestamp
+                    if last_timestamp is None or timestamp > last_timestamp:
+                        buffer.append(timestamp, _to_float(value))
+                        added += 1
+
+        return added
+
+
+XDCR_CHANGES_LEFT = "xdcr_changes_left_total"
+XDCR_DOCS_PROCESSED = "xdcr_docs_processed_total"
+XDCR_DATA_REPLICATED = "xdcr_data_replicated_bytes"
+
+
+class XdcrProgress:
+    """
+    XDCR progress of one source bucket, summed over its replications.
+
+    `changes_left` is None while the metric is not populated yet, or when
+    the bucket has no replications (`replicating` is False); such a bucket
+    counts as drained.
+    `docs_per_second` and `bytes_per_second` are the current replication
+    throughput, `drain_rate` the rate (changes/s) at which `changes_left`
+    went down over the sampled window, and `eta` the estimated seconds
+    until it reaches zero (None if it is not going down).
+    `replications` maps (target cluster UUID, target bucket) to changes
+    left.
+    """
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self.replicating = False
+        self.changes_left = None
+        self.docs_per_second = 0.0
+        self.bytes_per_second = 0.0
+        self.drain_rate = None
+        self.eta = None
+        self.replications = {}
+
+    @property
+    def drained(self) -> bool:
+        return self.changes_left == 0 or not self.replicating
+
+    def __repr__(self):
+        return (
+            f"XdcrProgress({self.bucket!r}, changes_left={self.changes_left}, "
+            f"drain_rate={self.drain_rate}, eta={self.eta})"
+        )
+
+
+def xdcr_statistics_specifications(buckets: list = None, window=60, step=10) -> list:
+    bucket_filter = []
+    if buckets:
+        bucket_filter = [
+            {"label": "sourceBucketName", "value": "|".join(re.escape(bucket) for bucket in buckets), "operator": "=~"},
+        ]
+
+    def specification(name, functions=()):
+        specification = {
+            "metric": [{"label": "name", "value": name}] + bucket_filter,
+            "nodesAggregation": "sum",
+            "start": -window,
+            "step": step,
+        }
+        if functions:
+            specification["applyFunctions"] = list(functions)
+        return specification
+
+    return [
+        specification(XDCR_CHANGES_LEFT),
+        specification(XDCR_DOCS_PROCESSED, ["irate"]),
+        specification(XDCR_DATA_REPLICATED, ["irate"]),
+    ]
+
+
+def xdcr_progress_from_statistics(result: StatsResult, buckets: list = None) -> dict:
+    """
+    Aggregates the series fetched with xdcr_statistics_specifications() into
+    XdcrProgress objects, keyed by source bucket name.
+    """
+
+    progress = {bucket: XdcrProgress(bucket) for bucket in buckets or []}
+    totals = {}
+
+    for key, series in result.items():
+        labels = dict(key.labels)
+        bucket = labels.get("sourceBucketName")
+        if bucket is None:
+            continue
+        bucket_progress = progress.setdefault(bucket, XdcrProgress(bucket))
+        if key.name == XDCR_CHANGES_LEFT:
+            # Replications without data points yet still count.
+            bucket_progress.replicating = True
+        if not len(series):
+            continue
+
+        last = series.last
+        if key.name == XDCR_CHANGES_LEFT:
+            if not math.isnan(last):
+                replication = (labels.get("targetClusterUUID"), labels.get("targetBucketName"))
+                bucket_progress.replications[replication] = bucket_progress.replications.get(replication, 0) + last
+            bucket_total = totals.setdefault(bucket, {})
+            for timestamp, value in zip(series.timestamps, series.values):
+                if not math.isnan(value):
+                    bucket_total[timestamp] = bucket_total.get(timestamp, 0.0) + value
+        elif key.name == XDCR_DOCS_PROCESSED and not math.isnan(last):
+            bucket_progress.docs_per_second += last
+        elif key.name == XDCR_DATA_REPLICATED and not math.isnan(last):
+            bucket_progress.bytes_per_second += last
+
+    for bucket, bucket_total in totals.items():
+        if not bucket_total:
+            continue
+        bucket_progress = progress[bucket]
+        timestamps = sorted(bucket_total)
+        first, last = timestamps[0], timestamps[-1]
+        bucket_progress.changes_left = int(bucket_total[last])
+
+        if last > first:
+            rate = (bucket_total[first] - bucket_total[last]) / (last - first)
+            bucket_progress.drain_rate = rate
+            if rate > 0:
+                bucket_progress.eta = bucket_total[last] / rate
+        if bucket_progress.changes_left == 0:
+            bucket_progress.eta = 0.0
+
+    return progress
@@ -0,0 +1,134 @@
+import json
+import logging
+from collections import namedtuple
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+SNAPSHOT = "snapshot"
+NODE_ADDED = "node_added"
+NODE_REMOVED = "node_removed"
+NODE_CHANGED = "node_changed"
+BUCKET_CREATED = "bucket_created"
+BUCKET_DELETED = "bucket_deleted"
+BUCKET_CHANGED = "bucket_changed"
+
+# ns_server writes a heartbeat to streaming responses every 20 seconds, so a
+# stream silent for several heartbeats is taken for a dead connection.
+HEARTBEAT_INTERVAL = 20
+DEFAULT_STREAM_READ_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+
+# Node attributes whose changes are reported as NODE_CHANGED events.
+WATCHED_NODE_FIELDS = ("status", "clusterMembership", "hostname", "services", "recoveryType")
+
+ClusterEvent = namedtuple("ClusterEvent", ["type", "name", "old", "new"])
+ClusterEvent.__doc__ = """
+A change in cluster state. `name` is the otpNode or bucket name the event
+is about, `old`/`new` the corresponding entries before and after the change
+(None when added or removed). SNAPSHOT events carry the full document.
+"""
+
+
+def iter_stream_documents(response, chunk_size=1024):
+    """
+    Parses the JSON documents of an ns_server streaming response as they
+    arrive. Documents are newline-delimited; empty lines are heartbeats.
+    """
+
+    try:
+        for line in response.iter_lines(chunk_size=chunk_size):
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        response.close()
+
+
+def is_read_timeout(error) -> bool:
+    """
+    Whether `error`, raised while reading a streaming response, is a read
+    timeout.
+    """
+
+    return bool(error.args) and isinstance(error.args[0], ReadTimeoutError)
+
+
+def iter_reconnecting_documents(open_stream):
+    """
+    Like iter_stream_documents(), for the response returned by
+    `open_stream()`, but reopens the stream when a read times out, e.g.
+    on a half-open connection. ns_server starts every stream with the
+    full document, so consumers diffing documents catch up on the changes
+    they missed.
+    """
+
+    while True:
+        try:
+            yield from iter_stream_documents(open_stream())
+            return
+        except requests.exceptions.ConnectionError as e:
+            if not is_read_timeout(e):
+                raise
+            logging.warning(f"Streaming response timed out, reconnecting: {e}")
+
+
+def _nodes_by_name(document):
+    return {node.get("otpNode", node.get("hostname")): node for node in document.get("nodes", [])}
+
+
+def diff_nodes(old, new):
+    old_nodes = _nodes_by_name(old)
+    new_nodes = _nodes_by_name(new)
+
+    for name, node in new_nodes.items():
+        if name not in old_nodes:
+            yield ClusterEvent(NODE_ADDED, name, None, node)
+        elif any(old_nodes[name].get(f) != node.get(f) for f in WATCHED_NODE_FIELDS):
+            yield ClusterEvent(NODE_CHANGED, name, old_nodes[name], node)
+
+    for name, node in old_nodes.items():
+        if name not in new_nodes:
+            yield ClusterEvent(NODE_REMOVED, name, node, None)
+
+
+def diff_pool(old, new):
+    """
+    Yields the events between two pool documents.
+    """
+
+    yield from diff_nodes(old, new)
+
+    old_buckets = {b["bucketName"]: b for b in old.get("bucketNames", [])}
+    new_buckets = {b["bucketName"]: b for b in new.get("bucketNames", [])}
+
+    for name, bucket in new_buckets.items():
+        if name not in old_buckets:
+            yield ClusterEvent(BUCKET_CREATED, name, None, bucket)
+    for name, bucket in old_buckets.items():
+        if name not in new_buckets:
+            yield ClusterEvent(BUCKET_DELETED, name, bucket, None)
+
+
+def diff_bucket(old, new):
+    """
+    Yields the events between two bucket documents.
+    """
+
+    yield from diff_nodes(old, new)
+
+    if old != new:
+        yield ClusterEvent(BUCKET_CHANGED, new.get("name"), old, new)
+
+
+def iter_events(documents, diff):
+    """
+    Turns a stream of documents into a SNAPSHOT event followed by the
+    events computed by `diff` between consecutive documents.
+    """
+
+    previous = None
+    for document in documents:
+        if previous is None:
+            yield ClusterEvent(SNAPSHOT, None, None, document)
+        else:
+            yield from diff(previous, document)
+        previous = document
@@ -0,0 +1,76 @@
+import asyncio
+
+import responses
+from responses import matchers
+
+from couchbase_cluster_admin.async_cluster import AsyncCluster, get_executor
+
+
+@responses.activate
+def test_async_property_and_method():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/pools/default",
+        json={"nodes": [{"otpNode": "ns_1@a"}, {"otpNode": "ns_1@b"}]},
+    )
+    responses.add(
+        responses.POST,
+        f"http://{host}:{port}/pools/default",
+        match=[matchers.urlencoded_params_matcher({"clusterName": "newname"})],
+        status=200,
+    )
+
+    async def main():
+        async with AsyncCluster("mycluster", services=["kv"], api_host=host, api_port=port) as c:
+            known_nodes = await c.known_nodes
+            await c.set_cluster_name("newname")
+            return known_nodes, c.cluster_name
+
+    known_nodes, cluster_name = asyncio.run(main())
+
+    assert known_nodes == ["ns_1@a", "ns_1@b"]
+    assert cluster_name == "newname"
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_async_wait_for_rebalance():
+    host = "127.0.0.1"
+    port = "8091"
+
+    url = f"http://{host}:{port}/pools/default/rebalanceProgress"
+    responses.add(responses.GET, url, json={"status": "running"})
+    responses.add(responses.GET, url, json={"status": "none"})
+
+    async def main():
+        c = AsyncCluster("mycluster", services=["kv"], api_host=host, api_port=port)
+        await c.wait_for_rebalance(interval=0, timeout=5)
+        c.close()
+
+    asyncio.run(main())
+
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_async_iterator():
+    host = "127.0.0.1"
+    port = "8091"
+
+    url = f"http://{host}:{port}/_p/query/query/service"
+    responses.add(responses.POST, url, json={"results": [{"a": 1}, {"a": 2}], "status": "success"})
+
+    async def main():
+        c = AsyncCluster("mycluster", services=["n1ql"], api_host=host, api_port=port)
+        stream = c.query_stream({"statement": "SELECT a"})
+        rows = [row async for row in stream]
+        return rows, stream.source.status, c.executor
+
+    rows, status, executor = asyncio.run(main())
+
+    assert rows == [{"a": 1}, {"a": 2}]
+    assert status == "success"
+    assert executor is get_executor()
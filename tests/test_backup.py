@@ -1,7 +1,13 @@
+import json
+import time
+
+import pytest
 import responses
 from responses import matchers
 
 from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.backup import BackupJobRunner
+from couchbase_cluster_admin.exceptions import BackupJobException, BackupJobRunnerClosedException
 
 
 @responses.activate
@@ -52,3 +58,144 @@ def test_create_backup_repository():
     c.create_backup_repository(repo_name, repo_settings)
 
     assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_iter_backup_task_history():
+    host = "127.0.0.1"
+    port = "8091"
+
+    url = f"http://{host}:{port}/_p/backup/api/v1/cluster/self/repository/active/repo/taskHistory"
+    # A plan task runs under the same name every day.
+    tasks = [{"task_name": "daily", "start": f"2024-01-0{i}T01:15:00Z"} for i in range(6, 0, -1)]
+
+    responses.add(
+        responses.GET,
+        url,
+        match=[matchers.query_param_matcher({"limit": "2", "offset": "0"})],
+        json=tasks[1:3],
+    )
+    # A new run started in between, shifting the history by one.
+    responses.add(
+        responses.GET,
+        url,
+        match=[matchers.query_param_matcher({"limit": "2", "offset": "2"})],
+        json=tasks[2:4],
+    )
+    responses.add(
+        responses.GET,
+        url,
+        match=[matchers.query_param_matcher({"limit": "2", "offset": "4"})],
+        json=tasks[4:6],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    history = c.iter_backup_task_history("active", "repo", page_size=2, since_task=tasks[4])
+
+    assert [task["start"] for task in history] == [task["start"] for task in tasks[1:4]]
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_get_backup_task_history_filter():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/_p/backup/api/v1/cluster/self/repository/active/repo/taskHistory",
+        match=[matchers.query_param_matcher({"taskName": "task-1"})],
+        json=[{"task_name": "task-1"}],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+
+    assert c.get_backup_task_history("active", "repo", task_name="task-1") == [{"task_name": "task-1"}]
+
+
+@responses.activate
+def test_backup_job_runner():
+    host = "127.0.0.1"
+    port = "8091"
+
+    repository_url = f"http://{host}:{port}/_p/backup/api/v1/cluster/self/repository/active"
+    for bucket in ["a", "b", "c"]:
+        responses.add(
+            responses.POST,
+            f"{repository_url}/repo/restore",
+            match=[matchers.json_params_matcher({"include_data": bucket})],
+            json={"task_name": f"restore-{bucket}"},
+        )
+
+    # Each task is running when first seen, and finished the next time.
+    polls = {}
+
+    def history(request):
+        started = [
+            f"restore-{json.loads(call.request.body)['include_data']}"
+            for call in responses.calls
+            if call.request.method == "POST"
+        ]
+        tasks = []
+        for name in reversed(started):
+            polls[name] = polls.get(name, 0) + 1
+            received = 1000 * polls[name]
+            status = "running" if polls[name] == 1 else "failed" if name == "restore-b" else "done"
+            tasks.append(
+                {
+                    "task_name": name,
+                    "status": status,
+                    "error": "disk full" if status == "failed" else None,
+                    "stats": {"buckets": {"a": {"bytes_received": received, "mutations_received": received // 10}}},
+                }
+            )
+        return 200, {}, json.dumps(tasks)
+
+    responses.add_callback(responses.GET, f"{repository_url}/repo/taskHistory", callback=history)
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    with BackupJobRunner(c, max_concurrent=2, poll_interval=0.01) as runner:
+        job_a = runner.restore("repo", {"include_data": "a"})
+        job_b = runner.restore("repo", {"include_data": "b"})
+        job_c = runner.restore("repo", {"include_data": "c"})
+
+    assert job_a.result()["status"] == "done"
+    assert job_a.bytes_received == 2000
+    assert job_a.items_received == 200
+    assert job_a.bytes_per_second > 0
+    with pytest.raises(BackupJobException):
+        job_b.result()
+    assert job_c.result()["status"] == "done"
+
+    # One history request per poll for all jobs of the repository.
+    gets = [call.request for call in responses.calls if call.request.method == "GET"]
+    assert all("taskName" not in request.url for request in gets)
+    assert len(gets) < 6
+
+
+@responses.activate
+def test_backup_job_runner_close():
+    host = "127.0.0.1"
+    port = "8091"
+
+    repository_url = f"http://{host}:{port}/_p/backup/api/v1/cluster/self/repository/active"
+    responses.add(responses.POST, f"{repository_url}/repo/restore", json={"task_name": "restore-a"})
+    responses.add(
+        responses.GET,
+        f"{repository_url}/repo/taskHistory",
+        json=[{"task_name": "restore-a", "status": "running", "stats": {}}],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    runner = BackupJobRunner(c, max_concurrent=1, poll_interval=0.01)
+    job_a = runner.restore("repo", {"include_data": "a"})
+    job_b = runner.restore("repo", {"include_data": "b"})
+
+    deadline = time.monotonic() + 5
+    while job_a.task is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    runner.close(timeout=5)
+
+    with pytest.raises(BackupJobRunnerClosedException):
+        job_a.result(timeout=0)
+    assert job_b.future.cancelled()
@@ -0,0 +1,127 @@
+import responses
+from responses import matchers
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.cache import ResponseCache
+
+NODE_INFO = {"otpNode": "ns_1@127.0.0.1", "nodeUUID": "abc"}
+
+
+@responses.activate
+def test_no_caching_by_default():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(responses.GET, f"http://{host}:{port}/nodes/self", json=NODE_INFO)
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    c.node_name
+    c.node_uuid
+
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_snapshot():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(responses.GET, f"http://{host}:{port}/nodes/self", json=NODE_INFO)
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    with c.snapshot():
+        assert c.node_name == "ns_1@127.0.0.1"
+        assert c.node_uuid == "abc"
+    assert len(responses.calls) == 1
+
+    # Reads are no longer frozen after the snapshot.
+    c.node_name
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_ttl_and_invalidation():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/pools/default",
+        json={"nodes": [{"otpNode": "ns_1@a"}]},
+    )
+    responses.add(
+        responses.POST,
+        f"http://{host}:{port}/pools/default",
+        match=[matchers.urlencoded_params_matcher({"clusterName": "newname"})],
+    )
+
+    c = cluster.Cluster(
+        "mycluster",
+        services=["kv"],
+        api_host=host,
+        api_port=port,
+        response_cache_ttl={"/pools/default": 60},
+    )
+    c.known_nodes
+    c.known_nodes
+    assert len(responses.calls) == 1
+
+    c.set_cluster_name("newname")
+    c.known_nodes
+    assert len(responses.calls) == 3
+
+
+def test_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("couchbase_cluster_admin.cache.time.monotonic", lambda: now[0])
+
+    cache = ResponseCache(ttl=5)
+    cache.put("/pools/default", {"a": 1})
+    assert cache.get("/pools/default") == (True, {"a": 1})
+
+    now[0] += 5
+    assert cache.get("/pools/default") == (False, None)
+
+
+@responses.activate
+def test_poll_index_status_unchanged():
+    host = "127.0.0.1"
+    port = "8091"
+
+    url = f"http://{host}:{port}/indexStatus"
+    responses.add(responses.GET, url, json={"indexes": [], "version": 1, "warnings": []})
+    responses.add(responses.GET, url, json={"indexes": [], "version": 1, "warnings": []})
+    responses.add(responses.GET, url, json={"indexes": [{"name": "i"}], "version": 2, "warnings": []})
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+
+    first, changed = c.poll_index_status()
+    assert changed
+    second, changed = c.poll_index_status()
+    assert not changed
+    assert second is first
+
+    third, changed = c.poll_index_status()
+    assert changed
+    assert third["version"] == 2
+    assert c.resource_versions.revision("/indexStatus") == 2
+
+
+@responses.activate
+def test_poll_pool_info_not_modified():
+    host = "127.0.0.1"
+    port = "8091"
+
+    url = f"http://{host}:{port}/pools/default"
+    responses.add(responses.GET, url, json={"nodes": []}, headers={"ETag": '"e1"'})
+    responses.add(
+        responses.GET,
+        url,
+        status=304,
+        match=[matchers.header_matcher({"If-None-Match": '"e1"'})],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+
+    assert c.poll_pool_info() == ({"nodes": []}, True)
+    assert c.poll_pool_info() == ({"nodes": []}, False)
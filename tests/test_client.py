@@ -0,0 +1,104 @@
+import http.server
+import threading
+import time
+
+import pytest
+import responses
+
+from couchbase_cluster_admin import client, cluster
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"otpNode": "ns_1@127.0.0.1", "nodeUUID": "abc"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def keepalive_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(keepalive_server):
+    host, port = keepalive_server
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    assert c.node_name == "ns_1@127.0.0.1"
+    assert c.node_uuid == "abc"
+    assert c.node_name == "ns_1@127.0.0.1"
+
+    assert c.connection_stats == {"new_connections": 1, "reused_connections": 2}
+    c.close()
+
+
+def test_shared_session(keepalive_server):
+    host, port = keepalive_server
+
+    session = client.create_session(pool_maxsize=2)
+    c1 = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port, http_session=session)
+    c2 = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port, http_session=session)
+    c1.node_info
+    c2.node_info
+
+    assert c1.session is c2.session
+    assert c2.connection_stats == {"new_connections": 1, "reused_connections": 1}
+    session.close()
+
+
+@responses.activate
+def test_session_is_created_once():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(responses.GET, f"http://{host}:{port}/nodes/self", json={"otpNode": "n"})
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    session = c.session
+    c.node_info
+    c.node_info
+
+    assert c.session is session
+    assert len(responses.calls) == 2
+
+
+def test_concurrent_session_creation(monkeypatch):
+    created = []
+    barrier = threading.Barrier(8)
+    original = client.create_session
+
+    def counting_create_session(**kwargs):
+        created.append(None)
+        time.sleep(0.05)
+        return original(**kwargs)
+
+    monkeypatch.setattr(client, "create_session", counting_create_session)
+    c = cluster.Cluster("mycluster", services=["kv"], api_host="127.0.0.1", api_port="8091")
+    sessions = []
+
+    def use_session():
+        barrier.wait()
+        sessions.append(c.session)
+
+    threads = [threading.Thread(target=use_session) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(session is sessions[0] for session in sessions)
+    c.close()
@@ -2,7 +2,7 @@ import pytest
 import responses
 from responses import matchers
 
-from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin import cluster, rebalance
 
 
 @responses.activate
@@ -482,4 +482,175 @@ def test_start_logs_collection():
     )
     c.start_logs_collection(log_collection_options)
 
-    assert len(responses.calls) == 1
\ No newline at end of file
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_add_nodes():
+    host = "127.0.0.1"
+    port = "8091"
+
+    new_nodes = ["10.0.0.2", "10.0.0.3"]
+    for new_node in new_nodes:
+        responses.add(
+            responses.POST,
+            f"http://{host}:{port}/controller/addNode",
+            match=[
+                matchers.urlencoded_params_matcher(
+                    {
+                        "hostname": new_node,
+                        "user": "foo",
+                        "password": "bar",
+                        "services": "kv",
+                    }
+                )
+            ],
+            json={"otpNode": f"ns_1@{new_node}"},
+            status=200,
+        )
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/pools/default",
+        json={"nodes": [{"otpNode": "ns_1@10.0.0.1"}] + [{"otpNode": f"ns_1@{n}"} for n in new_nodes]},
+    )
+    responses.add(
+        responses.POST,
+        f"http://{host}:{port}/controller/rebalance",
+        match=[
+            matchers.urlencoded_params_matcher(
+                {"knownNodes": "ns_1@10.0.0.1,ns_1@10.0.0.2,ns_1@10.0.0.3"}
+            )
+        ],
+        status=200,
+    )
+
+    c = cluster.Cluster(
+        "mycluster", services=["kv"], api_host=host, api_port=port, username="foo", password="bar"
+    )
+    otp_nodes = c.add_nodes(new_nodes)
+
+    assert otp_nodes == ["ns_1@10.0.0.2", "ns_1@10.0.0.3"]
+    rebalance_calls = [call for call in responses.calls if call.request.url.endswith("/controller/rebalance")]
+    assert len(rebalance_calls) == 1
+
+
+@responses.activate
+def test_add_nodes_retries_and_fails():
+    host = "127.0.0.1"
+    port = "8091"
+
+    responses.add(
+        responses.POST,
+        f"http://{host}:{port}/controller/addNode",
+        body='["Failed to connect to 10.0.0.2"]',
+        status=400,
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+
+    with pytest.raises(cluster.AddNodeException):
+        c.add_nodes(["10.0.0.2"], retries=2, retry_interval=0)
+
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_wait_for_rebalance(monkeypatch):
+    host = "127.0.0.1"
+    port = "8091"
+
+    sleeps = []
+    monkeypatch.setattr(cluster.time, "sleep", sleeps.append)
+
+    url = f"http://{host}:{port}/pools/default/rebalanceProgress"
+    responses.add(responses.GET, url, json={"status": "running", "ns_1@a": {"progress": 0.1}, "ns_1@b": {"progress": 0.3}})
+    responses.add(responses.GET, url, json={"status": "running", "ns_1@a": {"progress": 0.5}, "ns_1@b": {"progress": 0.7}})
+    responses.add(responses.GET, url, json={"status": "none"})
+
+    statuses = []
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    c.wait_for_rebalance(interval=1, timeout=60, on_progress=statuses.append)
+
+    assert [s.node_progress for s in statuses[:2]] == [
+        {"ns_1@a": 0.1, "ns_1@b": 0.3},
+        {"ns_1@a": 0.5, "ns_1@b": 0.7},
+    ]
+    assert statuses[1].eta is not None
+    assert not statuses[-1].running
+    assert len(sleeps) == 2
+    assert all(0 < s <= 60 for s in sleeps)
+
+
+@responses.activate
+def test_wait_for_rebalance_timeout(monkeypatch):
+    host = "127.0.0.1"
+    port = "8091"
+
+    now = [0.0]
+    monkeypatch.setattr(cluster.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(cluster.time, "sleep", lambda seconds: now.__setitem__(0, now[0] + seconds))
+
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/pools/default/rebalanceProgress",
+        json={"status": "running", "ns_1@a": {"progress": 0.1}},
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    with pytest.raises(TimeoutError):
+        c.wait_for_rebalance(timeout=100)
+
+    assert now[0] == 100
+
+
+def test_rebalance_monitor_eta_and_interval():
+    monitor = rebalance.RebalanceMonitor(min_interval=1, max_interval=30)
+
+    monitor.update({"status": "running", "n": {"progress": 0.0}}, now=0)
+    status = monitor.update({"status": "running", "n": {"progress": 0.5}}, now=100)
+    assert status.eta == 100
+    assert monitor.next_interval(status) == 1.5
+
+    status = monitor.update({"status": "running", "n": {"progress": 0.98}}, now=196)
+    assert status.eta < 10
+    assert monitor.next_interval(status) == pytest.approx(1)
+
+
+@responses.activate
+def test_apply_collections_manifest_pipeline():
+    host = "127.0.0.1"
+    port = "8091"
+
+    scopes_url = f"http://{host}:{port}/pools/default/buckets/b/scopes"
+    responses.add(
+        responses.GET,
+        scopes_url,
+        json={"uid": "5", "scopes": [{"name": "s1", "uid": "8", "collections": [{"name": "c1", "uid": "9"}]}]},
+    )
+    responses.add(
+        responses.POST,
+        scopes_url,
+        match=[matchers.urlencoded_params_matcher({"name": "s2"})],
+    )
+    for scope, collection in (("s1", "c2"), ("s2", "c3")):
+        responses.add(
+            responses.POST,
+            f"{scopes_url}/{scope}/collections",
+            match=[matchers.urlencoded_params_matcher({"name": collection})],
+        )
+    responses.add(responses.GET, scopes_url, json={"uid": "a", "scopes": []})
+    responses.add(responses.POST, f"{scopes_url}/@ensureManifest/a")
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    uid = c.apply_collections_manifest(
+        "b",
+        {
+            "scopes": [
+                {"name": "s1", "collections": [{"name": "c1"}, {"name": "c2"}]},
+                {"name": "s2", "collections": [{"name": "c3"}]},
+            ]
+        },
+        use_bulk_endpoint=False,
+    )
+
+    assert uid == "a"
+    assert len(responses.calls) == 6
@@ -0,0 +1,193 @@
+import socket
+
+import pytest
+import requests
+import responses
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.exceptions import BucketCreationException
+from couchbase_cluster_admin.failover import CircuitBreaker, NodeSelector
+from couchbase_cluster_admin.mock_server import MockNsServer
+from couchbase_cluster_admin.retry import RetryPolicy
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_failover_to_healthy_node():
+    dead_port = unused_port()
+
+    with MockNsServer(buckets=["app"]) as server:
+        c = cluster.Cluster(
+            "mock",
+            services=["kv"],
+            api_host="127.0.0.1",
+            api_port=dead_port,
+            seed_nodes=[f"127.0.0.1:{server.port}"],
+            retry_policy=RetryPolicy(max_attempts=1),
+        )
+
+        for _ in range(4):
+            assert [bucket["name"] for bucket in c.poll_buckets()[0]] == ["app"]
+
+        dead = c.node_selector.nodes[f"127.0.0.1:{dead_port}"]
+        # Only tried until a healthy node was found.
+        assert dead.breaker.failures == 1
+        assert dead.error_rate > 0
+        assert server.requests_served == 4
+
+        # Node-local requests are not failed over.
+        with pytest.raises(requests.exceptions.ConnectionError):
+            c.node_info
+
+
+def test_candidates_order():
+    selector = NodeSelector(["slow:8091", "fast:8091", "new:8091", "failed:8091"])
+    selector.nodes["slow:8091"].record_success(0.2)
+    selector.nodes["fast:8091"].record_success(0.05)
+    selector.nodes["failed:8091"].record_failure()
+
+    # Unmeasured nodes come after the healthy ones, failed ones last.
+    assert [node.address for node in selector.candidates()] == ["fast:8091", "slow:8091", "new:8091", "failed:8091"]
+
+
+def test_healthy_node_kept():
+    with MockNsServer(latency=0.05) as slow, MockNsServer() as fast:
+        c = cluster.Cluster(
+            "mock",
+            services=["index"],
+            api_host="127.0.0.1",
+            api_port=slow.port,
+            seed_nodes=[f"127.0.0.1:{fast.port}"],
+        )
+
+        for _ in range(5):
+            c.poll_index_status()
+
+        assert c.node_selector.candidates()[0].address == f"127.0.0.1:{slow.port}"
+        assert slow.requests_served == 5
+        assert fast.requests_served == 0
+
+
+def failover_cluster():
+    return cluster.Cluster(
+        "mock",
+        services=["kv"],
+        api_host="10.0.0.1",
+        api_port="8091",
+        seed_nodes=["10.0.0.2:8091"],
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+
+
+@responses.activate
+def test_mutations_not_failed_over():
+    restore = "/_p/backup/api/v1/cluster/self/repository/active/repo/restore"
+    responses.add(responses.POST, f"http://10.0.0.1:8091{restore}", body=requests.exceptions.ReadTimeout())
+    responses.add(responses.POST, "http://10.0.0.1:8091/pools/default/buckets", status=503)
+
+    c = failover_cluster()
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        c.restore_backup("active", "repo", {"target": "127.0.0.1:8091"})
+    c = failover_cluster()
+    with pytest.raises(BucketCreationException):
+        c.create_bucket({"name": "app"})
+
+    # Nothing was sent to the second node.
+    assert [call.request.url for call in responses.calls] == [
+        f"http://10.0.0.1:8091{restore}",
+        "http://10.0.0.1:8091/pools/default/buckets",
+    ]
+
+
+@responses.activate
+def test_failover_honours_idempotent():
+    responses.add(responses.GET, "http://10.0.0.1:8091/pools/default/buckets", status=503)
+    responses.add(responses.GET, "http://10.0.0.2:8091/pools/default/buckets", json=[])
+    responses.add(responses.POST, "http://10.0.0.1:8091/_p/query/query/service", status=503)
+    responses.add(responses.POST, "http://10.0.0.2:8091/_p/query/query/service", json={"status": "success"})
+
+    c = failover_cluster()
+    assert c.http_request(f"{c.baseurl}/pools/default/buckets").status_code == 200
+    c = failover_cluster()
+    resp = c.http_request(f"{c.baseurl}/_p/query/query/service", method="POST", idempotent=True)
+    assert resp.status_code == 200
+
+    assert [call.request.url.split("/")[2] for call in responses.calls] == ["10.0.0.1:8091", "10.0.0.2:8091"] * 2
+
+
+@responses.activate
+def test_failover_before_retrying(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("couchbase_cluster_admin.cluster.time.sleep", sleeps.append)
+    c = cluster.Cluster(
+        "mock",
+        services=["kv"],
+        api_host="10.0.0.1",
+        api_port="8091",
+        seed_nodes=["10.0.0.2:8091"],
+    )
+    responses.add(responses.GET, "http://10.0.0.1:8091/indexStatus", body=requests.exceptions.ReadTimeout())
+    responses.add(responses.GET, "http://10.0.0.2:8091/indexStatus", status=503)
+    responses.add(responses.GET, "http://10.0.0.2:8091/indexStatus", json={"indexes": []})
+
+    assert c.get_index_status() == {"indexes": []}
+
+    # One attempt per node and round, with a backoff between rounds only.
+    hosts = [call.request.url.split("/")[2] for call in responses.calls]
+    assert hosts == ["10.0.0.1:8091", "10.0.0.2:8091", "10.0.0.1:8091", "10.0.0.2:8091"]
+    assert len(sleeps) == 1
+    assert c.node_selector.nodes["10.0.0.1:8091"].breaker.failures == 2
+
+
+def test_nodes_learned_from_pool():
+    with MockNsServer(nodes=3) as server:
+        c = cluster.Cluster(
+            "mock",
+            services=["kv"],
+            api_host="127.0.0.1",
+            api_port=server.port,
+            seed_nodes=["10.0.0.9"],
+        )
+        c.pool_info
+
+    assert list(c.node_selector.nodes) == [
+        f"127.0.0.1:{server.port}",
+        f"10.0.0.9:{server.port}",
+        "node1.mock:8091",
+        "node2.mock:8091",
+        "node3.mock:8091",
+    ]
+
+
+def test_circuit_breaker_half_open(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("couchbase_cluster_admin.failover.time.monotonic", lambda: now[0])
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 20.0
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_selector_keeps_seed_nodes():
+    selector = NodeSelector(["a:8091", "b:8091"])
+    selector.nodes["a:8091"].record_success(0.1)
+    selector.update(["c:8091"])
+
+    assert list(selector.nodes) == ["a:8091", "b:8091", "c:8091"]
+    assert selector.nodes["a:8091"].latency == 0.1
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+import responses
+from responses import matchers
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.fleet import ClusterFleet
+
+
+@responses.activate
+def test_run_on_all_nodes():
+    hosts = ["127.0.0.1", "127.0.0.2", "127.0.0.3"]
+
+    for host in hosts:
+        responses.add(
+            responses.POST,
+            f"http://{host}:8091/node/controller/rename",
+            match=[matchers.urlencoded_params_matcher({"hostname": f"node-{host}"})],
+            status=200,
+        )
+
+    fleet = ClusterFleet.from_hosts(hosts, cluster_name="mycluster", services=["kv"])
+    result = fleet.run(
+        "rename_node",
+        per_node_kwargs={host: {"new_hostname": f"node-{host}"} for host in hosts},
+    )
+
+    assert result.ok
+    assert set(result.results) == set(hosts)
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_collect_all_errors():
+    hosts = ["127.0.0.1", "127.0.0.2"]
+
+    responses.add(responses.POST, "http://127.0.0.1:8091/settings/web", status=200)
+    responses.add(responses.POST, "http://127.0.0.2:8091/settings/web", body="nope", status=400)
+
+    fleet = ClusterFleet.from_hosts(hosts, cluster_name="mycluster", services=["kv"])
+    result = fleet.run("set_authentication", "foo", "bar")
+
+    assert list(result.results) == ["127.0.0.1"]
+    assert isinstance(result.errors["127.0.0.2"], cluster.SetAuthenticationException)
+    with pytest.raises(cluster.FleetOperationException):
+        result.raise_for_errors()
+
+
+@responses.activate
+def test_fail_fast():
+    responses.add(responses.POST, "http://127.0.0.1:8091/settings/web", body="nope", status=400)
+
+    fleet = ClusterFleet.from_hosts(["127.0.0.1"], cluster_name="mycluster", services=["kv"])
+
+    with pytest.raises(cluster.FleetOperationException) as excinfo:
+        fleet.run("set_authentication", "foo", "bar", fail_fast=True)
+
+    assert "127.0.0.1" in excinfo.value.errors
+
+
+def test_fail_fast_raises_first_failure_with_partial_result():
+    ok_done = threading.Event()
+
+    def operation(node):
+        if node == "slow":
+            time.sleep(0.2)
+            raise ValueError("slow failure")
+        if node == "fast":
+            ok_done.wait(1)
+            raise ValueError("fast failure")
+        ok_done.set()
+        return node
+
+    fleet = ClusterFleet({"slow": "slow", "fast": "fast", "ok": "ok"}, max_workers=3)
+
+    with pytest.raises(cluster.FleetOperationException) as excinfo:
+        fleet.run(operation, fail_fast=True)
+
+    assert "fast failure" in str(excinfo.value)
+    assert excinfo.value.result.results == {"ok": "ok"}
+    assert set(excinfo.value.result.errors) == {"slow", "fast"}
@@ -0,0 +1,129 @@
+import json
+
+import responses
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.indexes import IndexBuilder, IndexCatalog
+
+HOST = "127.0.0.1"
+PORT = "8091"
+BASEURL = f"http://{HOST}:{PORT}"
+
+
+def index(name, status, host, collection="c1", progress=0):
+    return {
+        "bucket": "b",
+        "scope": "s",
+        "collection": collection,
+        "indexName": name,
+        "status": status,
+        "hosts": [host],
+        "progress": progress,
+    }
+
+
+@responses.activate
+def test_build_respects_per_node_limit(monkeypatch):
+    monkeypatch.setattr("couchbase_cluster_admin.indexes.time.sleep", lambda seconds: None)
+
+    states = [
+        [index("i1", "Created", "n1"), index("i2", "Created", "n1"), index("i3", "Created", "n2", "c2")],
+        [index("i1", "Building", "n1", progress=50), index("i2", "Created", "n1"), index("i3", "Ready", "n2", "c2", 100)],
+        [index("i1", "Ready", "n1", progress=100), index("i2", "Created", "n1"), index("i3", "Ready", "n2", "c2", 100)],
+        [index("i1", "Ready", "n1", progress=100), index("i2", "Ready", "n1", progress=100), index("i3", "Ready", "n2", "c2", 100)],
+    ]
+    for version, indexes in enumerate(states):
+        responses.add(responses.GET, f"{BASEURL}/indexStatus", json={"indexes": indexes, "version": version})
+    responses.add(responses.POST, f"{BASEURL}/_p/query/query/service", json={"status": "success"})
+
+    c = cluster.Cluster("mycluster", services=["index"], api_host=HOST, api_port=PORT)
+    progress = IndexBuilder(c, max_builds_per_node=1, poll_interval=0).build()
+
+    statements = [
+        json.loads(call.request.body)["statement"]
+        for call in responses.calls
+        if call.request.method == "POST"
+    ]
+    assert statements == [
+        "BUILD INDEX ON `b`.`s`.`c1`(`i1`)",
+        "BUILD INDEX ON `b`.`s`.`c2`(`i3`)",
+        "BUILD INDEX ON `b`.`s`.`c1`(`i2`)",
+    ]
+    assert set(progress.values()) == {100}
+
+
+@responses.activate
+def test_build_counts_issued_indexes(monkeypatch):
+    monkeypatch.setattr("couchbase_cluster_admin.indexes.time.sleep", lambda seconds: None)
+
+    states = [
+        [index("i1", "Created", "n1"), index("i2", "Created", "n1")],
+        # The build of i1 was issued but has not started yet.
+        [index("i1", "Created", "n1"), index("i2", "Created", "n1")],
+        [index("i1", "Ready", "n1", progress=100), index("i2", "Created", "n1")],
+        [index("i1", "Ready", "n1", progress=100), index("i2", "Ready", "n1", progress=100)],
+    ]
+    for indexes in states:
+        responses.add(responses.GET, f"{BASEURL}/indexStatus", json={"indexes": indexes, "version": 1})
+    responses.add(responses.POST, f"{BASEURL}/_p/query/query/service", json={"status": "success"})
+
+    c = cluster.Cluster("mycluster", services=["index"], api_host=HOST, api_port=PORT)
+    IndexBuilder(c, max_builds_per_node=1, poll_interval=0).build()
+
+    # i2 is only built once i1 is ready, after the third poll.
+    methods = [call.request.method for call in responses.calls]
+    assert methods == ["GET", "POST", "GET", "GET", "POST", "GET"]
+
+
+def test_catalog_lookups():
+    replica = dict(index("i1", "Building", "n2", progress=40), replicaId=1)
+    catalog = IndexCatalog(
+        {
+            "indexes": [index("i1", "Ready", "n1", progress=100), replica, index("i2", "Created", "n1")],
+            "version": 7,
+        }
+    )
+
+    assert len(catalog) == 2
+    assert catalog.version == 7
+    assert [record.hosts for record in catalog.get("b", "s", "c1", "i1")] == [("n1",), ("n2",)]
+    assert catalog.get("b", "s", "c1", "missing") == ()
+    assert [record.name for record in catalog.by_host("n1")] == ["i1", "i2"]
+    assert [(record.name, record.replica_id) for record in catalog.by_status("Building")] == [("i1", 1)]
+    assert ("b", "s", "c1", "i2") in catalog
+
+
+@responses.activate
+def test_catalog_refresh_only_when_changed():
+    url = f"{BASEURL}/indexStatus"
+    responses.add(responses.GET, url, json={"indexes": [index("i1", "Created", "n1")], "version": 1})
+    responses.add(responses.GET, url, json={"indexes": [index("i1", "Created", "n1")], "version": 1})
+    responses.add(responses.GET, url, json={"indexes": [index("i1", "Ready", "n1")], "version": 2})
+
+    c = cluster.Cluster("mycluster", services=["index"], api_host=HOST, api_port=PORT)
+    catalog = IndexCatalog()
+
+    assert catalog.refresh(c)
+    records = catalog.by_status("Created")
+    assert not catalog.refresh(c)
+    assert catalog.by_status("Created") is records
+    assert catalog.refresh(c)
+    assert catalog.by_status("Created") == ()
+    assert catalog.version == 2
+
+
+@responses.activate
+def test_catalog_refresh_after_other_poll():
+    url = f"{BASEURL}/indexStatus"
+    responses.add(responses.GET, url, json={"indexes": [index("i1", "Building", "n1", progress=10)], "version": 1})
+    responses.add(responses.GET, url, json={"indexes": [index("i1", "Building", "n1", progress=50)], "version": 1})
+
+    c = cluster.Cluster("mycluster", services=["index"], api_host=HOST, api_port=PORT)
+    catalog = IndexCatalog()
+    assert catalog.refresh(c)
+
+    # Another consumer sees the progress change first.
+    assert c.poll_index_status()[1]
+
+    assert catalog.refresh(c)
+    assert catalog.by_status("Building")[0].progress == 50
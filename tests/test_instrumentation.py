@@ -0,0 +1,117 @@
+import pytest
+import responses
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.instrumentation import (
+    LatencyHistogram,
+    RequestMetrics,
+    _prometheus_histogram,
+    endpoint_template,
+)
+from couchbase_cluster_admin.mock_server import MockNsServer
+
+HOST = "127.0.0.1"
+PORT = "8091"
+BASEURL = f"http://{HOST}:{PORT}"
+
+
+@pytest.mark.parametrize(
+    "url,template",
+    [
+        (f"{BASEURL}/pools/default", "/pools/default"),
+        (f"{BASEURL}/pools/default/buckets", "/pools/default/buckets"),
+        (f"{BASEURL}/pools/default/buckets/app/scopes", "/pools/default/buckets/{bucket}/scopes"),
+        (
+            f"{BASEURL}/pools/default/buckets/app/scopes?validOnUid=1a",
+            "/pools/default/buckets/{bucket}/scopes",
+        ),
+        (
+            f"{BASEURL}/pools/default/buckets/app/scopes/s/collections",
+            "/pools/default/buckets/{bucket}/scopes/{scope}/collections",
+        ),
+        (
+            f"{BASEURL}/_p/backup/api/v1/cluster/self/repository/active/repo/taskHistory?limit=1",
+            "/_p/backup/api/v1/cluster/self/repository/{status}/{repository}/taskHistory",
+        ),
+        (
+            f"{BASEURL}/_p/backup/api/v1/cluster/self/repository/import",
+            "/_p/backup/api/v1/cluster/self/repository/import",
+        ),
+        (f"{BASEURL}/pools/default/stats/range/", "/pools/default/stats/range"),
+    ],
+)
+def test_endpoint_template(url, template):
+    assert endpoint_template(url) == template
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram(min_value=0.001, max_value=10, buckets_per_doubling=4)
+    for value in [0.001] * 90 + [0.5] * 9 + [20]:
+        histogram.record(value)
+
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.001)
+    # Within one bucket, i.e. 2 ** (1 / 4) of the value.
+    assert 0.5 <= histogram.percentile(99) < 0.5 * 2 ** 0.25
+    assert histogram.percentile(100) == 20
+
+
+def test_histogram_overflow_only_in_inf():
+    histogram = LatencyHistogram(min_value=1, max_value=4, buckets_per_doubling=1)
+    for value in [1, 3, 100]:
+        histogram.record(value)
+
+    assert _prometheus_histogram("latency", {}, histogram) == [
+        'latency_bucket{le="1.0"} 1',
+        'latency_bucket{le="2.0"} 1',
+        'latency_bucket{le="4.0"} 2',
+        'latency_bucket{le="+Inf"} 3',
+        "latency_sum 104.0",
+        "latency_count 3",
+    ]
+
+
+@responses.activate
+def test_observer_events_with_retries(monkeypatch):
+    monkeypatch.setattr("couchbase_cluster_admin.client.time.sleep", lambda seconds: None)
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets/app/scopes", status=503)
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets/app/scopes", json={"uid": "1", "scopes": []})
+
+    events = []
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    c.add_observer(events.append)
+    c.get_scopes("app")
+
+    assert len(events) == 1
+    event = events[0]
+    assert (event.method, event.endpoint, event.status, event.retries) == (
+        "GET",
+        "/pools/default/buckets/{bucket}/scopes",
+        200,
+        1,
+    )
+    assert event.response_bytes == len(b'{"uid": "1", "scopes": []}')
+
+
+def test_request_metrics():
+    metrics = RequestMetrics()
+
+    with MockNsServer(nodes=2, buckets=["app"]) as server:
+        c = cluster.Cluster("mock", services=["kv"], **server.cluster_kwargs())
+        c.add_observer(metrics)
+        c.node_info
+        c.get_scopes("app")
+        c.create_bucket({"name": "other", "ramQuota": 100})
+
+    assert metrics.connect.count == 1
+    assert metrics.ttfb.count == 3
+    assert metrics.request_bytes[("POST", "/pools/default/buckets")] == len("name=other&ramQuota=100")
+
+    text = metrics.to_prometheus()
+    assert (
+        'couchbase_admin_http_requests_total{method="GET",endpoint="/pools/default/buckets/{bucket}/scopes",'
+        'status="200"} 1'
+    ) in text
+    assert 'couchbase_admin_http_requests_total{method="POST",endpoint="/pools/default/buckets",status="202"} 1' in text
+    assert 'couchbase_admin_http_request_duration_seconds_count{method="GET",endpoint="/nodes/self"} 1' in text
+    assert "couchbase_admin_http_connect_duration_seconds_count 1" in text
@@ -0,0 +1,83 @@
+import pytest
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.backup import BackupJobRunner
+from couchbase_cluster_admin.indexes import IndexCatalog
+from couchbase_cluster_admin.mock_server import MockNsServer
+
+
+@pytest.fixture
+def server():
+    with MockNsServer(nodes=3, buckets=["app"], rebalance_duration=0.2, backup_task_duration=0.2) as server:
+        yield server
+
+
+def test_pool_and_node(server):
+    c = cluster.Cluster("mock", services=["kv"], **server.cluster_kwargs())
+
+    assert len(c.known_nodes) == 3
+    assert c.node_info["otpNode"] == "ns_1@node1.mock"
+
+    c.set_cluster_name("renamed")
+    assert c.pool_info["clusterName"] == "renamed"
+
+    # The pool has not changed, so the server answers 304.
+    _, changed = c.poll_pool_info()
+    assert not changed
+
+
+def test_add_nodes_and_rebalance(server):
+    c = cluster.Cluster("mock", services=["kv"], **server.cluster_kwargs())
+    c.add_node("node4.mock", "Administrator", "password", ["index"])
+    c.rebalance()
+
+    assert not c.rebalance_is_done()
+    status = c.wait_for_rebalance(interval=0.05, timeout=5)
+
+    assert not status.running
+    assert len(c.known_nodes) == 4
+
+
+def test_buckets_and_collections(server):
+    c = cluster.Cluster("mock", services=["kv"], **server.cluster_kwargs())
+    c.create_bucket({"name": "other", "ramQuota": 256})
+    c.wait_for_bucket_ready("other", timeout=5)
+    c.apply_collections_manifest("other", {"scopes": [{"name": "s", "collections": [{"name": "c"}]}]})
+
+    assert {bucket["name"] for bucket in c.buckets} == {"app", "other"}
+    scopes = {scope["name"]: scope for scope in c.get_scopes("other")["scopes"]}
+    assert [collection["name"] for collection in scopes["s"]["collections"]] == ["c"]
+
+    catalog = IndexCatalog()
+    catalog.refresh(c)
+    assert len(catalog) == 8
+    assert len(catalog.by_host("node1.mock:8091")) == 3
+
+
+def test_statistics(server):
+    c = cluster.Cluster("mock", services=["kv"], **server.cluster_kwargs())
+    result = c.get_statistics([{"metric": [{"label": "name", "value": "kv_ops"}], "step": 10, "start": -60}])
+
+    assert len(result.by_name("kv_ops")) == 3
+    assert all(len(series) >= 6 for series in result.values())
+
+
+def test_backup_restore(server):
+    c = cluster.Cluster("mock", services=["backup"], **server.cluster_kwargs())
+    c.create_backup_repository("repo", {"plan": "_hourly_backups", "archive": "/backups"})
+
+    with BackupJobRunner(c, poll_interval=0.05) as runner:
+        job = runner.restore("repo", {"include_data": "app"})
+
+    assert job.result()["status"] == "done"
+    assert job.items_received == 1000
+    assert [task["task_name"] for task in c.iter_backup_task_history("active", "repo")] == [job.task_name]
+
+
+def test_latency(server):
+    server.latency = 0.05
+    c = cluster.Cluster("mock", services=["kv"], **server.cluster_kwargs())
+
+    c.node_info
+    assert c.connection_stats["new_connections"] == 1
+    assert server.requests_served == 1
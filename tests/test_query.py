@@ -0,0 +1,114 @@
+import json
+
+import pytest
+import responses
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.query import PreparedStatementCache, QueryStream
+
+HOST = "127.0.0.1"
+PORT = "8091"
+QUERY_URL = f"http://{HOST}:{PORT}/_p/query/query/service"
+
+RESPONSE = {
+    "requestID": "abc",
+    "signature": {"*": "*"},
+    "results": [{"id": i, "name": f"index-é-{i}", "n": 1.5e3} for i in range(100)] + [12345, "x", None],
+    "status": "success",
+    "metrics": {"resultCount": 103},
+}
+
+
+class ChunkedResponse:
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_query_stream_parses_incrementally(chunk_size):
+    response = ChunkedResponse(json.dumps(RESPONSE, indent=1).encode("utf-8"), chunk_size)
+    stream = QueryStream(response)
+
+    rows = list(stream)
+
+    assert rows == RESPONSE["results"]
+    assert stream.request_id == "abc"
+    assert stream.status == "success"
+    assert stream.metrics == {"resultCount": 103}
+    assert response.closed
+
+
+def test_query_stream_numbers_across_chunks():
+    body = b'{"results": [45000000000.0, -1.5e-7, 2E+10, 0, {"a": 12.25}], "status": "success"}'
+    stream = QueryStream(ChunkedResponse(body, 1))
+
+    assert list(stream) == json.loads(body)["results"]
+    assert stream.status == "success"
+
+
+def test_query_stream_truncated():
+    response = ChunkedResponse(b'{"results": [{"a": 1}, {"a"', 4)
+
+    with pytest.raises(ValueError):
+        list(QueryStream(response))
+
+
+@responses.activate
+def test_query_stream():
+    responses.add(responses.POST, QUERY_URL, body=json.dumps(RESPONSE))
+
+    c = cluster.Cluster("mycluster", services=["n1ql"], api_host=HOST, api_port=PORT)
+    stream = c.query_stream({"statement": "SELECT 1"})
+
+    assert len(list(stream)) == 103
+    assert stream.errors == []
+
+
+@responses.activate
+def test_query_prepared_reprepares():
+    statement = "SELECT * FROM system:indexes WHERE name = $name"
+
+    responses.add(
+        responses.POST,
+        QUERY_URL,
+        match=[responses.matchers.json_params_matcher({"statement": f"PREPARE {statement}"})],
+        json={"results": [{"name": "p1"}], "status": "success"},
+    )
+    execute = responses.matchers.json_params_matcher({"prepared": "p1", "$name": "idx"})
+    responses.add(responses.POST, QUERY_URL, match=[execute], json={"results": [1], "status": "success"})
+    responses.add(
+        responses.POST,
+        QUERY_URL,
+        match=[execute],
+        status=404,
+        json={"errors": [{"code": 4040, "msg": "No such prepared statement: p1"}], "status": "fatal"},
+    )
+    responses.add(responses.POST, QUERY_URL, match=[execute], json={"results": [2], "status": "success"})
+
+    c = cluster.Cluster("mycluster", services=["n1ql"], api_host=HOST, api_port=PORT)
+
+    assert c.query_prepared(statement, named_args={"name": "idx"})["results"] == [1]
+    assert c.query_prepared(statement, named_args={"name": "idx"})["results"] == [2]
+    statements = [json.loads(call.request.body).get("statement") for call in responses.calls]
+    assert statements == [f"PREPARE {statement}", None, None, f"PREPARE {statement}", None]
+
+
+def test_prepared_statement_cache_lru():
+    cache = PreparedStatementCache(size=2)
+    cache.put("a", "pa")
+    cache.put("b", "pb")
+    cache.get("a")
+    cache.put("c", "pc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "pa"
+    assert len(cache) == 2
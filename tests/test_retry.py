@@ -0,0 +1,116 @@
+import pytest
+import requests
+import responses
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.retry import RetryBudget, RetryPolicy
+
+HOST = "127.0.0.1"
+PORT = "8091"
+BASEURL = f"http://{HOST}:{PORT}"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("couchbase_cluster_admin.client.time.monotonic", lambda: sum(sleeps))
+    monkeypatch.setattr("couchbase_cluster_admin.client.time.sleep", sleeps.append)
+    return sleeps
+
+
+@responses.activate
+def test_get_retried_on_busy(sleeps):
+    responses.add(responses.GET, f"{BASEURL}/nodes/self", status=503)
+    responses.add(responses.GET, f"{BASEURL}/nodes/self", json={"otpNode": "ns_1@a"})
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+
+    assert c.node_name == "ns_1@a"
+    assert len(sleeps) == 1
+    assert 0 <= sleeps[0] <= 0.5
+
+
+@responses.activate
+def test_post_not_retried(sleeps):
+    responses.add(responses.POST, f"{BASEURL}/controller/rebalance", body=requests.exceptions.ReadTimeout())
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        c.rebalance(known_nodes=["ns_1@a"])
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_join_retried_then_raises(sleeps):
+    responses.add(
+        responses.POST,
+        f"{BASEURL}/node/controller/doJoinCluster",
+        body=requests.exceptions.ReadTimeout(),
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        c.join_cluster("10.0.0.1")
+    assert len(responses.calls) == 3
+    assert len(sleeps) == 2
+
+
+@responses.activate
+def test_retry_budget_and_deadline(sleeps):
+    responses.add(responses.GET, f"{BASEURL}/nodes/self", status=503)
+
+    c = cluster.Cluster(
+        "mycluster",
+        services=["kv"],
+        api_host=HOST,
+        api_port=PORT,
+        retry_policy=RetryPolicy(max_attempts=10, jitter=False),
+        retry_budget=RetryBudget(max_tokens=2, ratio=0),
+    )
+
+    assert c.http_request(f"{BASEURL}/nodes/self").status_code == 503
+    assert sleeps == [0.5, 1.0]
+
+    c.retry_policy = RetryPolicy(max_attempts=10, jitter=False, deadline=2)
+    c.retry_budget = RetryBudget()
+    del sleeps[:]
+    c.http_request(f"{BASEURL}/nodes/self")
+    assert sleeps == [0.5, 1.0]
+
+
+def test_attempt_timeout_capped_by_deadline():
+    policy = RetryPolicy(deadline=10)
+
+    assert policy.attempt_timeout(58.0, 0) == 10
+    assert policy.attempt_timeout(58.0, 7.5) == 2.5
+    assert policy.attempt_timeout(1.0, 7.5) == 1.0
+    assert policy.attempt_timeout((3.05, 58.0), 4) == (3.05, 6)
+    assert policy.attempt_timeout(None, 4) == 6
+    assert RetryPolicy().attempt_timeout(58.0, 100) == 58.0
+
+
+@responses.activate
+def test_request_timeout_capped_by_deadline():
+    responses.add(responses.GET, f"{BASEURL}/nodes/self", json={})
+
+    c = cluster.Cluster(
+        "mycluster",
+        services=["kv"],
+        api_host=HOST,
+        api_port=PORT,
+        retry_policy=RetryPolicy(deadline=5),
+    )
+    c.http_request(f"{BASEURL}/nodes/self")
+
+    assert 0 < responses.calls[0].request.req_kwargs["timeout"] <= 5
+
+
+def test_retry_after_header():
+    response = requests.Response()
+    response.status_code = 503
+    response.headers["Retry-After"] = "7"
+
+    assert RetryPolicy().delay(1, response) == 7.0
+    assert RetryPolicy(jitter=False, max_backoff=3).delay(5) == 3
@@ -0,0 +1,141 @@
+import pytest
+import responses
+from responses import matchers
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.spec import ClusterSpec, plan, reconcile
+
+HOST = "127.0.0.1"
+PORT = "8091"
+BASEURL = f"http://{HOST}:{PORT}"
+
+SPEC = ClusterSpec(
+    services=["kv", "index"],
+    memory_quotas={"kv": 1024, "index": 512},
+    buckets={"app": {"ramQuota": 256}},
+    scopes={"app": {"tenant": ["users", {"name": "orders", "maxTTL": 60}]}},
+    users={"appuser": {"password": "secret", "roles": ["bucket_full_access[app]"]}},
+    gsi_settings={"storageMode": "plasma"},
+    autofailover={"enabled": "true", "timeout": 120},
+)
+
+
+def add_state_responses(converged: bool):
+    responses.add(responses.GET, f"{BASEURL}/nodes/self", json={"services": ["index", "kv"]})
+    responses.add(
+        responses.GET,
+        f"{BASEURL}/pools/default",
+        json={"memoryQuota": 1024, "indexMemoryQuota": 512 if converged else 256},
+    )
+    responses.add(responses.GET, f"{BASEURL}/settings/indexes", json={"storageMode": "plasma"})
+    responses.add(responses.GET, f"{BASEURL}/settings/autoFailover", json={"enabled": True, "timeout": 120})
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets", json=[{"name": "app"}])
+    collections = [{"name": "users"}, {"name": "orders"}] if converged else [{"name": "users"}]
+    responses.add(
+        responses.GET,
+        f"{BASEURL}/pools/default/buckets/app/scopes",
+        json={"uid": "1", "scopes": [{"name": "_default", "collections": []}, {"name": "tenant", "collections": collections}]},
+    )
+    responses.add(responses.GET, f"{BASEURL}/settings/rbac/users", json=[{"id": "appuser"}])
+
+
+@responses.activate
+def test_converged_cluster_costs_only_gets():
+    add_state_responses(converged=True)
+
+    c = cluster.Cluster("mycluster", services=["kv", "index"], api_host=HOST, api_port=PORT)
+    actions = reconcile(c, SPEC)
+
+    assert actions == []
+    assert all(call.request.method == "GET" for call in responses.calls)
+    assert len(responses.calls) == 7
+
+
+@responses.activate
+def test_reconcile_applies_minimal_diff():
+    add_state_responses(converged=False)
+    responses.add(
+        responses.POST,
+        f"{BASEURL}/pools/default",
+        match=[matchers.urlencoded_params_matcher({"indexMemoryQuota": "512"})],
+    )
+    responses.add(
+        responses.PUT,
+        f"{BASEURL}/pools/default/buckets/app/scopes",
+        match=[
+            matchers.query_param_matcher({"validOnUid": "1"}),
+            matchers.json_params_matcher(
+                {
+                    "scopes": [
+                        {"name": "_default", "collections": []},
+                        {"name": "tenant", "collections": [{"name": "users"}, {"name": "orders", "maxTTL": 60}]},
+                    ]
+                }
+            ),
+        ],
+        json={"uid": "2"},
+    )
+    responses.add(responses.POST, f"{BASEURL}/pools/default/buckets/app/scopes/@ensureManifest/2")
+
+    c = cluster.Cluster("mycluster", services=["kv", "index"], api_host=HOST, api_port=PORT)
+    assert len(plan(c, SPEC)) == 2
+
+    responses.calls.reset()
+    actions = reconcile(c, SPEC)
+
+    assert [action.description for action in actions] == [
+        "set memory quotas {'indexMemoryQuota': 512}",
+        "create scopes and collections in app",
+    ]
+    mutations = [call.request.method for call in responses.calls if call.request.method != "GET"]
+    assert mutations == ["POST", "PUT", "POST"]
+
+
+@responses.activate
+def test_reconcile_waits_for_new_buckets(monkeypatch):
+    monkeypatch.setattr("couchbase_cluster_admin.cluster.time.sleep", lambda seconds: None)
+    spec = ClusterSpec(services=["kv", "index"], buckets={"new": {"ramQuota": 256}}, scopes={"new": {"s": ["c"]}})
+
+    responses.add(responses.GET, f"{BASEURL}/nodes/self", json={"services": ["kv"]})
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets", json=[])
+    responses.add(
+        responses.POST,
+        f"{BASEURL}/node/controller/setupServices",
+        match=[matchers.urlencoded_params_matcher({"services": "kv,index"})],
+    )
+    responses.add(responses.POST, f"{BASEURL}/pools/default/buckets", status=202)
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets/new", status=404)
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets/new", json={"nodes": [{"status": "warmup"}]})
+    responses.add(responses.GET, f"{BASEURL}/pools/default/buckets/new", json={"nodes": [{"status": "healthy"}]})
+    responses.add(
+        responses.GET,
+        f"{BASEURL}/pools/default/buckets/new/scopes",
+        json={"uid": "0", "scopes": [{"name": "_default", "collections": []}]},
+    )
+    responses.add(responses.PUT, f"{BASEURL}/pools/default/buckets/new/scopes", json={"uid": "1"})
+    responses.add(responses.POST, f"{BASEURL}/pools/default/buckets/new/scopes/@ensureManifest/1")
+
+    # The cluster object was set up with other services than the spec.
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    actions = reconcile(c, spec)
+
+    assert [action.description for action in actions] == [
+        "enable services ['kv', 'index']",
+        "create bucket new",
+        "wait for bucket new",
+        "create scopes and collections in new",
+    ]
+    bucket_calls = [call.request.url for call in responses.calls if call.request.url.endswith("/buckets/new")]
+    assert len(bucket_calls) == 3
+
+
+@responses.activate
+def test_memory_quotas_without_or_sharing_a_key():
+    responses.add(responses.GET, f"{BASEURL}/pools/default", json={"memoryQuota": 1024})
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    actions = plan(c, ClusterSpec(memory_quotas={"kv": 1024, "cbbs": 256}))
+    assert actions == []
+
+    with pytest.raises(ValueError):
+        plan(c, ClusterSpec(memory_quotas={"index": 512, "n1ql": 256}))
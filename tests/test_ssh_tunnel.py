@@ -0,0 +1,147 @@
+import os
+import socket
+
+import pytest
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.mock_server import MockNsServer
+from couchbase_cluster_admin.ssh_tunnel import SshConnection, SshTunnelManager, _parse_jump_host, load_ssh_config
+
+
+class FakeSshConnection:
+    """
+    Stands in for an SSH transport, opening plain TCP connections.
+    """
+
+    instances = []
+
+    def __init__(self, ssh_host, ssh_username, ssh_port=22):
+        self.ssh_host = ssh_host
+        self.ssh_username = ssh_username
+        self.ssh_port = ssh_port
+        self.connected = False
+        self.closed = False
+        self.instances.append(self)
+
+    def connect(self):
+        self.connected = True
+
+    @property
+    def active(self):
+        return self.connected and not self.closed
+
+    def open_channel(self, remote_address, origin_address):
+        return socket.create_connection(remote_address)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def manager():
+    FakeSshConnection.instances = []
+    with SshTunnelManager(idle_timeout=0, connection_class=FakeSshConnection) as manager:
+        yield manager
+
+
+def test_clusters_share_connection(manager):
+    with MockNsServer(nodes=2) as server:
+        clusters = [
+            cluster.Cluster(
+                "mock",
+                services=["kv"],
+                api_host="127.0.0.1",
+                api_port=server.port,
+                connect_through_ssh=True,
+                ssh_username="admin",
+                ssh_host="bastion",
+                ssh_tunnel_manager=manager,
+            )
+            for _ in range(3)
+        ]
+
+        assert [len(c.known_nodes) for c in clusters] == [2, 2, 2]
+        assert manager.connections_opened == 1
+        assert len({c.api_port for c in clusters}) == 1
+        assert clusters[0].api_port != server.port
+
+        for c in clusters:
+            c.close()
+
+    assert FakeSshConnection.instances[0].closed
+
+
+def test_lease_refcount(manager):
+    first = manager.lease("node1", "admin", 8091)
+    second = manager.lease("node1", "admin", 8091)
+    other = manager.lease("node1", "admin", 8092)
+
+    assert first.local_port == second.local_port != other.local_port
+    first.connect()
+    other.connect()
+
+    first.release()
+    first.release()
+    other.release()
+    assert not FakeSshConnection.instances[0].closed
+
+    second.release()
+    assert FakeSshConnection.instances[0].closed
+    assert manager.connections_opened == 1
+
+    with manager.lease("node1", "admin", 8091) as lease:
+        lease.connect()
+        assert manager.connections_opened == 2
+
+
+def test_tunnel_opened_lazily_and_reopened(manager):
+    with MockNsServer() as server:
+        c = cluster.Cluster(
+            "mock",
+            services=["kv"],
+            api_host="127.0.0.1",
+            api_port=server.port,
+            connect_through_ssh=True,
+            ssh_username="admin",
+            ssh_tunnel_manager=manager,
+        )
+
+        assert manager.connections_opened == 0
+        assert c.tunnel_setup_latency is None
+
+        c.node_info
+        assert manager.connections_opened == 1
+        assert c.tunnel_setup_latency is not None
+
+        # The transport dies, e.g. the bastion dropped the connection.
+        FakeSshConnection.instances[0].connected = False
+        c.pool_info
+        assert manager.connections_opened == 2
+        assert c.ssh_tunnel.forward.connection.reconnects == 1
+        assert len(FakeSshConnection.instances) == 1
+        c.close()
+
+
+def test_ssh_config_lookup(tmp_path):
+    config_path = tmp_path / "config"
+    config_path.write_text(
+        "Host bastion\n"
+        "    HostName bastion.example.com\n"
+        "    Port 2222\n"
+        "    User ops\n"
+        "    IdentityFile ~/.ssh/bastion_key\n"
+        "    ProxyJump jump@gateway:2200\n"
+    )
+    config = load_ssh_config(str(config_path))
+
+    connection = SshConnection("bastion", ssh_config=config)
+    assert (connection.hostname, connection.ssh_port, connection.ssh_username) == ("bastion.example.com", 2222, "ops")
+    assert connection.identity_files == [os.path.expanduser("~/.ssh/bastion_key")]
+    assert connection.proxy_jump == "jump@gateway:2200"
+
+    # Explicit arguments take precedence.
+    connection = SshConnection("bastion", "admin", 22, ssh_config=config)
+    assert (connection.ssh_port, connection.ssh_username) == (22, "admin")
+
+    assert _parse_jump_host("jump@gateway:2200") == ("jump", "gateway", "2200")
+    assert _parse_jump_host("gateway") == (None, "gateway", None)
@@ -0,0 +1,176 @@
+import math
+
+import responses
+from responses import matchers
+
+from couchbase_cluster_admin import cluster
+from couchbase_cluster_admin.stats import RingBuffer, SeriesKey, StatsPoller, xdcr_statistics_specifications
+
+HOST = "127.0.0.1"
+PORT = "8091"
+STATS_URL = f"http://{HOST}:{PORT}/pools/default/stats/range/"
+
+
+def spec(name, **labels):
+    return {
+        "metric": [{"label": "name", "value": name}] + [{"label": k, "value": v} for k, v in labels.items()],
+        "step": 10,
+        "start": -30,
+    }
+
+
+@responses.activate
+def test_get_statistics_decodes_columns():
+    specs = [spec("kv_ops", bucket="b1"), spec("sys_cpu_utilization_rate")]
+    responses.add(
+        responses.POST,
+        STATS_URL,
+        match=[matchers.json_params_matcher(specs)],
+        json=[
+            {"data": [{"metric": {"nodes": ["n1"]}, "values": [[100, "1.5"], [110, "2"]]}], "errors": []},
+            {
+                "data": [
+                    {"metric": {"nodes": ["n1"], "instance": "n1"}, "values": [[100, "NaN"]]},
+                    {"metric": {"nodes": ["n2"], "instance": "n2"}, "values": [[100, "7"]]},
+                ],
+                "errors": [],
+            },
+        ],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    result = c.get_statistics(specs)
+
+    ops = result[SeriesKey("kv_ops", (("bucket", "b1"),), ())]
+    assert list(ops.timestamps) == [100.0, 110.0]
+    assert list(ops.values) == [1.5, 2.0]
+    assert ops.last == 2.0
+
+    cpu = {series.key.labels: series for series in result.by_name("sys_cpu_utilization_rate")}
+    assert math.isnan(cpu[(("instance", "n1"),)].values[0])
+    assert cpu[(("instance", "n2"),)].values[0] == 7.0
+
+
+@responses.activate
+def test_get_statistics_batches_and_splits():
+    specs = [spec(f"metric_{i}") for i in range(3)]
+    item = {"data": [], "errors": []}
+
+    responses.add(responses.POST, STATS_URL, match=[matchers.json_params_matcher(specs[:2])], status=400)
+    for s in specs:
+        responses.add(responses.POST, STATS_URL, match=[matchers.json_params_matcher([s])], json=[item])
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    c.get_statistics(specs, batch_size=2)
+
+    assert len(responses.calls) == 4
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(i, i * 10)
+
+    assert list(buffer.timestamps) == [2, 3, 4]
+    assert list(buffer.values) == [20, 30, 40]
+    assert buffer.last_timestamp == 4
+    assert len(buffer) == 3
+
+
+@responses.activate
+def test_stats_poller_fetches_only_new_samples():
+    specification = spec("kv_ops", bucket="b1")
+    key = SeriesKey("kv_ops", (("bucket", "b1"),), ())
+
+    responses.add(
+        responses.POST,
+        STATS_URL,
+        match=[matchers.json_params_matcher([specification])],
+        json=[{"data": [{"metric": {}, "values": [[100, "1"], [110, "2"]]}], "errors": [], "endTimestamp": 110}],
+    )
+    responses.add(
+        responses.POST,
+        STATS_URL,
+        match=[matchers.json_params_matcher([dict(specification, start=111)])],
+        json=[{"data": [{"metric": {}, "values": [[110, "2"], [120, "3"]]}], "errors": [], "endTimestamp": 120}],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    poller = StatsPoller(c, [specification], capacity=10)
+
+    assert poller.poll() == 2
+    assert poller.poll() == 1
+    assert list(poller.series[key].values) == [1.0, 2.0, 3.0]
+
+
+def xdcr_item(values_by_bucket):
+    return {
+        "data": [
+            {
+                "metric": {"sourceBucketName": bucket, "targetClusterUUID": "u1", "targetBucketName": bucket},
+                "values": values,
+            }
+            for bucket, values in values_by_bucket.items()
+        ],
+        "errors": [],
+    }
+
+
+@responses.activate
+def test_xdcr_progress():
+    responses.add(
+        responses.POST,
+        STATS_URL,
+        json=[
+            xdcr_item({"b1": [[100, "1000"], [110, "500"]], "b2": [[100, "0"], [110, "0"]], "b4": []}),
+            xdcr_item({"b1": [[110, "50"]]}),
+            xdcr_item({"b1": [[110, "2048"]]}),
+        ],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    progress = c.xdcr_progress(["b1", "b2", "b3", "b4"])
+
+    request = responses.calls[0].request
+    assert b'"b1|b2|b3|b4"' in request.body
+    assert progress["b1"].changes_left == 500
+    assert progress["b1"].drain_rate == 50
+    assert progress["b1"].eta == 10
+    assert progress["b1"].docs_per_second == 50
+    assert progress["b1"].bytes_per_second == 2048
+    assert progress["b2"].drained
+    assert not progress["b1"].drained
+    assert progress["b3"].changes_left is None
+    assert progress["b3"].drained
+    assert progress["b4"].changes_left is None
+    assert not progress["b4"].drained
+
+
+def test_xdcr_bucket_names_escaped():
+    specification = xdcr_statistics_specifications(["app.v1", "b2"])[0]
+
+    assert {"label": "sourceBucketName", "value": "app\\.v1|b2", "operator": "=~"} in specification["metric"]
+
+
+@responses.activate
+def test_wait_for_xdcr_drain(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(cluster.time, "sleep", sleeps.append)
+
+    empty = {"data": [], "errors": []}
+    responses.add(
+        responses.POST,
+        STATS_URL,
+        json=[xdcr_item({"b1": [[100, "20"], [110, "10"]]}), empty, empty],
+    )
+    responses.add(
+        responses.POST,
+        STATS_URL,
+        json=[xdcr_item({"b1": [[110, "10"], [120, "0"]]}), empty, empty],
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=HOST, api_port=PORT)
+    progress = c.wait_for_xdcr_drain(["b1"], timeout=60)
+
+    assert progress["b1"].drained
+    assert sleeps == [1.5]
@@ -0,0 +1,106 @@
+import http.server
+import json
+import threading
+import time
+
+import responses
+
+from couchbase_cluster_admin import cluster, streaming
+
+
+def stream_body(*documents):
+    return "".join(json.dumps(document) + "\n\n\n\n" for document in documents)
+
+
+@responses.activate
+def test_watch_pool():
+    host = "127.0.0.1"
+    port = "8091"
+
+    node_a = {"otpNode": "ns_1@a", "status": "healthy", "clusterMembership": "active"}
+    node_b = {"otpNode": "ns_1@b", "status": "warmup", "clusterMembership": "active"}
+    documents = [
+        {"nodes": [node_a], "bucketNames": []},
+        {"nodes": [node_a, node_b], "bucketNames": [{"bucketName": "b1"}]},
+        {"nodes": [dict(node_b, status="healthy")], "bucketNames": [{"bucketName": "b1"}]},
+    ]
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/poolsStreaming/default",
+        body=stream_body(*documents),
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    events = [(event.type, event.name) for event in c.watch_pool()]
+
+    assert events == [
+        (streaming.SNAPSHOT, None),
+        (streaming.NODE_ADDED, "ns_1@b"),
+        (streaming.BUCKET_CREATED, "b1"),
+        (streaming.NODE_CHANGED, "ns_1@b"),
+        (streaming.NODE_REMOVED, "ns_1@a"),
+    ]
+
+
+@responses.activate
+def test_watch_bucket():
+    host = "127.0.0.1"
+    port = "8091"
+
+    documents = [
+        {"name": "b1", "nodes": [{"hostname": "a:8091"}], "rev": 1},
+        {"name": "b1", "nodes": [{"hostname": "a:8091"}], "rev": 1},
+        {"name": "b1", "nodes": [{"hostname": "a:8091"}], "rev": 2},
+    ]
+    responses.add(
+        responses.GET,
+        f"http://{host}:{port}/pools/default/bs/b1",
+        body=stream_body(*documents),
+    )
+
+    c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=port)
+    events = list(c.watch_bucket("b1"))
+
+    assert [event.type for event in events] == [streaming.SNAPSHOT, streaming.BUCKET_CHANGED]
+    assert events[1].new["rev"] == 2
+
+
+def test_watch_pool_reconnects_after_read_timeout():
+    node_a = {"otpNode": "ns_1@a", "status": "healthy", "clusterMembership": "active"}
+    node_b = {"otpNode": "ns_1@b", "status": "healthy", "clusterMembership": "active"}
+    documents = [{"nodes": [node_a], "bucketNames": []}, {"nodes": [node_a, node_b], "bucketNames": []}]
+    connections = []
+
+    class StallingHandler(http.server.BaseHTTPRequestHandler):
+        # Chunked, like ns_server streaming responses.
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            connections.append(self.path)
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            body = stream_body(documents[len(connections) - 1]).encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(body), body))
+            self.wfile.flush()
+            if len(connections) == 1:
+                # Half-open connection: no more data, not even heartbeats.
+                time.sleep(1)
+            self.wfile.write(b"0\r\n\r\n")
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StallingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    try:
+        c = cluster.Cluster("mycluster", services=["kv"], api_host=host, api_port=str(port))
+        events = [(event.type, event.name) for event in c.watch_pool(read_timeout=0.2)]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert events == [(streaming.SNAPSHOT, None), (streaming.NODE_ADDED, "ns_1@b")]
+    assert len(connections) == 2